@@ -1,21 +1,72 @@
+import time
+_START_TIME = time.perf_counter()
+
+import argparse
+import collections
+import contextlib
+import csv
+import importlib
+import json
 import os
 import sys
 
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
-
 from annotatexl.annotator.annotator import Annotator
-from annotatexl.annotator.observed_ion import ObservedIon
+from annotatexl.api import (
+    ANNOTATION_COLUMNS, annotate_spectrum, match_spectrum
+)
+from annotatexl.annotator.peak_list import PeakList
+from annotatexl.fragment_cache import FragmentCache
 from annotatexl.fragment_ion import FragmentIon
+from annotatexl.fragmentation_profile import (
+    DEFAULT_PROFILE, PROFILES, FragmentationProfile
+)
+from annotatexl.fragment_table import NEUTRAL_LOSSES
 from annotatexl.fragmenter import Fragmenter
 from annotatexl.crosslink import Crosslink
+from annotatexl.instrumentation import PROFILE_MODES, STAGES, StageRecorder
+from annotatexl.results_writer import ResultsWriter, open_results_writer
+from annotatexl.site_localization import (
+    LINKABLE_RESIDUES, LOCALIZATION_COLUMNS, PEPTIDES,
+    SiteLocalizationException, check_residues, localize_sites
+)
+
+_CORE_IMPORT_TIME = time.perf_counter() - _START_TIME
 
 
 TOLERANCE = 10.0
 TOLERANCE_UNITS = 'ppm'
 
-OBSERVED_BASE_DIR = '/Users/juliette/projects/AnnotateXL'
+BATCH_RESULTS_FILE = 'annotatexl_batch_results.csv'
+
+# Columns of the consolidated batch results, after the row index
+BATCH_COLUMNS = ('crosslink_id', 'peak_list', 'tolerance') + \
+    ANNOTATION_COLUMNS
+
+# Number of chunks of manifest rows queued per batch worker process, which
+# bounds the results held in memory while earlier rows are still running
+BATCH_CHUNKS_PER_WORKER = 2
+
+# Resolution and format of the annotated spectra
+RENDER_DPI = 300
+RENDER_FORMAT = 'png'
+RENDER_BACKEND = 'matplotlib'
+
+# Fragment cache, StageRecorder keyword arguments and spectrum (dpi,
+# format, backend) of a batch worker process, see _init_batch_worker
+_FRAGMENT_CACHE = None
+_RECORDER_OPTIONS = None
+_RENDER_OPTIONS = (RENDER_DPI, RENDER_FORMAT, RENDER_BACKEND)
+
+# Spectrum renderer of this process for each (dpi, format, backend), see
+# _get_renderer
+_RENDERERS = {}
+
+# Seconds taken by each heavy library imported by _lazy_import
+IMPORT_TIMES = {}
+
+OBSERVED_BASE_DIR = os.environ.get(
+    'ANNOTATEXL_BASE_DIR', '/Users/juliette/projects/AnnotateXL'
+)
 
 """
 Annotate_XL creates annotated spectra for a cross-link spectrum match. 
@@ -42,7 +93,8 @@ Please see test_peak_list.csv for an example.
 
 Upon first execution:
 - Open Annotate_xl.py and change the OBSERVED_BASE_DIR to the location of
-your Annotate_XL.py download and save.
+your Annotate_XL.py download and save. Alternatively set the
+ANNOTATEXL_BASE_DIR environment variable to the location.
 
 To execute the code: 
 - Place your peak_list.csv into the same folder as Annotate_XL.py. 
@@ -62,6 +114,93 @@ to the location of your Annotate_XL.py download and save.
 - Two files are generated in you Annotate_XL directory: 
 DTHKSEIAHR-FKDLGEEHFK-a4-b2_annotatexl.csv and DTHKSEIAHR-FKDLGEEHFK-a4-b2.png 
 
+To annotate many cross-link spectrum matches in one run:
+- Create a CSV or TSV manifest with a header row and the columns
+crosslink_id, peak_list and optionally tolerance and the precursor
+charge, e.g.
+crosslink_id,peak_list,tolerance,charge
+DTHKSEIAHR-FKDLGEEHFK-a4-b2,test_peak_list.csv,10.0,3
+- Type python Annotate_XL.py --batch manifest.csv into your terminal.
+- Use --workers and --chunksize to set the number of worker processes
+and the number of manifest rows sent to a worker at a time.
+- Each CSM generates a CSV and PNG named “cross-link-id_peak-list” and all
+annotations are collected in annotatexl_batch_results.csv.
+- Add --results FILE to choose the consolidated results file. Results
+are streamed to it as each CSM finishes, as gzip compressed CSV if FILE
+ends in .csv.gz or as JSON Lines if it ends in .jsonl.
+- If FILE ends in .parquet the results are written as a typed Parquet
+dataset with a row group per CSM, which requires pyarrow
+(pip install -r requirements/parquet.txt). Add --append to add the
+results to an existing dataset rather than replace it.
+- Add --fragment-cache DIR to store fragmented cross-links in DIR so
+that later runs reuse them.
+
+To annotate records piped from another program without a file per
+spectrum:
+- Type python Annotate_XL.py --stream into your terminal and write one
+JSON object per line to its standard input, e.g.
+{"id": 1, "crosslink_id": "DTHKSEIAHR-FKDLGEEHFK-a4-b2",
+"mz": [84.08, 86.09], "intensity": [8.83, 6.32], "tolerance": 10.0,
+"charge": 3}
+- One JSON object per input record is written to standard output, in
+the same order, with the annotations in the Annotator.matched_to_dict
+format or the error if the record could not be annotated.
+- Add --workers N to annotate in N worker processes and --chunksize and
+--read-ahead to set how many records are sent to a worker at a time
+and how many chunks are read ahead of the output.
+
+All a/b/c and x/y/z ions are generated by default. Add --fragmentation
+CID, HCD, ETD or EThcD to only generate the ion series of that method,
+e.g. b, y and a2 ions for HCD, or --ion-types to choose them, e.g.
+--ion-types by.
+
+Fragments are matched as singly charged ions, as the peak list is
+expected to be deconvoluted. For peak lists that are not, add
+--max-charge Z, e.g. the highest precursor charge, to also match the
+precursor, common and cross-linked fragments at charges 2 to Z. The
+charge of a batch manifest row or stream record, if given, caps the
+fragment charges of that CSM at its precursor charge.
+
+Add --neutral-losses H2O and/or NH3 to also match these fragments after
+a water loss, if they contain S, T, D or E, or an ammonia loss, if they
+contain R, K, N or Q. Add --isotopes N to also match their first N
+isotope peaks, labelled e.g. By5(M+1).
+
+Spectra are drawn at 300 dpi as PNG. Use --dpi and --format (png, svg or
+pdf) to change this. In batch mode add --render-workers N to render the
+spectra in a separate pool of N processes while annotation continues.
+Add --renderer svg to write SVG spectra directly, without matplotlib,
+in a few milliseconds each.
+
+Add --no-plot to only create the CSV annotations. Matplotlib is then
+never imported, which makes each run start much faster. Add
+--import-time to print the time taken by imports, or use
+python -X importtime Annotate_XL.py ... for a full breakdown.
+
+To find where the time goes, add --stats FILE to write the wall time,
+counts and allocated memory blocks of each stage (load, fragment, match,
+csv, plot) as one line of JSON per CSM. Add --trace-memory to
+also record the bytes allocated by each stage. Add --profile STAGE to
+profile one stage with cProfile, or with tracemalloc using
+--profile-mode tracemalloc, written to --profile-dir.
+
+To find the most likely link sites of a cross-link:
+- Type python Annotate_XL.py --localize cross-link-id peak_list.csv
+into your terminal.
+- Every pair of lysines of the alpha and beta peptides is scored against
+the peak list and the topologies are written, ranked by matched peaks,
+to “cross-link-id_sites.csv” with the matched ion evidence of each.
+- Add --linkable-residues to choose the linkable residues, e.g. KSTY for
+NHS-ester crosslinkers, with ^ for the protein N-terminus, e.g. K^. The
+first residue of a peptide is only linked by ^ if the peptide is at the
+protein N-terminus, given by --protein-n-term alpha and/or beta.
+- If both peptides are the same, each pair of sites is scored once.
+
+To annotate peaks already held in memory from Python, without reading
+or writing any files, use annotatexl.api.annotate_spectrum, e.g.
+result = annotate_spectrum("DTHKSEIAHR-FKDLGEEHFK-a4-b2", mz, intensity)
+and convert the result with result.to_df() or result.to_dicts().
+
 Annotate_XL has currently been tested on Linux/Unix operating systems. 
 Stay tuned for future development of a web portal...
 
@@ -72,31 +211,206 @@ licensing terms please see: https://choosealicense.com/licenses/gpl-3.0/
 """
 
 
-def obtain_annotation_experimental_parameters():
+def obtain_annotation_experimental_parameters(argv=None):
     """
     Obtains inputs from user inputs. Tolerance units and tolerance provided
-    as global variables. Cross-link ID and peak list file name provided as 
-    command line inputs. Returns all input parmeters.
+    as global variables. Cross-link ID and peak list file name, or a batch
+    manifest, provided as command line inputs. Returns all input parmeters.
     """
-    tolerance = TOLERANCE
-    units = TOLERANCE_UNITS
-    try:
-        crosslink_id = sys.argv[1]
-        obs_csv_file_raw = sys.argv[2]
-    except Exception as e:
+    parser = argparse.ArgumentParser(
+        description="Annotate cross-link spectrum matches."
+    )
+    parser.add_argument("crosslink_id", nargs="?")
+    parser.add_argument("obs_csv_raw", nargs="?")
+    parser.add_argument(
+        "--batch", metavar="MANIFEST",
+        help="CSV/TSV manifest of crosslink_id, peak_list, tolerance"
+    )
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="Annotate JSON Lines records from stdin, writing JSON Lines "
+        "to stdout"
+    )
+    parser.add_argument(
+        "--localize", action="store_true",
+        help="Rank every link-site topology of the cross-link's peptides"
+    )
+    parser.add_argument(
+        "--linkable-residues", metavar="RESIDUES",
+        default=LINKABLE_RESIDUES,
+        help="Residues --localize links, ^ for the protein N-terminus, "
+        "e.g. KSTY^"
+    )
+    parser.add_argument(
+        "--protein-n-term", nargs="+", choices=PEPTIDES, default=(),
+        help="Peptides at the protein N-terminus, linked at residue 1 if "
+        "--linkable-residues holds ^"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of worker processes for batch or stream mode"
+    )
+    parser.add_argument(
+        "--read-ahead", type=int, default=None,
+        help="Chunks of stream records read ahead of the output"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=1,
+        help="Number of manifest rows sent to a worker at a time"
+    )
+    parser.add_argument(
+        "--results", metavar="FILE", default=BATCH_RESULTS_FILE,
+        help="Consolidated batch results, .csv, .csv.gz, .jsonl or .parquet"
+    )
+    parser.add_argument(
+        "--append", action="store_true",
+        help="Add to an existing .parquet results dataset"
+    )
+    parser.add_argument(
+        "--fragment-cache", metavar="DIR", default=None,
+        help="Directory to store and reuse fragmented cross-links"
+    )
+    parser.add_argument(
+        "--fragmentation", choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+        help="Only generate the ion series of this fragmentation method"
+    )
+    parser.add_argument(
+        "--ion-types", metavar="TYPES", default=None,
+        help="Only generate these ion types, e.g. by"
+    )
+    parser.add_argument(
+        "--max-charge", type=int, default=1,
+        help="Match fragments at charges 1 to this, e.g. the highest "
+        "precursor charge, or the charge of a CSM if lower"
+    )
+    parser.add_argument(
+        "--neutral-losses", nargs="+", choices=NEUTRAL_LOSSES, default=(),
+        help="Also match fragments after these neutral losses"
+    )
+    parser.add_argument(
+        "--isotopes", type=int, default=0,
+        help="Also match this many isotope peaks of each fragment"
+    )
+    parser.add_argument(
+        "--no-plot", dest="plot", action="store_false",
+        help="Only create the CSV annotations, without the PNG spectrum"
+    )
+    parser.add_argument(
+        "--dpi", type=int, default=RENDER_DPI,
+        help="Resolution of the spectrum image"
+    )
+    parser.add_argument(
+        "--format", dest="fmt", choices=("png", "svg", "pdf"),
+        default=RENDER_FORMAT, help="Format of the spectrum image"
+    )
+    parser.add_argument(
+        "--renderer", dest="backend", choices=("matplotlib", "svg"),
+        default=RENDER_BACKEND,
+        help="Spectrum renderer, svg writes SVG directly without matplotlib"
+    )
+    parser.add_argument(
+        "--render-workers", type=int, default=0,
+        help="Render batch spectra in a separate pool of this many processes"
+    )
+    parser.add_argument(
+        "--import-time", action="store_true",
+        help="Print the time taken by module imports as JSON"
+    )
+    parser.add_argument(
+        "--stats", metavar="FILE", default=None,
+        help="Write the per-stage time, counts and allocations as JSON Lines"
+    )
+    parser.add_argument(
+        "--trace-memory", action="store_true",
+        help="Record the bytes allocated per stage with tracemalloc"
+    )
+    parser.add_argument(
+        "--profile", metavar="STAGE", choices=STAGES, default=None,
+        help="Profile one stage of %s" % ", ".join(STAGES)
+    )
+    parser.add_argument(
+        "--profile-mode", choices=PROFILE_MODES, default="cprofile",
+        help="Profiler used for --profile"
+    )
+    parser.add_argument(
+        "--profile-dir", metavar="DIR", default=None,
+        help="Directory to write profiles to, defaults to OBSERVED_BASE_DIR"
+    )
+    args = parser.parse_args(argv)
+    if args.batch is None and not args.stream and (
+        args.crosslink_id is None or args.obs_csv_raw is None
+    ):
         print(
             "Could not obtain the full list of "
-            "parameters (%s). Exiting." % e
+            "parameters (a cross-link ID and peak list, or --batch "
+            "manifest, are required). Exiting."
         )
         sys.exit()
-    return tolerance, units, crosslink_id, obs_csv_file_raw
+    if args.append and not args.results.endswith(".parquet"):
+        parser.error("--append requires .parquet --results")
+    args.tolerance = TOLERANCE
+    args.units = TOLERANCE_UNITS
+    if args.max_charge < 1:
+        parser.error("--max-charge must be at least 1")
+    if args.isotopes < 0:
+        parser.error("--isotopes must be at least 0")
+    try:
+        check_residues(args.linkable_residues)
+    except SiteLocalizationException as e:
+        parser.error(str(e))
+    args.fragmenter_options = {
+        "profile": args.fragmentation, "max_charge": args.max_charge,
+        "neutral_losses": tuple(args.neutral_losses),
+        "isotopes": args.isotopes
+    }
+    if args.ion_types is not None:
+        try:
+            args.fragmenter_options["profile"] = \
+                FragmentationProfile.custom(args.ion_types)
+        except Exception as e:
+            parser.error(str(e))
+    args.recorder_options = None
+    if args.stats is not None or args.profile is not None:
+        args.recorder_options = {
+            "trace_memory": args.trace_memory,
+            "profile_stage": args.profile,
+            "profile_mode": args.profile_mode,
+            "profile_dir": args.profile_dir or OBSERVED_BASE_DIR
+        }
+    return args
+
+
+def _lazy_import(module_name):
+    """
+    Imports a heavy module, e.g. the matplotlib renderer, when the stage
+    that needs it first runs rather than at start up. The import time
+    is recorded in IMPORT_TIMES.
+    """
+    if module_name not in sys.modules:
+        start = time.perf_counter()
+        importlib.import_module(module_name)
+        IMPORT_TIMES[module_name] = time.perf_counter() - start
+    return sys.modules[module_name]
+
+
+def report_import_times():
+    """
+    Prints the time taken to start up and import the annotatexl core,
+    and by each lazily imported library, in milliseconds as JSON.
+    """
+    times = {"core": _CORE_IMPORT_TIME}
+    times.update(IMPORT_TIMES)
+    print(json.dumps(dict(
+        (name, round(seconds * 1000.0, 3)) for name, seconds in times.items()
+    )))
 
 
-def obtain_observed_df_from_raw(obs_csv_raw):
+def obtain_observed_peak_list_from_raw(obs_csv_raw):
     """
-    Reads CSV file of observed ions to Pandas dataframe object. 
-    Assumes CSV file has header and skips header row.
-    Returns dataframe of m/z and intensities for all observed ions.
+    Reads CSV file of observed ions directly to a PeakList of m/z and
+    intensity arrays, sorted on m/z, without building a dataframe.
+    Assumes CSV file has header and skips header row. Raises an IOError
+    if the file cannot be read.
 
     Parameters
     ----------
@@ -104,172 +418,573 @@ def obtain_observed_df_from_raw(obs_csv_raw):
         m/z, intensity,
         for all observed ions in a scan.
     """
-    columns = ["mz", "intensity"]
     full_obs_file_path = os.path.join(
         OBSERVED_BASE_DIR, obs_csv_raw
     )
     try:
-        obs_df = pd.read_csv(
-            full_obs_file_path, names=columns, skiprows=1
-        ).drop_duplicates(['mz'])  # Ignores 'Ion Type' column
+        return PeakList.from_csv(full_obs_file_path)
     except Exception as e:
-        print("Could not open the Observed CSV file (%s). Exiting." % e)
-    else:
-        return obs_df
+        raise IOError(
+            "Could not open the Observed CSV file %s (%s)" % (obs_csv_raw, e)
+        )
 
 
-def convert_observed_ion_df(obs_df):
+def matched_ion_records(obs_matched_list):
     """
-    The obs_df DataFrame iterrows() generator is used to loop
-    over each observed ion and then construct a list of
-    ObservedIon(..) instances that will later be fed to the
-    Annotator instance for matching.
+    Generates a tuple of the ANNOTATION_COLUMNS values for each row of
+    the matched list, without requiring pandas.
 
-    Parameters
-    ----------
-    obs_df: pd.DataFrame
-        A DataFrame with three
-        header rows, which will be removed by the function below
-    """
-    return [
-        ObservedIon(row[1].mz, row[1].intensity)
-        for row in obs_df.iterrows()
-    ]
-
-
-def create_matched_ion_df(obs_matched_list):
-    """
     Parameters
     ----------
     obs_matched_list: list 
         List created by Annotator class annotate method.
-        List of all observed ions with details of all matches to 
-        theoretical ions within tolerance parameters.
-    """
-    records = []
-    for row in obs_matched_list:
-        record = {}
-        if isinstance(row[1], FragmentIon):
-            record['matched'] = True
-            record['ion_type'] = row[1].ion_name()
-            record['roepstorff'] = row[1].get_roepstorff()
+    """
+    for obs, mat, err in obs_matched_list:
+        if isinstance(mat, FragmentIon):
+            yield (
+                True, mat.ion_name(), mat.get_roepstorff(),
+                obs.get_mass(), obs.get_intensity(), err
+            )
         else:
-            record['matched'] = False
-            record['ion_type'] = None
-        record['mz'] = row[0].get_mass()
-        record['intensity'] = row[0].get_intensity()
-        record['error'] = row[2]
-        records.append(record)
-    return pd.DataFrame(records)
+            yield (
+                False, None, None,
+                obs.get_mass(), obs.get_intensity(), err
+            )
 
 
-def create_csv_annotations(full_df, crosslink_id):
+def write_csv_annotations(records, crosslink_id):
     """
     Creates a CSV file containing all observed ions with a boolean matched 
-    column, roepstorff nomenclature, ion type, m/z, intensity and match error
+    column, ion type, roepstorff nomenclature, m/z, intensity and match
+    error from the tuples of matched_ion_records, using the csv module
+    rather than a dataframe.
     """
     print("creating csv for %s..." % crosslink_id)
-    full_df.to_csv(
-        os.path.join(
-            OBSERVED_BASE_DIR, "%s_annotatexl.csv" % crosslink_id
+    with ResultsWriter(os.path.join(
+        OBSERVED_BASE_DIR, "%s_annotatexl.csv" % crosslink_id
+    ), ANNOTATION_COLUMNS) as writer:
+        writer.write_rows(records)
+
+
+def _get_renderer(
+    dpi=RENDER_DPI, fmt=RENDER_FORMAT, backend=RENDER_BACKEND
+):
+    """
+    Returns the spectrum renderer of this process for a dpi, format and
+    backend, creating it on first use so that matplotlib is only
+    imported, and each figure only created, once. The "svg" backend is
+    an SVGSpectrumWriter, which always writes SVG and ignores the dpi.
+    """
+    key = (dpi, fmt, backend)
+    if key not in _RENDERERS:
+        if backend == "svg":
+            svg_writer = _lazy_import("annotatexl.svg_writer")
+            _RENDERERS[key] = svg_writer.SVGSpectrumWriter()
+        else:
+            renderer = _lazy_import("annotatexl.renderer")
+            _RENDERERS[key] = renderer.SpectrumRenderer(dpi, fmt)
+    return _RENDERERS[key]
+
+
+def _spectrum_path(output_name, fmt=RENDER_FORMAT):
+    """
+    Returns the path of the spectrum image of an output name.
+    """
+    return os.path.join(OBSERVED_BASE_DIR, "%s.%s" % (output_name, fmt))
+
+
+def annotate_csm(
+    crosslink_id, obs_csv_raw, tolerance=TOLERANCE, units=TOLERANCE_UNITS,
+    output_name=None, fragment_cache=None, plot=True, recorder=None,
+    renderer=None, fragmenter=None, charge=None
+):
+    """
+    Annotates a single cross-link spectrum match. Fragments the cross-link,
+    matches the theoretical fragments to the observed peak list and writes
+    the CSV annotations and, if plot is True, the PNG spectrum named after
+    output_name, which defaults to the cross-link ID. Returns the
+    annotation records, tuples of the ANNOTATION_COLUMNS values. If a
+    FragmentCache is given the fragments are taken from it. If a
+    StageRecorder is given the time, counts and allocations of each stage
+    are recorded in it. The spectrum is drawn by the given
+    SpectrumRenderer, or a 300 dpi PNG renderer. Fragments not taken from
+    the cache are generated by the given Fragmenter, or Fragmenter(). If
+    the precursor charge is given, fragments above it are not matched.
+
+    Only the plotting stage requires matplotlib.
+    """
+    if output_name is None:
+        output_name = crosslink_id
+    if recorder is None:
+        recorder = StageRecorder(output_name)
+    with recorder.stage("load") as stats:
+        observed_peak_list = obtain_observed_peak_list_from_raw(obs_csv_raw)
+        stats["n_peaks"] = len(observed_peak_list)
+
+    annotator = Annotator(units, tolerance)
+
+    # Carry out theoretical fragmentation, only generating fragments
+    # that can match the observed peak list unless they are cached
+    with recorder.stage("fragment") as stats:
+        if fragment_cache is not None:
+            theo_frag_table = fragment_cache.get(crosslink_id)
+        else:
+            f = fragmenter if fragmenter is not None else Fragmenter()
+            xl = Crosslink.from_id(crosslink_id)
+            theo_frag_table = f.fragment_table(
+                xl,
+                annotator.matchable_range(observed_peak_list.get_masses())
+            )
+        theo_frag_table = theo_frag_table.cap_charge(charge)
+        stats["n_fragments"] = len(theo_frag_table)
+        stats["cached"] = fragment_cache is not None
+
+    # Annotate the theoretical fragments with the observed
+    with recorder.stage("match") as stats:
+        result = match_spectrum(
+            crosslink_id, theo_frag_table, observed_peak_list, annotator
         )
+        stats["n_matched"] = int(result.matched.sum())
+    with recorder.stage("csv") as stats:
+        records = list(result.records())
+        write_csv_annotations(records, output_name)
+        stats["n_rows"] = len(records)
+    if plot:
+        with recorder.stage("plot") as stats:
+            if renderer is None:
+                renderer = _get_renderer()
+            renderer.render_records(
+                records, _spectrum_path(output_name, renderer.fmt)
+            )
+            stats["n_labels"] = sum(
+                1 for record in records if record[2] is not None
+            )
+        print("-----Process Complete-----")
+        print(
+            "Check your Annotate_XL directory for your Annotated %s" %
+            renderer.fmt.upper()
+        )
+    return records
+
+
+def localize_csm(
+    crosslink_id, obs_csv_raw, tolerance=TOLERANCE, units=TOLERANCE_UNITS,
+    fragmenter=None, residues=LINKABLE_RESIDUES, protein_n_term=()
+):
+    """
+    Scores every link-site topology of a cross-link's peptide pair,
+    linking the given residues, against the observed peak list and
+    writes the ranked topologies to a CSV named after the cross-link ID.
+    protein_n_term names the peptides at the protein N-terminus, see
+    localize_sites. Returns the ranked rows, tuples of the
+    LOCALIZATION_COLUMNS values. The fragments are generated by the
+    given Fragmenter, or Fragmenter().
+    """
+    observed_peak_list = obtain_observed_peak_list_from_raw(obs_csv_raw)
+    rows = localize_sites(
+        crosslink_id, observed_peak_list.get_masses(),
+        observed_peak_list.get_intensities(), tolerance, units,
+        residues=residues, fragmenter=fragmenter,
+        protein_n_term=protein_n_term
     )
+    print("creating link-site ranking for %s..." % crosslink_id)
+    with ResultsWriter(os.path.join(
+        OBSERVED_BASE_DIR, "%s_sites.csv" % crosslink_id
+    ), LOCALIZATION_COLUMNS) as writer:
+        writer.write_rows(rows)
+    for row in rows[:5]:
+        print(
+            "%s. %s: %s peaks matched, %s site determining" %
+            (row[0], row[1], row[4], row[7])
+        )
+    return rows
 
 
-def obtain_spectrum(df):
+def read_batch_manifest(manifest):
     """
-    Generates logic for spectra. Unmatched peaks in grey, xl in red 
-    common in blue.
+    Reads a CSV or TSV batch manifest with a header row. Requires the
+    columns crosslink_id and peak_list, tolerance is optional and
+    defaults to TOLERANCE and the precursor charge is optional. Returns
+    a list of (crosslink_id, peak_list, tolerance, charge) tuples, with
+    a charge of None if not given.
     """
-    # Obtain plot data for each ion type.
-    mz_xlink = df[df['ion_type']=="crosslink"]['mz']
-    int_xlink = df[df['ion_type']=="crosslink"]['normalised_int']
+    with open(
+        os.path.join(OBSERVED_BASE_DIR, manifest), newline=""
+    ) as manifest_file:
+        dialect = csv.Sniffer().sniff(
+            manifest_file.readline(), delimiters=",\t"
+        )
+        manifest_file.seek(0)
+        reader = csv.DictReader(manifest_file, dialect=dialect)
+        columns = reader.fieldnames or []
+        manifest_rows = list(reader)
+    missing = set(["crosslink_id", "peak_list"]) - set(columns)
+    if missing:
+        raise ValueError(
+            "Batch manifest is missing the column(s) %s" %
+            ", ".join(sorted(missing))
+        )
+    return [
+        (
+            row["crosslink_id"], row["peak_list"],
+            float(row.get("tolerance") or TOLERANCE),
+            int(row["charge"]) if row.get("charge") else None
+        )
+        for row in manifest_rows
+    ]
 
-    mz_precursor = df[df['ion_type']=="precursor"]['mz']
-    int_precursor = df[df['ion_type']=="precursor"]['normalised_int']
 
-    mz_common = df[df['ion_type']=="common"]['mz']
-    int_common = df[df['ion_type']=="common"]['normalised_int']
+def _init_batch_worker(
+    cache_dir=None, recorder_options=None,
+    render_options=(RENDER_DPI, RENDER_FORMAT, RENDER_BACKEND),
+    fragmenter_options=None
+):
+    """
+    Creates the fragment cache of a batch worker process, fragmenting
+    with the Fragmenter keyword arguments fragmenter_options, so that
+    cross-links repeated in the manifest are only fragmented once per
+    worker, or once across workers and runs with a cache directory.
+    Stores the StageRecorder keyword arguments if stages are recorded
+    and the (dpi, format, backend) of the spectra.
+    """
+    global _FRAGMENT_CACHE, _RECORDER_OPTIONS, _RENDER_OPTIONS
+    _FRAGMENT_CACHE = FragmentCache(
+        Fragmenter(**(fragmenter_options or {})), cache_dir=cache_dir
+    )
+    _RECORDER_OPTIONS = recorder_options
+    _RENDER_OPTIONS = render_options
 
-    mz_unmatched = df[df['matched']==False]['mz']
-    int_unmatched = df[df['matched']==False]['normalised_int']
 
-    mz_diag = df[df['ion_type']=="diagnostic"]['mz']
-    int_diag = df[df['ion_type']=="diagnostic"]['normalised_int']
+def _batch_output_name(crosslink_id, peak_list):
+    """
+    Returns the name of the per-CSM outputs of a manifest row.
+    """
+    return "%s_%s" % (
+        crosslink_id, os.path.splitext(os.path.basename(peak_list))[0]
+    )
 
-    mz_imm = df[df['ion_type']=="immonium"]['mz']
-    int_imm = df[df['ion_type']=="immonium"]['normalised_int']
 
-    fig, ax = plt.subplots()
+def _annotate_batch_row(row):
+    """
+    Annotates one manifest row in a worker process. Per-CSM outputs are
+    named after the cross-link ID and peak list so that a cross-link
+    matched to several spectra does not overwrite its outputs. Returns
+    the row with its annotation records, or the error if it failed, and
+    the stage stats if stages are recorded.
+    """
+    crosslink_id, peak_list, tolerance, charge, plot = row
+    output_name = _batch_output_name(crosslink_id, peak_list)
+    recorder = None
+    if _RECORDER_OPTIONS is not None:
+        recorder = StageRecorder(output_name, **_RECORDER_OPTIONS)
+    try:
+        records = annotate_csm(
+            crosslink_id, peak_list, tolerance, TOLERANCE_UNITS, output_name,
+            _FRAGMENT_CACHE, plot, recorder,
+            _get_renderer(*_RENDER_OPTIONS) if plot else None,
+            charge=charge
+        )
+    except Exception as e:
+        records, error = None, "%s" % e
+    else:
+        error = None
+    stats = recorder.to_dict() if recorder is not None else None
+    return row, records, error, stats
+
+
+def _annotate_batch_chunk(chunk):
+    """
+    Annotates a chunk of manifest rows in a worker process, returning
+    the results of _annotate_batch_row for each.
+    """
+    return [_annotate_batch_row(row) for row in chunk]
 
-    if len(mz_unmatched) > 0:
-        ax.stem(mz_unmatched, int_unmatched, '#999999', markerfmt=' ')
 
-    if len(mz_common) > 0:
-        ax.stem(mz_common, int_common, '#0571b0', markerfmt=' ')
+def _bounded_map(pool, func, items, max_pending):
+    """
+    Maps func over items in a process pool, yielding results in order.
+    Unlike Executor.map, which submits every item at once, at most
+    max_pending items are queued or held as results at a time, so that
+    memory use does not grow with the length of the batch.
+    """
+    pending = collections.deque()
+    for item in items:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(pool.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
+
 
-    if len(mz_xlink) > 0:
-        ax.stem(mz_xlink, int_xlink, '#ca0020', markerfmt=' ')
+def _open_stats_file(stats_file):
+    """
+    Opens the JSON Lines file of per-CSM stage stats for writing, or
+    returns a null context if no stats file was given.
+    """
+    if stats_file is None:
+        return contextlib.nullcontext()
+    return open(os.path.join(OBSERVED_BASE_DIR, stats_file), "w")
 
-    if len(mz_precursor) > 0:
-        ax.stem(mz_precursor, int_precursor, '#ca0020', markerfmt=' ')
 
-    if len(mz_diag) > 0:
-        ax.stem(mz_diag, int_diag, '#7b3294', markerfmt=' ')
+def annotate_stream_record(line, fragment_cache=None):
+    """
+    Annotates one JSON Lines input record of the form
+    {"crosslink_id": ..., "mz": [...], "intensity": [...], "tolerance": 10.0}
+    where tolerance, units, the precursor charge and an id echoed back
+    are optional. Returns
+    the output record as a line of JSON with the annotations in the
+    Annotator.matched_to_dict shape, or with the error if it failed.
+    """
+    output = {}
+    try:
+        record = json.loads(line)
+        if "id" in record:
+            output["id"] = record["id"]
+        output["crosslink_id"] = record["crosslink_id"]
+        result = annotate_spectrum(
+            record["crosslink_id"], record["mz"], record["intensity"],
+            float(record.get("tolerance", TOLERANCE)),
+            record.get("units", TOLERANCE_UNITS),
+            fragment_cache=fragment_cache,
+            charge=int(record["charge"]) if record.get("charge") else None
+        )
+        output["annotations"] = Annotator.matched_to_dict(
+            result.matched_list()
+        )
+    except Exception as e:
+        output["error"] = "%s: %s" % (type(e).__name__, e)
+    return json.dumps(output)
 
-    if len(mz_imm) > 0:
-        ax.stem(mz_imm, int_imm, '#008837', markerfmt=' ')
 
-    # Obtain roepstorf annotations and correctly position above peak.
-    labels = df[df.roepstorff.notnull()]
-    for mz, intensity, label in zip(labels['mz'], labels['normalised_int'], labels['roepstorff']):
-            ax.text(mz, intensity+len(label)+2, label, verticalalignment='center', rotation=90)
-    
-    # Allow room above peaks for annotations.
-    plt.ylim([0, 120])
-    ax.set_xlabel("m/z")
-    ax.set_ylabel("Intensity %")
+def _annotate_stream_chunk(lines):
+    """
+    Annotates a chunk of JSON Lines input records in a worker process.
+    """
+    return [annotate_stream_record(line, _FRAGMENT_CACHE) for line in lines]
 
 
-def plot_spectra(full_df, crosslink_id):
+def _read_chunks(input_file, chunksize):
+    """
+    Generates lists of up to chunksize non-blank lines of input_file.
+    """
+    chunk = []
+    for line in input_file:
+        if not line.strip():
+            continue
+        chunk.append(line)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_stream(
+    input_file, output_file, workers=None, chunksize=1, read_ahead=None,
+    cache_dir=None, fragmenter_options=None
+):
+    """
+    Annotates JSON Lines records read from input_file, e.g. stdin, and
+    writes one JSON Lines output record per input record to output_file,
+    in input order, see annotate_stream_record.
+
+    With no workers the records are annotated in this process. With
+    workers they are spread over a pool of worker processes, reading at
+    most read_ahead chunks of chunksize records ahead of the output,
+    which defaults to BATCH_CHUNKS_PER_WORKER chunks per worker. Either
+    way fragmented cross-links are kept in a FragmentCache, stored in
+    cache_dir if given, and generated by a Fragmenter with the keyword
+    arguments fragmenter_options. Returns the number of records written.
+    """
+    chunks = _read_chunks(input_file, chunksize)
+    n_records = 0
+    if not workers:
+        fragment_cache = FragmentCache(
+            Fragmenter(**(fragmenter_options or {})), cache_dir=cache_dir
+        )
+        results = (
+            [annotate_stream_record(line, fragment_cache) for line in chunk]
+            for chunk in chunks
+        )
+        for chunk_results in results:
+            output_file.write("".join(
+                "%s\n" % result for result in chunk_results
+            ))
+            output_file.flush()
+            n_records += len(chunk_results)
+        return n_records
+    futures = _lazy_import("concurrent.futures")
+    if read_ahead is None:
+        read_ahead = BATCH_CHUNKS_PER_WORKER * workers
+    with futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_batch_worker,
+        initargs=(
+            cache_dir, None, (RENDER_DPI, RENDER_FORMAT, RENDER_BACKEND),
+            fragmenter_options
+        )
+    ) as pool:
+        for chunk_results in _bounded_map(
+            pool, _annotate_stream_chunk, chunks, read_ahead
+        ):
+            output_file.write("".join(
+                "%s\n" % result for result in chunk_results
+            ))
+            output_file.flush()
+            n_records += len(chunk_results)
+    return n_records
+
+
+def _open_render_pool(render_workers, dpi, fmt):
     """
-    Plots spectra for all observed ions with annotations. 
-    Calls plot splectrum function above to correctly colour peaks based on 
-    ion type classification.
+    Opens a RenderPool of render_workers processes, closed when the
+    batch ends or fails, or returns a null context if spectra are
+    rendered by the annotation workers.
     """
-    # Normalise intensity to base peak
-    full_df['normalised_int'] = (
-        full_df['intensity']-full_df['intensity'].min()
-    ) / (
-        full_df['intensity'].max()-full_df['intensity'].min()
-    )*100
+    if render_workers <= 0:
+        return contextlib.nullcontext()
+    renderer = _lazy_import("annotatexl.renderer")
+    return renderer.RenderPool(render_workers, dpi, fmt)
 
-    # Plot Spectrum
-    obtain_spectrum(full_df)
 
-    # Save Spectrum PNG
-    png_name = os.path.join(OBSERVED_BASE_DIR, "%s.png" % crosslink_id)
-    plt.savefig(png_name, dpi=300, format='png')
-    print("-----Process Complete-----")
-    print("Check your Annotate_XL directory for your Annotated PNG")
-    #plt.show()
-    
+def _check_render_job(row, job):
+    """
+    Waits for the spectrum of a manifest row to be rendered, reporting
+    it if rendering failed.
+    """
+    try:
+        job.result()
+    except Exception as e:
+        print("Could not render %s %s (%s)." % (row[0], row[1], e))
 
-if __name__ == "__main__":
-    tol, units, crosslink_id, obs_csv_raw = \
-        obtain_annotation_experimental_parameters()
-    obs_df = obtain_observed_df_from_raw(obs_csv_raw)
 
-    # Carry out theoretical fragmentation
-    f = Fragmenter()
-    xl = Crosslink.from_id(crosslink_id)
-    theo_frag_list = list(f.cid(xl))
+def run_batch(
+    manifest, workers=None, chunksize=1, cache_dir=None, plot=True,
+    recorder_options=None, stats_file=None, render_workers=0,
+    render_options=(RENDER_DPI, RENDER_FORMAT, RENDER_BACKEND),
+    results_file=BATCH_RESULTS_FILE, append=False, fragmenter_options=None
+):
+    """
+    Annotates every cross-link spectrum match in a batch manifest across a
+    pool of worker processes, writing the per-CSM outputs and a single
+    consolidated file of all annotations with the cross-link ID, peak list
+    and tolerance of each row. The consolidated results are streamed as
+    each CSM finishes to results_file, a CSV, gzip compressed .csv.gz,
+    JSON Lines .jsonl file or .parquet dataset, which is added to rather
+    than replaced if append is True. Each worker keeps a fragment cache, stored
+    in cache_dir if given, of fragments generated by a Fragmenter with the
+    keyword arguments fragmenter_options. If recorder_options are given
+    each CSM's stages are recorded and, if stats_file is given, written to
+    it as JSON Lines.
+
+    Spectra are rendered with the (dpi, format, backend) of
+    render_options. If render_workers is 0, or the backend is "svg",
+    each annotation worker renders its own spectra, otherwise they are
+    handed to a separate RenderPool of render_workers processes so that
+    annotation is not held up by plotting.
+    """
+    futures = _lazy_import("concurrent.futures")
+    dpi, fmt, backend = render_options
+    if not plot or backend == "svg":
+        render_workers = 0
+    rows = [
+        row + (plot and render_workers <= 0,)
+        for row in read_batch_manifest(manifest)
+    ]
+    chunks = (
+        rows[i:i + chunksize] for i in range(0, len(rows), chunksize)
+    )
+    max_pending = BATCH_CHUNKS_PER_WORKER * (workers or os.cpu_count() or 1)
+    render_jobs = collections.deque()
+    print("annotating %s CSMs..." % len(rows))
+    failed = 0
+    with open_results_writer(
+        os.path.join(OBSERVED_BASE_DIR, results_file), BATCH_COLUMNS,
+        append=append
+    ) as writer, futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_batch_worker,
+        initargs=(
+            cache_dir, recorder_options, render_options, fragmenter_options
+        )
+    ) as pool, _open_stats_file(stats_file) as stats_out, _open_render_pool(
+        render_workers, dpi, fmt
+    ) as render_pool:
+        results = (
+            result
+            for chunk_results in _bounded_map(
+                pool, _annotate_batch_chunk, chunks, max_pending
+            )
+            for result in chunk_results
+        )
+        for row, records, error, stats in results:
+            if stats is not None and stats_out is not None:
+                stats["crosslink_id"], stats["peak_list"] = row[:2]
+                stats["error"] = error
+                stats_out.write("%s\n" % json.dumps(stats))
+            if records is None:
+                failed += 1
+                print("Could not annotate %s %s (%s)." % (
+                    row[0], row[1], error
+                ))
+                continue
+            writer.write_rows(row[:3] + record for record in records)
+            if render_pool is not None:
+                render_jobs.append((row, render_pool.submit(
+                    records, _spectrum_path(
+                        _batch_output_name(*row[:2]), render_pool.fmt
+                    )
+                )))
+                while render_jobs and render_jobs[0][1].done():
+                    _check_render_job(*render_jobs.popleft())
+        while render_jobs:
+            _check_render_job(*render_jobs.popleft())
+    print("-----Batch Complete-----")
+    print("Annotated %s of %s CSMs" % (len(rows) - failed, len(rows)))
 
-    # Annotate the theoretical fragments with the observed
-    annotator = Annotator()
-    observed_ion_list = convert_observed_ion_df(obs_df)
-    matched_list = annotator.annotate(theo_frag_list, observed_ion_list)
-    full_df = create_matched_ion_df(matched_list)
-    create_csv_annotations(full_df, crosslink_id)
-    plot_spectra(full_df, crosslink_id)
 
+if __name__ == "__main__":
+    args = obtain_annotation_experimental_parameters()
+    if args.stream:
+        run_stream(
+            sys.stdin, sys.stdout, args.workers, args.chunksize,
+            args.read_ahead, args.fragment_cache, args.fragmenter_options
+        )
+    elif args.batch is not None:
+        run_batch(
+            args.batch, args.workers, args.chunksize, args.fragment_cache,
+            args.plot, args.recorder_options, args.stats,
+            args.render_workers, (args.dpi, args.fmt, args.backend),
+            args.results, args.append, args.fragmenter_options
+        )
+    elif args.localize:
+        localize_csm(
+            args.crosslink_id, args.obs_csv_raw, args.tolerance, args.units,
+            Fragmenter(**args.fragmenter_options), args.linkable_residues,
+            tuple(args.protein_n_term)
+        )
+    else:
+        fragmenter = Fragmenter(**args.fragmenter_options)
+        fragment_cache = None
+        if args.fragment_cache is not None:
+            fragment_cache = FragmentCache(
+                fragmenter, cache_dir=args.fragment_cache
+            )
+        recorder = None
+        if args.recorder_options is not None:
+            recorder = StageRecorder(
+                args.crosslink_id, **args.recorder_options
+            )
+        try:
+            annotate_csm(
+                args.crosslink_id, args.obs_csv_raw, args.tolerance,
+                args.units, fragment_cache=fragment_cache, plot=args.plot,
+                recorder=recorder, fragmenter=fragmenter,
+                renderer=_get_renderer(args.dpi, args.fmt, args.backend)
+                if args.plot else None
+            )
+        finally:
+            if recorder is not None:
+                with _open_stats_file(args.stats) as stats_out:
+                    if stats_out is not None:
+                        stats_out.write("%s\n" % recorder.to_json())
+    if args.import_time:
+        report_import_times()
@@ -1,8 +1,13 @@
+import numpy as np
+
 from annotatexl.annotator.observed_ion import ObservedIon
+from annotatexl.annotator.peak_list import PeakList
 from annotatexl.common_fragment_ion import CommonFragmentIon
 from annotatexl.diagnostic_fragment_ion import DiagnosticFragmentIon
+from annotatexl.fragment_table import FragmentTable
 from annotatexl.immonium_fragment_ion import ImmoniumFragmentIon
 from annotatexl.precursor_fragment_ion import PrecursorFragmentIon
+from annotatexl.utils import window_indices
 from annotatexl.xl_fragment_ion import CrosslinkFragmentIon
 
 
@@ -29,13 +34,21 @@ class Annotator(object):
         """
         return mass * self.tolerance / 1e6
 
-    def _calc_tolerance_da(self):
+    def _calc_tolerance_da(self, mass):
         """
         Calculates the match +/- mass tolerance using Da for each 
         observed ion. 
         """
         return self.tolerance / 2.0
 
+    def tolerance_da(self, masses):
+        """
+        Returns the +/- match tolerance in Da of each of the given
+        observed masses.
+        """
+        masses = np.asarray(masses, dtype=np.float64)
+        return np.broadcast_to(self._tol_func(masses), masses.shape)
+
     def _sort_list_on_mass(self, ion_list):
         """
         Takes ion list and assumes each has a get mass function.
@@ -45,6 +58,67 @@ class Annotator(object):
             ion_list, key=lambda i: i.get_mass()
         )
 
+    def matchable_range(self, obs_masses):
+        """
+        Returns the (min, max) range of theoretical masses that can match
+        any of the observed masses within the tolerance, e.g. to bound the
+        fragments generated by the Fragmenter.
+        """
+        obs_masses = np.asarray(obs_masses, dtype=np.float64)
+        if len(obs_masses) == 0:
+            return None
+        lo, hi = obs_masses.min(), obs_masses.max()
+        return (
+            float(np.nextafter(lo - self._tol_func(lo), -np.inf)),
+            float(np.nextafter(hi + self._tol_func(hi), np.inf))
+        )
+
+    def _match_sorted(self, obs_masses, frag_masses):
+        """
+        Matches an ascending array of observed masses against an
+        ascending array of theoretical masses. Rather than comparing
+        every observed ion to every fragment, numpy.searchsorted is used
+        to find the window of fragments that can lie within the
+        tolerance of each observed ion and only that window is checked.
+        Returns three aligned arrays of observed index, fragment index
+        and absolute mass error, ordered by observed index and then
+        by fragment mass.
+
+        Parameters
+        ----------
+        obs_masses: np.ndarray
+            Sorted float64 array of observed masses
+        frag_masses: np.ndarray
+            Sorted float64 array of theoretical masses
+        """
+        obs_masses = np.asarray(obs_masses, dtype=np.float64)
+        frag_masses = np.asarray(frag_masses, dtype=np.float64)
+        eps = np.broadcast_to(
+            self._tol_func(obs_masses), obs_masses.shape
+        )
+        # Widen the window by one fragment each side so the exact
+        # err <= eps test below decides the boundaries, as before.
+        lo = np.searchsorted(frag_masses, obs_masses - eps, side="left")
+        hi = np.searchsorted(frag_masses, obs_masses + eps, side="right")
+        lo = np.maximum(lo - 1, 0)
+        hi = np.minimum(hi + 1, len(frag_masses))
+        obs_idx, frag_idx = window_indices(lo, hi)
+        err = np.abs(obs_masses[obs_idx] - frag_masses[frag_idx])
+        keep = err <= eps[obs_idx]
+        return obs_idx[keep], frag_idx[keep], err[keep]
+
+    def match_table(self, fragment_table, peak_list):
+        """
+        Matches a FragmentTable against a PeakList without creating any
+        ion objects. Returns the mass sorted table and three aligned
+        arrays of peak index, row index into the sorted table and
+        absolute mass error, ordered by peak and then fragment mass.
+        """
+        fragment_table = fragment_table.sort_by_mass()
+        return (fragment_table,) + self._match_sorted(
+            peak_list.get_masses(), fragment_table.mass
+        )
+
     def annotate(self, fragment_ion_list, observed_ion_list):
         """
         Matched each observed ion in the input peak list to the list of 
@@ -56,20 +130,48 @@ class Annotator(object):
         matched. Returns a list of ion objects containg observed ion mass and 
         theoretical mass with the calculated difference for all matches and 
         the observed mass if not matched. 
+
+        The theoretical ions can be given either as a list of FragmentIon
+        objects or as a FragmentTable, in which case FragmentIon objects
+        are only created for the matched rows. Likewise the observed ions
+        can be a list of ObservedIon objects or an already sorted PeakList.
         """
-        oi_sorted = self._sort_list_on_mass(observed_ion_list)
-        fi_sorted = self._sort_list_on_mass(fragment_ion_list)
+        if isinstance(observed_ion_list, PeakList):
+            oi_sorted = observed_ion_list
+            obs_masses = observed_ion_list.get_masses()
+        else:
+            oi_sorted = self._sort_list_on_mass(observed_ion_list)
+            obs_masses = np.fromiter(
+                (oi.get_mass() for oi in oi_sorted),
+                dtype=np.float64, count=len(oi_sorted)
+            )
+        if isinstance(fragment_ion_list, FragmentTable):
+            fi_table = fragment_ion_list.sort_by_mass()
+            frag_masses = fi_table.mass
+            matched_ions = {}
+
+            def fragment_ion(j):
+                if j not in matched_ions:
+                    matched_ions[j] = fi_table.ion(j)
+                return matched_ions[j]
+        else:
+            fi_sorted = self._sort_list_on_mass(fragment_ion_list)
+            frag_masses = np.fromiter(
+                (fi.get_mass() for fi in fi_sorted),
+                dtype=np.float64, count=len(fi_sorted)
+            )
+            fragment_ion = fi_sorted.__getitem__
+        obs_idx, frag_idx, errs = self._match_sorted(obs_masses, frag_masses)
+        matches = zip(obs_idx.tolist(), frag_idx.tolist(), errs.tolist())
+        match = next(matches, None)
         matched_list = []
         for i, oi in enumerate(oi_sorted):
-            eps = self._tol_func(oi.get_mass())
-            matched = False
-            for j, fi in enumerate(fi_sorted):
-                err = abs(oi.get_mass() - fi.get_mass())
-                if err <= eps:
-                    matched_list.append( (oi, fi, err) )
-                    matched = True
-            if not matched:
+            if match is None or match[0] != i:
                 matched_list.append( (oi, None, None) )
+                continue
+            while match is not None and match[0] == i:
+                matched_list.append( (oi, fragment_ion(match[1]), match[2]) )
+                match = next(matches, None)
         return matched_list
 
     @staticmethod
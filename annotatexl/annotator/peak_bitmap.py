@@ -0,0 +1,123 @@
+import numpy as np
+
+from annotatexl.annotator.annotator import Annotator
+from annotatexl.fragment_table import COMMON, CROSSLINK, PRECURSOR
+from annotatexl.utils import window_indices
+
+
+# Narrowest m/z bin of a PeakBitmap in Da
+MIN_BIN_WIDTH = 1e-3
+
+# Default bin width as a fraction of the +/- tolerance, the bins a
+# tolerance window spans overshoot it by at most a bin each side
+BIN_FRACTION = 0.25
+
+# Ion classes counted as hits. Diagnostic and immonium ions are shared
+# by every candidate, so they do not tell candidates apart.
+SCREENED_CLASSES = (PRECURSOR, COMMON, CROSSLINK)
+
+
+class PeakBitmap(object):
+    """
+    Coarse bitmap of the m/z bins occupied by a peak list, used to reject
+    candidate crosslinks that explain almost none of a spectrum before
+    they are annotated. Each bit is one bin of bin_width Da and is set if
+    the tolerance window of any peak overlaps the bin. The bitmap spans
+    the peaks' m/z range, so takes (range / bin_width / 8) bytes, e.g.
+    about 180 kB for the 84-2580 m/z test peak list at 10 ppm, whose
+    default bins are 0.0017 Da, and 125 kB at 0.02 Da.
+
+    A fragment mass hits if its bin is set. Every fragment that matches
+    a peak within the tolerance therefore hits. Only the precursor,
+    common and cross-linked fragments of a candidate are counted, see
+    SCREENED_CLASSES, so its hit count is an upper bound of its number
+    of these fragments that match: a candidate with fewer hits than a
+    threshold cannot reach it when annotated. The tables counted may
+    hold only some of these classes, see annotate_candidates.
+
+    Parameters
+    ----------
+    peak_list : PeakList
+        The observed peaks
+    tolerance : float
+        The match tolerance
+    units : str
+        "ppm" or "Da"
+    bin_width : float
+        The bin width in Da, defaults to BIN_FRACTION of the +/-
+        tolerance, i.e. of the tolerance in Da mode and of its median
+        over the peaks in ppm mode
+    """
+
+    def __init__(self, peak_list, tolerance=10.0, units="ppm", bin_width=None):
+        mz = peak_list.get_masses()
+        eps = Annotator(units, tolerance).tolerance_da(mz)
+        window_lo = np.nextafter(mz - eps, -np.inf)
+        window_hi = np.nextafter(mz + eps, np.inf)
+        if bin_width is None:
+            bin_width = BIN_FRACTION*np.median(eps) if len(mz) \
+                else MIN_BIN_WIDTH
+        self.bin_width = max(float(bin_width), MIN_BIN_WIDTH)
+        if len(mz) == 0:
+            self.origin = 0
+            self.n_bins = 0
+            self.bits = np.zeros(0, dtype=np.uint8)
+            return
+        lo = np.floor(window_lo / self.bin_width).astype(np.int64)
+        hi = np.floor(window_hi / self.bin_width).astype(np.int64)
+        self.origin = int(lo.min())
+        self.n_bins = int(hi.max()) - self.origin + 1
+        occupied = np.zeros(self.n_bins, dtype=bool)
+        _, bins = window_indices(lo - self.origin, hi - self.origin + 1)
+        occupied[bins] = True
+        self.bits = np.packbits(occupied)
+
+    def __repr__(self):
+        return "PeakBitmap: %s of %s bins of %s Da occupied" % (
+            self.n_occupied(), self.n_bins, self.bin_width
+        )
+
+    def __len__(self):
+        return self.n_bins
+
+    def n_occupied(self):
+        return int(np.unpackbits(self.bits).sum())
+
+    def hits(self, masses):
+        """
+        Returns a boolean array of whether each theoretical mass falls in
+        an occupied bin.
+        """
+        masses = np.asarray(masses, dtype=np.float64)
+        bins = np.floor(masses / self.bin_width).astype(np.int64) - \
+            self.origin
+        inside = (bins >= 0) & (bins < self.n_bins)
+        bins = np.where(inside, bins, 0)
+        bits = (self.bits[bins >> 3] >> (7 - (bins & 7)).astype(np.uint8)) & 1
+        return inside & (bits == 1)
+
+    def count_hits(self, fragment_tables):
+        """
+        Returns the number of hits of the SCREENED_CLASSES fragments of
+        each of a list of FragmentTables, one per candidate.
+        """
+        if not fragment_tables:
+            return np.zeros(0, dtype=np.intp)
+        lengths = [len(table) for table in fragment_tables]
+        candidates = np.repeat(np.arange(len(fragment_tables)), lengths)
+        hits = self.hits(
+            np.concatenate([table.mass for table in fragment_tables])
+        ) & np.isin(
+            np.concatenate([table.ion_class for table in fragment_tables]),
+            SCREENED_CLASSES
+        )
+        return np.bincount(
+            candidates[hits], minlength=len(fragment_tables)
+        )
+
+    def screen(self, fragment_tables, min_hits):
+        """
+        Returns the indices of the FragmentTables with at least min_hits
+        hits, i.e. the candidates worth annotating.
+        """
+        return np.flatnonzero(self.count_hits(fragment_tables) >= min_hits)
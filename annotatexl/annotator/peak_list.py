@@ -0,0 +1,97 @@
+import csv
+
+import numpy as np
+
+from annotatexl.annotator.observed_ion import ObservedIon
+
+
+class PeakListException(Exception):
+    pass
+
+
+class PeakList(object):
+    """
+    Array-backed peak list of observed ions. The m/z and intensity
+    values are held as contiguous float64 arrays sorted on m/z once,
+    when the peak list is created, so the Annotator can match against
+    them directly. ObservedIon instances are only created when a peak
+    is accessed by index or iteration.
+
+    Parameters
+    ----------
+    mz : array-like
+        The m/z values of the observed ions
+    intensity : array-like
+        The intensity values of the observed ions
+    drop_duplicates : bool
+        Keep only the first peak listed for each m/z value
+    """
+
+    def __init__(self, mz, intensity, drop_duplicates=True):
+        mz = np.asarray(mz, dtype=np.float64).ravel()
+        intensity = np.asarray(intensity, dtype=np.float64).ravel()
+        if mz.shape != intensity.shape:
+            raise PeakListException(
+                "Cannot create peak list. %s m/z values were given "
+                "with %s intensities." % (len(mz), len(intensity))
+            )
+        order = np.argsort(mz, kind="mergesort")
+        mz, intensity = mz[order], intensity[order]
+        if drop_duplicates and len(mz) > 1:
+            first = np.concatenate(([True], mz[1:] != mz[:-1]))
+            mz, intensity = mz[first], intensity[first]
+        self.mz = np.ascontiguousarray(mz)
+        self.intensity = np.ascontiguousarray(intensity)
+
+    def __repr__(self):
+        return "PeakList: %s peaks" % len(self)
+
+    def __len__(self):
+        return len(self.mz)
+
+    def __getitem__(self, i):
+        return ObservedIon(float(self.mz[i]), float(self.intensity[i]))
+
+    def __iter__(self):
+        for mz, intensity in zip(self.mz.tolist(), self.intensity.tolist()):
+            yield ObservedIon(mz, intensity)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        """
+        Reads a CSV file with a header row whose first two columns are
+        m/z and intensity. Any further columns, e.g. 'Ion Type', are
+        ignored. Fields may be quoted, e.g. "84.08", and blank lines are
+        skipped.
+        """
+        with open(csv_path, newline="") as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader, None)
+            rows = [row[:2] for row in reader if row]
+        try:
+            data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        except ValueError:
+            raise PeakListException(
+                "Cannot read peak list '%s'. The first two columns must "
+                "be numeric m/z and intensity values." % csv_path
+            )
+        return cls(data[:, 0], data[:, 1])
+
+    @classmethod
+    def from_df(cls, obs_df):
+        """
+        Creates a peak list from a DataFrame with mz and intensity columns.
+        """
+        return cls(obs_df["mz"].values, obs_df["intensity"].values)
+
+    def get_masses(self):
+        """
+        Returns the sorted m/z array of the peak list.
+        """
+        return self.mz
+
+    def get_intensities(self):
+        """
+        Returns the intensity array of the peak list, in m/z order.
+        """
+        return self.intensity
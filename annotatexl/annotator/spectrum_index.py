@@ -0,0 +1,163 @@
+from collections import namedtuple
+
+import numpy as np
+
+from annotatexl.annotator.annotator import Annotator
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragmenter import Fragmenter
+from annotatexl.utils import window_indices
+
+
+# Per-candidate scores, each an array aligned with the scored candidates:
+# the number of distinct peaks matched, the summed intensity of those
+# peaks and the number of fragment ions that matched a peak
+CandidateScores = namedtuple(
+    "CandidateScores",
+    ["n_matched_peaks", "matched_intensity", "n_matched_fragments"]
+)
+
+
+class SpectrumIndex(object):
+    """
+    Index of a peak list for scoring many candidate crosslinks against
+    one spectrum. The match window [mz - tol, mz + tol] of every peak is
+    computed once, when the index is built. As both window bounds rise
+    with m/z, the peaks that can match a theoretical mass are found with
+    two binary searches over the bounds, so scoring a candidate costs
+    only the lookups of its fragment masses. The fragments of all
+    candidates are looked up together and counted with numpy, without
+    building match lists or ion objects.
+
+    Matches are decided exactly as by Annotator.annotate, i.e. a peak
+    matches a fragment if their mass difference is within the
+    tolerance of the peak.
+
+    Parameters
+    ----------
+    peak_list : PeakList
+        The observed peaks, sorted on m/z
+    tolerance : float
+        The match tolerance
+    units : str
+        "ppm" or "Da"
+    """
+
+    def __init__(self, peak_list, tolerance=10.0, units="ppm"):
+        self.peak_list = peak_list
+        self.annotator = Annotator(units, tolerance)
+        self.mz = peak_list.get_masses()
+        self.intensity = peak_list.get_intensities()
+        self.eps = np.ascontiguousarray(self.annotator.tolerance_da(self.mz))
+        self.window_lo = self.mz - self.eps
+        self.window_hi = self.mz + self.eps
+
+    def __repr__(self):
+        return "SpectrumIndex: %s peaks" % len(self)
+
+    def __len__(self):
+        return len(self.mz)
+
+    def matchable_range(self):
+        """
+        Returns the (min, max) range of theoretical masses that can match
+        a peak, e.g. to bound the fragments generated for candidates.
+        """
+        return self.annotator.matchable_range(self.mz)
+
+    def match_masses(self, masses):
+        """
+        Matches an array of theoretical masses, in any order, against the
+        peaks. Returns two aligned arrays of mass index and peak index of
+        every match.
+        """
+        masses = np.asarray(masses, dtype=np.float64)
+        lo = np.searchsorted(self.window_hi, masses, side="left")
+        hi = np.searchsorted(self.window_lo, masses, side="right")
+        # Widen the window by one peak each side so the exact
+        # err <= eps test below decides the boundaries.
+        lo = np.maximum(lo - 1, 0)
+        hi = np.minimum(hi + 1, len(self.mz))
+        mass_idx, peak_idx = window_indices(lo, hi)
+        keep = np.abs(self.mz[peak_idx] - masses[mass_idx]) <= \
+            self.eps[peak_idx]
+        return mass_idx[keep], peak_idx[keep]
+
+    def matched_peaks(self, masses, candidates):
+        """
+        Matches the theoretical masses of many candidates at once, where
+        candidates gives the candidate number of each mass. Returns the
+        candidate number of each matched mass, and the aligned candidate
+        and peak index of each distinct (candidate, peak) match, as a
+        peak matched by several fragments of a candidate counts once.
+        """
+        candidates = np.asarray(candidates, dtype=np.intp)
+        mass_idx, peak_idx = self.match_masses(masses)
+        matched_candidates = candidates[mass_idx]
+        pairs = np.unique(matched_candidates * len(self.mz) + peak_idx)
+        pair_candidates, pair_peaks = np.divmod(pairs, max(len(self.mz), 1))
+        return matched_candidates, pair_candidates, pair_peaks
+
+    def score_masses(self, masses, candidates, n_candidates):
+        """
+        Scores the theoretical masses of many candidates at once, where
+        candidates gives the candidate number of each mass. Returns the
+        CandidateScores of the n_candidates candidates.
+        """
+        matched_candidates, pair_candidates, pair_peaks = \
+            self.matched_peaks(masses, candidates)
+        n_matched_fragments = np.bincount(
+            matched_candidates, minlength=n_candidates
+        )
+        return CandidateScores(
+            np.bincount(pair_candidates, minlength=n_candidates),
+            np.bincount(
+                pair_candidates, weights=self.intensity[pair_peaks],
+                minlength=n_candidates
+            ),
+            n_matched_fragments
+        )
+
+    @staticmethod
+    def concatenate_tables(fragment_tables):
+        """
+        Returns the masses of a list of FragmentTables, one per
+        candidate, as one array, and the candidate number of each mass.
+        """
+        masses = [table.mass for table in fragment_tables]
+        candidates = np.repeat(
+            np.arange(len(masses)), [len(m) for m in masses]
+        )
+        return (
+            np.concatenate(masses) if masses else np.empty(0), candidates
+        )
+
+    def score_tables(self, fragment_tables):
+        """
+        Scores a list of FragmentTables, one per candidate, returning
+        their CandidateScores.
+        """
+        masses, candidates = self.concatenate_tables(fragment_tables)
+        return self.score_masses(masses, candidates, len(fragment_tables))
+
+    def score_crosslinks(self, crosslinks, fragment_cache=None):
+        """
+        Scores a list of candidate Crosslinks or crosslink IDs, taking
+        their fragments from a FragmentCache if given, otherwise only
+        generating the fragments within matchable_range().
+        """
+        if fragment_cache is not None:
+            tables = [
+                fragment_cache.get(crosslink) for crosslink in crosslinks
+            ]
+        else:
+            fragmenter = Fragmenter()
+            mz_range = self.matchable_range()
+            tables = [
+                fragmenter.fragment_table(
+                    crosslink if isinstance(crosslink, Crosslink)
+                    else Crosslink.from_id(crosslink),
+                    mz_range
+                )
+                for crosslink in crosslinks
+            ]
+        return self.score_tables(tables)
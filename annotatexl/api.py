@@ -0,0 +1,331 @@
+import numpy as np
+
+from annotatexl.annotator.annotator import Annotator
+from annotatexl.annotator.peak_bitmap import PeakBitmap
+from annotatexl.annotator.peak_list import PeakList
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragment_table import ION_CLASSES
+from annotatexl.fragmenter import Fragmenter
+
+
+# Columns of the annotation records, as written to the CSV annotations
+ANNOTATION_COLUMNS = (
+    "matched", "ion_type", "roepstorff", "mz", "intensity", "error"
+)
+
+# Default fewest pre-filter hits for a candidate to be annotated
+MIN_HITS = 3
+
+# Ion classes of the candidates screened before they are fully
+# fragmented: the precursor and the terminal fragments taken straight
+# from the peptide prefix masses
+SCREEN_ION_CLASSES = ("precursor", "common")
+
+
+class AnnotationResult(object):
+    """
+    The annotation of a cross-link spectrum match held as arrays. There
+    is one row per match of a peak to a theoretical fragment ion and
+    one row for each unmatched peak, in peak m/z order, i.e. the rows
+    of Annotator.annotate.
+
+    The peak_index, fragment_index (-1 if unmatched) and error (NaN if
+    unmatched) arrays index into peak_list and the mass sorted
+    fragment_table. Ion types and Roepstorff labels are only generated
+    when requested, and records(), to_dicts() and to_df() convert the
+    result on demand.
+
+    Parameters
+    ----------
+    crosslink_id : str
+        The cross-link ID
+    peak_list : PeakList
+        The observed peaks
+    fragment_table : FragmentTable
+        The mass sorted theoretical fragment ions
+    obs_idx, frag_idx, err : np.ndarray
+        Aligned peak index, fragment index and error of each match, as
+        returned by Annotator.match_table
+    """
+
+    def __init__(
+        self, crosslink_id, peak_list, fragment_table, obs_idx, frag_idx, err
+    ):
+        self.crosslink_id = crosslink_id
+        self.peak_list = peak_list
+        self.fragment_table = fragment_table
+        unmatched = np.setdiff1d(
+            np.arange(len(peak_list)), obs_idx, assume_unique=False
+        )
+        peak_index = np.concatenate((obs_idx, unmatched))
+        order = np.argsort(peak_index, kind="mergesort")
+        self.peak_index = peak_index[order]
+        self.fragment_index = np.concatenate(
+            (frag_idx, np.full(len(unmatched), -1, dtype=np.intp))
+        )[order]
+        self.error = np.concatenate(
+            (err, np.full(len(unmatched), np.nan))
+        )[order]
+        self._roepstorff = None
+
+    def __repr__(self):
+        return "AnnotationResult: %s - %s of %s peaks matched" % (
+            self.crosslink_id,
+            len(np.unique(self.peak_index[self.matched])),
+            len(self.peak_list)
+        )
+
+    def __len__(self):
+        return len(self.peak_index)
+
+    @property
+    def matched(self):
+        """
+        Boolean array of whether each row is a match.
+        """
+        return self.fragment_index >= 0
+
+    @property
+    def mz(self):
+        return self.peak_list.mz[self.peak_index]
+
+    @property
+    def intensity(self):
+        return self.peak_list.intensity[self.peak_index]
+
+    def ion_types(self):
+        """
+        Returns the FragmentIon.ion_name() of each row, None if unmatched.
+        """
+        classes = self.fragment_table.ion_class[
+            np.maximum(self.fragment_index, 0)
+        ]
+        return [
+            ION_CLASSES[ion_class] if j >= 0 else None
+            for ion_class, j in zip(
+                classes.tolist(), self.fragment_index.tolist()
+            )
+        ]
+
+    def roepstorff(self):
+        """
+        Returns the Roepstorff label of each row, None if unmatched.
+        Labels are generated once, for the matched fragments only.
+        """
+        if self._roepstorff is None:
+            labels = {}
+            for j in self.fragment_index[self.matched].tolist():
+                if j not in labels:
+                    labels[j] = self.fragment_table.get_roepstorff(j)
+            self._roepstorff = [
+                labels[j] if j >= 0 else None
+                for j in self.fragment_index.tolist()
+            ]
+        return self._roepstorff
+
+    def records(self):
+        """
+        Generates a tuple of the ANNOTATION_COLUMNS values for each row.
+        """
+        for matched, ion_type, label, mz, intensity, err in zip(
+            self.matched.tolist(), self.ion_types(), self.roepstorff(),
+            self.mz.tolist(), self.intensity.tolist(), self.error.tolist()
+        ):
+            yield (
+                matched, ion_type, label, mz, intensity,
+                err if matched else None
+            )
+
+    def to_dicts(self):
+        """
+        Returns a list of dictionaries of the ANNOTATION_COLUMNS of each
+        row.
+        """
+        return [
+            dict(zip(ANNOTATION_COLUMNS, record))
+            for record in self.records()
+        ]
+
+    def to_df(self):
+        """
+        Returns the rows as a pandas DataFrame of the ANNOTATION_COLUMNS.
+        pandas is imported on first use.
+        """
+        import pandas as pd
+        return pd.DataFrame({
+            "matched": self.matched,
+            "ion_type": self.ion_types(),
+            "roepstorff": self.roepstorff(),
+            "mz": self.mz,
+            "intensity": self.intensity,
+            "error": self.error
+        }, columns=ANNOTATION_COLUMNS)
+
+    def matched_list(self):
+        """
+        Returns the (ObservedIon, FragmentIon or None, error or None)
+        tuples of Annotator.annotate, creating the ion objects.
+        """
+        fragment_ions = {}
+        matched_list = []
+        for i, j, err in zip(
+            self.peak_index.tolist(), self.fragment_index.tolist(),
+            self.error.tolist()
+        ):
+            if j < 0:
+                matched_list.append((self.peak_list[i], None, None))
+                continue
+            if j not in fragment_ions:
+                fragment_ions[j] = self.fragment_table.ion(j)
+            matched_list.append((self.peak_list[i], fragment_ions[j], err))
+        return matched_list
+
+
+def match_spectrum(crosslink_id, fragment_table, peak_list, annotator):
+    """
+    Matches a cross-link's FragmentTable against a PeakList with an
+    Annotator and returns the AnnotationResult.
+    """
+    fragment_table, obs_idx, frag_idx, err = annotator.match_table(
+        fragment_table, peak_list
+    )
+    return AnnotationResult(
+        crosslink_id, peak_list, fragment_table, obs_idx, frag_idx, err
+    )
+
+
+def annotate_spectrum(
+    crosslink, mz, intensity, tolerance=10.0, units="ppm",
+    fragment_cache=None, fragmenter=None, charge=None
+):
+    """
+    Annotates a cross-link spectrum match held in memory, without
+    reading or writing any files.
+
+    Parameters
+    ----------
+    crosslink : Crosslink or str
+        The cross-link or its ID, e.g. "DTHKSEIAHR-FKDLGEEHFK-a4-b2"
+    mz : array-like
+        The m/z of each peak
+    intensity : array-like
+        The intensity of each peak
+    tolerance : float
+        The match tolerance
+    units : str
+        "ppm" or "Da"
+    fragment_cache : FragmentCache
+        Optional cache to take the fragment ions from
+    fragmenter : Fragmenter
+        The Fragmenter used if there is no cache, defaults to Fragmenter()
+    charge : int
+        Optional precursor charge, fragments are only matched at charges
+        up to it as well as up to the max_charge of the Fragmenter
+
+    Returns
+    -------
+    AnnotationResult
+    """
+    if isinstance(crosslink, Crosslink):
+        crosslink_id = crosslink.to_id()
+    else:
+        crosslink_id = crosslink
+        crosslink = None
+    peak_list = PeakList(mz, intensity)
+    annotator = Annotator(units, tolerance)
+    if fragment_cache is not None:
+        fragment_table = fragment_cache.get(crosslink_id)
+    else:
+        if crosslink is None:
+            crosslink = Crosslink.from_id(crosslink_id)
+        if fragmenter is None:
+            fragmenter = Fragmenter()
+        # Only generate the fragments that can match the peaks
+        fragment_table = fragmenter.fragment_table(
+            crosslink, annotator.matchable_range(peak_list.get_masses())
+        )
+    fragment_table = fragment_table.cap_charge(charge)
+    return match_spectrum(crosslink_id, fragment_table, peak_list, annotator)
+
+
+def annotate_candidates(
+    crosslinks, mz, intensity, tolerance=10.0, units="ppm",
+    min_hits=MIN_HITS, fragment_cache=None, fragmenter=None, bin_width=None
+):
+    """
+    Screens many candidate cross-links against one spectrum and
+    annotates only the promising ones. Only the cheap precursor and
+    common fragments of every candidate, see SCREEN_ION_CLASSES, are
+    first generated and looked up in a PeakBitmap of the peaks, and the
+    candidates with fewer than min_hits hits are rejected without being
+    fully fragmented or matched. The cross-linked fragments, whose
+    double linked series are the bulk of the work, are only generated
+    for the candidates that pass.
+
+    The hit count is an upper bound of the number of precursor and
+    common fragments of a candidate that match a peak, so no candidate
+    with at least min_hits of them matching is rejected. Candidates
+    explained only by their cross-linked fragments may be.
+
+    Parameters
+    ----------
+    crosslinks : list
+        The candidate Crosslinks or cross-link IDs
+    mz, intensity : array-like
+        The m/z and intensity of each peak
+    tolerance : float
+        The match tolerance
+    units : str
+        "ppm" or "Da"
+    min_hits : int
+        The fewest pre-filter hits of the precursor and common fragments
+        for a candidate to be annotated
+    fragment_cache : FragmentCache
+        Optional cache to take the fragment ions of the candidates that
+        pass from, its Fragmenter generates the screened fragments
+    fragmenter : Fragmenter
+        The Fragmenter used if there is no cache, defaults to Fragmenter()
+    bin_width : float
+        The bin width of the PeakBitmap in Da, see PeakBitmap
+
+    Returns
+    -------
+    list
+        The AnnotationResult of each candidate passing the pre-filter, in
+        the order of crosslinks
+    """
+    peak_list = PeakList(mz, intensity)
+    annotator = Annotator(units, tolerance)
+    crosslink_ids = [
+        crosslink.to_id() if isinstance(crosslink, Crosslink) else crosslink
+        for crosslink in crosslinks
+    ]
+    crosslinks = [
+        crosslink if isinstance(crosslink, Crosslink)
+        else Crosslink.from_id(crosslink)
+        for crosslink in crosslinks
+    ]
+    if fragment_cache is not None:
+        fragmenter = fragment_cache.fragmenter
+    elif fragmenter is None:
+        fragmenter = Fragmenter()
+    mz_range = annotator.matchable_range(peak_list.get_masses())
+    screen_tables = [
+        fragmenter.fragment_table(
+            crosslink, mz_range, ion_classes=SCREEN_ION_CLASSES
+        )
+        for crosslink in crosslinks
+    ]
+    bitmap = PeakBitmap(peak_list, tolerance, units, bin_width)
+    results = []
+    for i in bitmap.screen(screen_tables, min_hits).tolist():
+        if fragment_cache is not None:
+            fragment_table = fragment_cache.get(crosslinks[i])
+        else:
+            fragment_table = fragmenter.fragment_table(
+                crosslinks[i], mz_range
+            )
+        results.append(match_spectrum(
+            crosslink_ids[i], fragment_table, peak_list, annotator
+        ))
+    return results
@@ -1,5 +1,7 @@
-from .fragment_ion import FragmentIon, FragmentIonException
-from .utils import AMINO_MONO_MASS, MASS_DICT
+from .fragment_ion import (
+    FragmentIon, FragmentIonException, charge_label, variant_label
+)
+from .utils import AMINO_MONO_MASS, ION_TYPE_MASS, charge_mz, variant_mass
 
 
 class CommonFragmentIonException(FragmentIonException):
@@ -10,16 +12,28 @@ class CommonFragmentIon(FragmentIon):
     """A derived class to encapsulate the concept of
     a common fragment ion, that is a fragment ion that
     does not possess a linker.
+
+    The mass can be supplied when it has already been calculated,
+    e.g. by the Fragmenter from the peptide prefix masses, otherwise
+    it is calculated from the sequence. The mass of an ion of charge
+    above 1 is its m/z. An ion may carry a neutral loss, e.g. "H2O", or
+    be an isotope peak, e.g. 1 for M+1.
     """
 
     def __init__(
-        self, pep_id, ion_type, pep_rep
+        self, pep_id, ion_type, pep_rep, mass=None, charge=1, loss=None,
+        isotope=0
     ):
         self.pep_id = pep_id
         self.ion_type = ion_type
         self.pep_rep = pep_rep
+        self.charge = charge
+        self.loss = loss
+        self.isotope = isotope
         self._integrity_check()
-        self.mass = self._calc_mass()
+        self.mass = charge_mz(
+            self._calc_mass() + variant_mass(loss, isotope), charge
+        ) if mass is None else mass
 
     def __repr__(self):
         return "CommonFragmentIon: %s %s - Mass: %0.2f Da" % (
@@ -81,15 +95,7 @@ class CommonFragmentIon(FragmentIon):
         mass = 0.0
         for aa in self.pep_rep:
             mass += AMINO_MONO_MASS[aa]
-        frag_dict = {
-            "a": 1.0*MASS_DICT["H"] - 1.0*(MASS_DICT["C"]+MASS_DICT["O"]),
-            "b": 1.0*MASS_DICT["H"],
-            "c": 4.0*MASS_DICT["H"] + 1.0*MASS_DICT["N"],
-            "x": 1.0*MASS_DICT["H"] + 2.0*MASS_DICT['O'] + 1.0*MASS_DICT['C'],
-            "y": 3.0*MASS_DICT["H"] + MASS_DICT['O'],
-            "z": 1.0*MASS_DICT['H'] + 1.0*MASS_DICT['O'] - 1.0*MASS_DICT["N"]
-        }
-        mass += frag_dict[self.ion_type]
+        mass += ION_TYPE_MASS[self.ion_type]
         return mass
 
     def get_mass(self):
@@ -103,12 +109,15 @@ class CommonFragmentIon(FragmentIon):
         Outputs the Roepstorff nomenclature of the
         common fragment ion.
 
-        e.g. -> "Ab1"
+        e.g. -> "Ab1", "Ab1-H2O" with a water loss or "Ab1^2+" if doubly
+        charged
         """
-        return "%s%s%s" % (
+        return "%s%s%s%s%s" % (
             "A" if self.pep_id == "alpha" else "B",
             self.ion_type,
-            len(self.pep_rep)
+            len(self.pep_rep),
+            variant_label(self.loss, self.isotope),
+            charge_label(self.charge)
         )
 
     def get_sequence(self):
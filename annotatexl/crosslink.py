@@ -1,4 +1,4 @@
-from .peptide import Peptide
+from .peptide import PEPTIDE_REGISTRY
 
 
 class CrosslinkException(Exception):
@@ -41,9 +41,9 @@ class Crosslink(object):
         self.alpha_pep_rep = alpha_pep_rep
         self.beta_pep_rep = beta_pep_rep
 
-        # Actual Peptide objects
-        self.alpha_pep = Peptide(self.alpha_pep_rep)
-        self.beta_pep = Peptide(self.beta_pep_rep)
+        # Actual Peptide objects, shared with other crosslinks
+        self.alpha_pep = PEPTIDE_REGISTRY.get(self.alpha_pep_rep)
+        self.beta_pep = PEPTIDE_REGISTRY.get(self.beta_pep_rep)
 
         # Crosslink topology tuples
         self.topology = topology
@@ -71,6 +71,16 @@ class Crosslink(object):
         topo = (int(id_spl[2][1:]), int(id_spl[3][1:]))
         return cls(alpha, beta, topo)
 
+    def to_id(self):
+        """
+        Returns the xQuest representation of the crosslink, the inverse
+        of from_id. "SHCIAEVEKDAIPENLPPLTADFAEDK-DVCKNYQEAK-a20-b4"
+        """
+        return "%s-%s-a%s-b%s" % (
+            self.alpha_pep_rep, self.beta_pep_rep,
+            self.topology[0], self.topology[1]
+        )
+
     def get_linked_amino_acid(self, peptide_id):
         """
         Identifies the amino acid involved in the crosslink for both peptides.
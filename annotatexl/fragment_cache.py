@@ -0,0 +1,143 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragment_table import FragmentTable
+from annotatexl.fragmenter import Fragmenter
+
+
+class FragmentCache(object):
+    """
+    Memoizes the mass sorted FragmentTable of each crosslink so that a
+    crosslink matched to many spectra, e.g. replicate injections or
+    neighbouring scans, is only fragmented and sorted once.
+
+    Tables are keyed by the crosslink ID and the settings key of the
+    Fragmenter, i.e. the crosslinker and ion types generated. The most
+    recently used tables are held in memory up to max_size. If a cache
+    directory is given, tables are also stored there as .npz files so
+    that later runs and other processes can reuse them.
+
+    Parameters
+    ----------
+    fragmenter : Fragmenter
+        The Fragmenter used to create missing tables, defaults to
+        Fragmenter()
+    max_size : int
+        The maximum number of tables held in memory
+    cache_dir : str
+        Optional directory of the on-disk store
+    """
+
+    def __init__(self, fragmenter=None, max_size=1024, cache_dir=None):
+        self.fragmenter = fragmenter if fragmenter is not None \
+            else Fragmenter()
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        if self.cache_dir is not None and not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self._tables = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "FragmentCache: %s tables - %s hits, %s misses" % (
+            len(self), self.hits, self.misses
+        )
+
+    def __len__(self):
+        return len(self._tables)
+
+    def _key(self, crosslink_id):
+        """
+        Returns the cache key of a crosslink ID for the fragmenter settings.
+        """
+        return (crosslink_id,) + tuple(self.fragmenter.settings_key())
+
+    def _disk_path(self, key):
+        """
+        Returns the path of the on-disk store file of a cache key.
+        """
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "%s.npz" % digest)
+
+    def _load(self, key):
+        """
+        Loads the table of a cache key from the on-disk store, returning
+        None if it has not been stored or cannot be read.
+        """
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return FragmentTable.load(path)
+        except Exception:
+            return None
+
+    def _store(self, key, table):
+        """
+        Writes the table of a cache key to the on-disk store. The file is
+        written under a temporary name and renamed so that concurrent
+        processes never read a partially written table.
+        """
+        if self.cache_dir is None:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                table.save(tmp_file)
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remember(self, key, table):
+        """
+        Adds a table to the in-memory cache, evicting the least recently
+        used tables beyond max_size.
+        """
+        for column in table.columns().values():
+            column.flags.writeable = False
+        self._tables[key] = table
+        while len(self._tables) > self.max_size:
+            self._tables.popitem(last=False)
+
+    def get(self, crosslink):
+        """
+        Returns the mass sorted FragmentTable of a crosslink, given as a
+        Crosslink or crosslink ID, from the cache or by fragmenting it.
+        The returned table is shared and its columns are read-only.
+        """
+        if isinstance(crosslink, Crosslink):
+            crosslink_id = crosslink.to_id()
+        else:
+            crosslink_id = crosslink
+            crosslink = None
+        key = self._key(crosslink_id)
+        table = self._tables.get(key)
+        if table is not None:
+            self._tables.move_to_end(key)
+            self.hits += 1
+            return table
+        table = self._load(key)
+        if table is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if crosslink is None:
+                crosslink = Crosslink.from_id(crosslink_id)
+            table = self.fragmenter.fragment_table(crosslink).sort_by_mass()
+            self._store(key, table)
+        self._remember(key, table)
+        return table
+
+    def clear(self):
+        """
+        Empties the in-memory cache. The on-disk store is kept.
+        """
+        self._tables.clear()
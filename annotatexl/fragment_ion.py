@@ -5,6 +5,25 @@ class FragmentIonException(Exception):
     pass
 
 
+def charge_label(charge):
+    """
+    Returns the Roepstorff nomenclature charge suffix of an ion, e.g.
+    "^2+", or "" for a singly charged ion.
+    """
+    return "^%s+" % charge if charge > 1 else ""
+
+
+def variant_label(loss=None, isotope=0):
+    """
+    Returns the Roepstorff nomenclature suffix of the neutral loss and
+    isotope peak of an ion, e.g. "-H2O" or "(M+1)", or "" for neither.
+    """
+    return "%s%s" % (
+        "-%s" % loss if loss is not None else "",
+        "(M+%s)" % isotope if isotope > 0 else ""
+    )
+
+
 class FragmentIon(object):
     """This abstract base case specifies an interface
     to be used by all derived subclasses that are of
@@ -0,0 +1,378 @@
+from collections import namedtuple
+
+import numpy as np
+
+from annotatexl.common_fragment_ion import CommonFragmentIon
+from annotatexl.diagnostic_fragment_ion import DiagnosticFragmentIon
+from annotatexl.immonium_fragment_ion import ImmoniumFragmentIon
+from annotatexl.precursor_fragment_ion import PrecursorFragmentIon
+from annotatexl.utils import DIAG_IONS, charge_mz
+from annotatexl.xl_fragment_ion import CrosslinkFragmentIon
+
+
+# Ion class codes of the ion_class column, named as FragmentIon.ion_name()
+ION_CLASSES = ("precursor", "diagnostic", "immonium", "common", "crosslink")
+PRECURSOR, DIAGNOSTIC, IMMONIUM, COMMON, CROSSLINK = range(len(ION_CLASSES))
+
+# Ion type codes of the ion_type_a/ion_type_b columns, -1 is no ion type
+ION_TYPES = "abcxyz"
+
+# Direction codes of the dir_a/dir_b columns, -1 is an unfragmented peptide
+DIRECTIONS = "NC"
+
+# Neutral loss codes of the loss column, -1 is no loss
+NEUTRAL_LOSSES = ("H2O", "NH3")
+
+# Diagnostic ion names indexed by the aux column of diagnostic rows
+DIAG_ION_NAMES = tuple(sorted(DIAG_IONS))
+
+
+class FragmentTableException(Exception):
+    pass
+
+
+class FragmentRange(
+    namedtuple("FragmentRange", ["pep_rep", "start", "end", "direction"])
+):
+    """
+    Index range representation of a peptide fragment. start and end are
+    the zero-indexed, end exclusive, positions of the fragment residues in
+    pep_rep and direction is "N", "C" or None for an unfragmented peptide.
+    The fragment string is only created by to_str().
+
+    Example: the 2 residue C' fragment of "PEPTID" is
+    FragmentRange("PEPTID", 4, 6, "C"), i.e. "DI".
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_length(cls, pep_rep, length, direction):
+        """
+        Creates the range of the fragment of a given length from the N'
+        or C' terminus, or of the whole peptide if direction is None.
+        """
+        if direction is None:
+            return cls(pep_rep, 0, len(pep_rep), None)
+        if direction == "N":
+            return cls(pep_rep, 0, length, direction)
+        return cls(pep_rep, len(pep_rep) - length, len(pep_rep), direction)
+
+    @property
+    def length(self):
+        return self.end - self.start
+
+    def to_str(self):
+        """
+        Outputs the string representation of the fragment in the
+        correct direction, i.e. C' fragments are reversed.
+        """
+        frag = self.pep_rep[self.start:self.end]
+        return frag[::-1] if self.direction == "C" else frag
+
+
+class FragmentTable(object):
+    """
+    Columnar representation of the theoretical fragment ions of a
+    crosslink. Each theoretical ion is a row across a set of NumPy
+    arrays rather than an individual FragmentIon object, so that a
+    crosslink with thousands of fragments costs a few small arrays.
+
+    The columns are:
+        mass: float64 singly protonated mass, or m/z if charge > 1
+        ion_class: int8 code into ION_CLASSES
+        ion_type_a, ion_type_b: int8 code into ION_TYPES, -1 if none
+        len_a, len_b: int16 alpha/beta fragment lengths, 0 if absent
+        dir_a, dir_b: int8 code into DIRECTIONS, -1 if unfragmented
+        aux: int16 amino acid byte of immonium ions or index into
+            DIAG_ION_NAMES of diagnostic ions
+        charge: int8 charge of the ion
+        loss: int8 code into NEUTRAL_LOSSES, -1 if none
+        isotope: int8 isotope peak of the ion, e.g. 1 for M+1
+
+    Roepstorff labels and sequence strings are not stored. They are
+    generated for a row only when its FragmentIon view is requested
+    with ion(), e.g. once a row has been matched.
+
+    Parameters
+    ----------
+    alpha_pep_rep : str
+        The alpha peptide string representation
+    beta_pep_rep : str
+        The beta peptide string representation
+    columns : dict
+        Column name to array-like, missing columns take their default
+    is_sorted : bool
+        Whether the rows are already in ascending mass order
+    """
+
+    COLUMNS = (
+        ("mass", np.float64, np.nan),
+        ("ion_class", np.int8, -1),
+        ("ion_type_a", np.int8, -1),
+        ("ion_type_b", np.int8, -1),
+        ("len_a", np.int16, 0),
+        ("len_b", np.int16, 0),
+        ("dir_a", np.int8, -1),
+        ("dir_b", np.int8, -1),
+        ("aux", np.int16, 0),
+        ("charge", np.int8, 1),
+        ("loss", np.int8, -1),
+        ("isotope", np.int8, 0)
+    )
+
+    def __init__(
+        self, alpha_pep_rep, beta_pep_rep, columns, is_sorted=False
+    ):
+        self.alpha_pep_rep = alpha_pep_rep
+        self.beta_pep_rep = beta_pep_rep
+        self.is_sorted = is_sorted
+        size = len(columns["mass"])
+        for name, dtype, default in self.COLUMNS:
+            values = np.asarray(columns.get(name, default), dtype=dtype)
+            setattr(
+                self, name, np.array(np.broadcast_to(values, (size,)))
+            )
+
+    def __repr__(self):
+        return "FragmentTable: %s-%s - %s fragment ions" % (
+            self.alpha_pep_rep, self.beta_pep_rep, len(self)
+        )
+
+    def __len__(self):
+        return len(self.mass)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.ion(i)
+
+    def __getitem__(self, i):
+        return self.ion(i)
+
+    @classmethod
+    def from_blocks(cls, alpha_pep_rep, beta_pep_rep, blocks):
+        """
+        Creates a table by concatenating blocks of rows. Each block is a
+        dictionary of column name to array-like, where scalars are
+        broadcast to the length of the block's mass column.
+        """
+        sizes = [len(np.atleast_1d(block["mass"])) for block in blocks]
+        columns = {}
+        for name, dtype, default in cls.COLUMNS:
+            columns[name] = np.concatenate([
+                np.broadcast_to(
+                    np.asarray(block.get(name, default), dtype=dtype),
+                    (size,)
+                )
+                for block, size in zip(blocks, sizes)
+            ]) if blocks else np.empty(0, dtype=dtype)
+        return cls(alpha_pep_rep, beta_pep_rep, columns)
+
+    def columns(self):
+        """
+        Returns a dictionary of column name to array.
+        """
+        return dict(
+            (name, getattr(self, name)) for name, _, _ in self.COLUMNS
+        )
+
+    def take(self, indices, is_sorted=False):
+        """
+        Returns a new table containing the rows at the given indices.
+        """
+        return FragmentTable(
+            self.alpha_pep_rep, self.beta_pep_rep,
+            dict(
+                (name, column[indices])
+                for name, column in self.columns().items()
+            ),
+            is_sorted=is_sorted
+        )
+
+    def _append_copies(self, rows, n_copies, **updates):
+        """
+        Returns a new table with n_copies of each of the given rows
+        appended after the existing rows, the copies of a row adjacent.
+        Columns given as keyword arguments hold the values of the copies
+        and the others are repeated from the rows.
+        """
+        columns = {}
+        for name, column in self.columns().items():
+            copies = updates[name] if name in updates \
+                else np.repeat(column[rows], n_copies)
+            columns[name] = np.concatenate((column, copies))
+        return FragmentTable(self.alpha_pep_rep, self.beta_pep_rep, columns)
+
+    def expand_charges(self, rows, max_charge):
+        """
+        Returns a new table with the given rows of singly charged ions
+        also at each charge from 2 to max_charge, appended after the
+        existing rows. The m/z of every added row is calculated at once
+        by broadcasting the row masses against the charges.
+        """
+        charges = np.arange(2, max_charge + 1)
+        if len(charges) == 0 or len(rows) == 0:
+            return self
+        return self._append_copies(
+            rows, len(charges),
+            mass=charge_mz(self.mass[rows, None], charges[None, :]).ravel(),
+            charge=np.tile(charges, len(rows))
+        )
+
+    def cap_charge(self, max_charge):
+        """
+        Returns the table without the ions above max_charge, e.g. the
+        precursor charge of a spectrum, keeping the row order.
+        """
+        if max_charge is None or not (self.charge > max_charge).any():
+            return self
+        return self.take(
+            np.flatnonzero(self.charge <= max_charge),
+            is_sorted=self.is_sorted
+        )
+
+    def expand_offsets(self, rows, offsets, **codes):
+        """
+        Returns a new table with the given rows of singly charged ions
+        also shifted by each mass offset, appended after the existing
+        rows. The shifted masses are calculated at once by broadcasting
+        the row masses against the offsets. Keyword arguments give the
+        value of a column for each offset, e.g. isotope=[1, 2] for the
+        offsets of the M+1 and M+2 isotope peaks.
+        """
+        offsets = np.asarray(offsets, dtype=np.float64)
+        if len(offsets) == 0 or len(rows) == 0:
+            return self
+        return self._append_copies(
+            rows, len(offsets),
+            mass=(self.mass[rows, None] + offsets[None, :]).ravel(),
+            **dict(
+                (name, np.tile(values, len(rows)))
+                for name, values in codes.items()
+            )
+        )
+
+    def sort_by_mass(self):
+        """
+        Returns the table in ascending mass order. A stable sort is used
+        so rows of equal mass keep their fragmentation order.
+        """
+        if self.is_sorted:
+            return self
+        order = np.argsort(self.mass, kind="mergesort")
+        return self.take(order, is_sorted=True)
+
+    def save(self, file_obj):
+        """
+        Saves the table columns and peptides to an open binary file
+        in NumPy .npz format.
+        """
+        np.savez(
+            file_obj,
+            alpha_pep_rep=np.array(self.alpha_pep_rep),
+            beta_pep_rep=np.array(self.beta_pep_rep),
+            is_sorted=np.array(self.is_sorted),
+            **self.columns()
+        )
+
+    @classmethod
+    def load(cls, file_obj):
+        """
+        Loads a table saved with save() from a path or open binary file.
+        Columns missing from the file take their default.
+        """
+        with np.load(file_obj) as data:
+            return cls(
+                str(data["alpha_pep_rep"]), str(data["beta_pep_rep"]),
+                dict(
+                    (name, data[name]) for name, _, _ in cls.COLUMNS
+                    if name in data.files
+                ),
+                is_sorted=bool(data["is_sorted"])
+            )
+
+    def fragment_ranges(self, i):
+        """
+        Returns the alpha and beta FragmentRange of row i, None for a
+        peptide that is not part of the fragment ion.
+        """
+        ranges = []
+        for pep_rep, length, direction in (
+            (self.alpha_pep_rep, self.len_a[i], self.dir_a[i]),
+            (self.beta_pep_rep, self.len_b[i], self.dir_b[i])
+        ):
+            if length == 0:
+                ranges.append(None)
+                continue
+            ranges.append(FragmentRange.from_length(
+                pep_rep, int(length),
+                DIRECTIONS[direction] if direction != -1 else None
+            ))
+        return tuple(ranges)
+
+    def ion(self, i):
+        """
+        Returns the FragmentIon view of row i, generating its sequence
+        strings and carrying the tabulated mass.
+        """
+        ion_class = self.ion_class[i]
+        mass = float(self.mass[i])
+        variant = {
+            "charge": int(self.charge[i]),
+            "loss": NEUTRAL_LOSSES[self.loss[i]] if self.loss[i] != -1
+            else None,
+            "isotope": int(self.isotope[i])
+        }
+        if ion_class == PRECURSOR:
+            return PrecursorFragmentIon(
+                (self.alpha_pep_rep, self.beta_pep_rep), mass=mass,
+                **variant
+            )
+        if ion_class == DIAGNOSTIC:
+            return DiagnosticFragmentIon(DIAG_ION_NAMES[self.aux[i]])
+        if ion_class == IMMONIUM:
+            return ImmoniumFragmentIon(chr(self.aux[i]))
+        alpha_frag, beta_frag = (
+            frag_range.to_str() if frag_range is not None else ""
+            for frag_range in self.fragment_ranges(i)
+        )
+        type_a, type_b = self.ion_type_a[i], self.ion_type_b[i]
+        if ion_class == COMMON:
+            if self.len_a[i] > 0:
+                return CommonFragmentIon(
+                    "alpha", ION_TYPES[type_a], alpha_frag, mass=mass,
+                    **variant
+                )
+            return CommonFragmentIon(
+                "beta", ION_TYPES[type_b], beta_frag, mass=mass, **variant
+            )
+        if ion_class == CROSSLINK:
+            return CrosslinkFragmentIon(
+                (alpha_frag, beta_frag),
+                (
+                    ION_TYPES[type_a] if type_a != -1 else None,
+                    ION_TYPES[type_b] if type_b != -1 else None
+                ),
+                mass=mass, **variant
+            )
+        raise FragmentTableException(
+            "Row %s has unknown ion class code '%s'." % (i, ion_class)
+        )
+
+    def ion_name(self, i):
+        """
+        Returns type of ion of row i i.e. cross-linked, immonium etc.
+        """
+        return ION_CLASSES[self.ion_class[i]]
+
+    def get_roepstorff(self, i):
+        """
+        Outputs the Roepstorff nomenclature of row i.
+        """
+        return self.ion(i).get_roepstorff()
+
+    def get_sequence_str(self, i):
+        """
+        Outputs the string representation of the fragment ion of row i.
+        """
+        return self.ion(i).get_sequence_str()
@@ -0,0 +1,119 @@
+from collections import namedtuple
+
+from annotatexl.fragment_table import ION_CLASSES, ION_TYPES
+
+
+class FragmentationProfileException(Exception):
+    pass
+
+
+class FragmentationProfile(
+    namedtuple(
+        "FragmentationProfile",
+        ["name", "ion_types", "ion_classes", "ion_lengths"]
+    )
+):
+    """
+    The ion series and ion classes a Fragmenter generates for a
+    fragmentation method. Ions outside the profile are never generated,
+    so they neither enlarge the fragment table nor cause false matches.
+
+    Example: HCD gives b and y ions and the a2 ion, i.e.
+    FragmentationProfile("HCD", "aby", ION_CLASSES, (("a", (2,)),)).
+
+    Parameters
+    ----------
+    name : str
+        The profile name
+    ion_types : str
+        The ion types generated, in ION_TYPES order, e.g. "by". Crosslinked
+        fragments of both peptides pair a with x, b with y and c with z,
+        so a pair is only generated if both its ion types are.
+    ion_classes : tuple
+        The ION_CLASSES generated
+    ion_lengths : tuple
+        (ion type, lengths) pairs restricting an ion type to fragments of
+        the given lengths, e.g. (("a", (2,)),) for only the a2 ion
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def custom(
+        cls, ion_types, ion_classes=ION_CLASSES, ion_lengths=(),
+        name="custom"
+    ):
+        """
+        Creates a validated profile of any ion types and ion classes.
+        """
+        unknown = set(ion_types) - set(ION_TYPES)
+        unknown.update(set(ion_classes) - set(ION_CLASSES))
+        unknown.update(
+            set(ion_type for ion_type, _ in ion_lengths) - set(ion_types)
+        )
+        if unknown:
+            raise FragmentationProfileException(
+                "Unknown or excluded ion types or classes %s in profile "
+                "'%s'." % (", ".join(sorted(unknown)), name)
+            )
+        return cls(
+            name,
+            "".join(t for t in ION_TYPES if t in ion_types),
+            tuple(c for c in ION_CLASSES if c in ion_classes),
+            tuple(
+                (ion_type, tuple(sorted(lengths)))
+                for ion_type, lengths in sorted(ion_lengths)
+            )
+        )
+
+    def series_ion_types(self, ion_types):
+        """
+        Returns the generated ion types of a series of ion types, e.g.
+        "b" of "abc" for HCD.
+        """
+        return "".join(t for t in ion_types if t in self.ion_types)
+
+    def pair_ion_types(self, alpha_ion_types, beta_ion_types):
+        """
+        Returns the alpha and beta ion types of the generated pairs of a
+        pair of series of ion types, e.g. ("b", "y") of ("abc", "xyz")
+        for HCD.
+        """
+        pairs = [
+            (a, b) for a, b in zip(alpha_ion_types, beta_ion_types)
+            if a in self.ion_types and b in self.ion_types
+        ]
+        return (
+            "".join(a for a, _ in pairs), "".join(b for _, b in pairs)
+        )
+
+
+# Profiles of the common fragmentation methods by name, "all" generates
+# every ion type and class
+PROFILES = dict((profile.name, profile) for profile in (
+    FragmentationProfile.custom(ION_TYPES, name="all"),
+    FragmentationProfile.custom("aby", name="CID"),
+    FragmentationProfile.custom(
+        "aby", ion_lengths=(("a", (2,)),), name="HCD"
+    ),
+    FragmentationProfile.custom("cz", name="ETD"),
+    FragmentationProfile.custom("bcyz", name="EThcD")
+))
+
+DEFAULT_PROFILE = "all"
+
+
+def get_profile(profile):
+    """
+    Returns a FragmentationProfile given itself or its name in PROFILES.
+    """
+    if isinstance(profile, FragmentationProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise FragmentationProfileException(
+            "Unknown fragmentation profile '%s', expected one of %s." % (
+                profile, ", ".join(sorted(PROFILES))
+            )
+        )
@@ -1,329 +1,560 @@
-import itertools
-import pprint
+import numpy as np
 
-from annotatexl.common_fragment_ion import CommonFragmentIon
 from annotatexl.crosslink import Crosslink
-from annotatexl.immonium_fragment_ion import ImmoniumFragmentIon
-from annotatexl.diagnostic_fragment_ion import DiagnosticFragmentIon
-from annotatexl.precursor_fragment_ion import PrecursorFragmentIon
-from annotatexl.xl_fragment_ion import CrosslinkFragmentIon
+from annotatexl.fragment_table import (
+    COMMON, CROSSLINK, DIAG_ION_NAMES, DIAGNOSTIC, DIRECTIONS, IMMONIUM,
+    ION_TYPES, NEUTRAL_LOSSES, PRECURSOR, FragmentTable
+)
+from annotatexl.fragmentation_profile import DEFAULT_PROFILE, get_profile
+from annotatexl.utils import (
+    DIAG_IONS, IMMON_MASS, ION_TYPE_MASS, ISOTOPE_MASS, LINKER_MASS,
+    MASS_DICT, NEUTRAL_LOSS_MASS, NEUTRAL_LOSS_RESIDUES, PROTON_MASS,
+    TERMINI_MASS, window_indices
+)
+
+
+# (peptide, direction, ion types) of each terminal fragment series
+TERMINAL_SERIES = (
+    ('A', 'N', 'abc'),
+    ('B', 'N', 'abc'),
+    ('A', 'C', 'xyz'),
+    ('B', 'C', 'xyz')
+)
+
+# Ion classes generated at every charge up to the Fragmenter max_charge,
+# and with neutral losses and isotope peaks, diagnostic and immonium ions
+# are only singly charged monoisotopic ions
+CHARGED_CLASSES = (PRECURSOR, COMMON, CROSSLINK)
+
+
+class FragmenterException(Exception):
+    pass
 
 
 class Fragmenter(object):
-    def __init__(self):
-        pass
+    """
+    Generates the theoretical fragment ions of a crosslink.
+
+    Parameters
+    ----------
+    mz_range : tuple
+        Optional (min, max) m/z range, e.g. the instrument scan range.
+        Only fragment ions within the range are generated.
+    profile : FragmentationProfile or str
+        The ion types and ion classes generated, or the name of one of
+        fragmentation_profile.PROFILES, defaults to every ion
+    max_charge : int
+        Precursor, common and crosslinked ions are generated at each
+        charge from 1 to max_charge, e.g. the precursor charge, for
+        spectra that are not deconvoluted. Defaults to singly charged.
+    neutral_losses : tuple
+        Neutral losses of NEUTRAL_LOSSES, e.g. ("H2O", "NH3"), also
+        generated for the precursor, common and crosslinked ions that
+        contain a residue able to lose them, see NEUTRAL_LOSS_RESIDUES
+    isotopes : int
+        Number of isotope peaks, e.g. 2 for M+1 and M+2, also generated
+        for the precursor, common and crosslinked ions
+    """
+
+    # Crosslinker whose linker mass and diagnostic ions are generated
+    crosslinker = "BS3/DSS"
+
+    def __init__(
+        self, mz_range=None, profile=DEFAULT_PROFILE, max_charge=1,
+        neutral_losses=(), isotopes=0
+    ):
+        self.mz_range = mz_range
+        self.profile = get_profile(profile)
+        self.max_charge = max(int(max_charge), 1)
+        unknown = set(neutral_losses) - set(NEUTRAL_LOSSES)
+        if unknown:
+            raise FragmenterException(
+                "Unknown neutral loss(es) %s, expected %s." % (
+                    ", ".join(sorted(unknown)), ", ".join(NEUTRAL_LOSSES)
+                )
+            )
+        self.neutral_losses = tuple(
+            loss for loss in NEUTRAL_LOSSES if loss in neutral_losses
+        )
+        self.isotopes = max(int(isotopes), 0)
+
+    def settings_key(self):
+        """
+        Returns a tuple identifying the fragmentation settings, i.e. the
+        crosslinker, ion types generated, m/z range, the ion classes and
+        ion lengths of the profile, the maximum charge, neutral losses and
+        isotope peaks. Fragment tables of the same crosslink are
+        identical for equal settings keys.
+        """
+        return (
+            self.crosslinker, self.profile.ion_types, self.mz_range,
+            self.profile.ion_classes, self.profile.ion_lengths,
+            self.max_charge, self.neutral_losses, self.isotopes
+        )
 
-    def _n_frag_ion_strs(self, pep_rep):
+    def mass_range(self, mz_range):
         """
-        Generator to create the fragment ions from the N' side
-        of the peptide. E.g. "PEPTID" creates ['P', 'PE', 'PEP',
-        'PEPT', 'PEPTI', 'PEPTID']
+        Returns the (min, max) range of singly protonated monoisotopic
+        masses of the ions that fall within an m/z range at any charge up
+        to max_charge, after any neutral loss or isotope shift, i.e. the
+        m/z range itself if none are generated.
         """
-        # +1 includes full length for xl frag
-        for aa in range(1, len(pep_rep)+1):
-            yield pep_rep[0:aa]
+        if mz_range is None:
+            return mz_range
+        max_loss = max(
+            [0.0] + [NEUTRAL_LOSS_MASS[loss] for loss in self.neutral_losses]
+        )
+        return (
+            mz_range[0] - self.isotopes*ISOTOPE_MASS,
+            self.max_charge*mz_range[1] -
+            (self.max_charge - 1)*PROTON_MASS + max_loss
+        )
+
+    def _expand_variants(self, crosslink, table, rows):
+        """
+        Returns the table with the neutral losses and isotope peaks of
+        the given rows appended, as vectorised mass offsets. A loss is
+        only applied to rows whose fragments contain one of its residues,
+        counted from the peptide prefix counts. Isotope peaks are only
+        generated for the ions without a loss.
+        """
+        n_rows = len(table)
+        for loss in self.neutral_losses:
+            residues = NEUTRAL_LOSS_RESIDUES[loss]
+            counts = 0
+            for peptide, lengths, directions in (
+                (crosslink.alpha_pep, table.len_a[rows], table.dir_a[rows]),
+                (crosslink.beta_pep, table.len_b[rows], table.dir_b[rows])
+            ):
+                prefix_counts = peptide.get_prefix_counts(residues)
+                # Count of each (direction, length), an unfragmented
+                # peptide is its full length N' fragment
+                lookup = np.zeros((2, len(peptide.pep_rep) + 1), dtype=int)
+                lookup[0, 1:] = prefix_counts['N']
+                lookup[1, 1:] = prefix_counts['C']
+                counts = counts + lookup[np.maximum(directions, 0), lengths]
+            table = table.expand_offsets(
+                rows[counts > 0], [-NEUTRAL_LOSS_MASS[loss]],
+                loss=[NEUTRAL_LOSSES.index(loss)]
+            )
+        isotopes = np.arange(1, self.isotopes + 1)
+        table = table.expand_offsets(
+            rows, isotopes*ISOTOPE_MASS, isotope=isotopes
+        )
+        # Carry the added rows on to the charge expansion
+        return table, np.concatenate((rows, np.arange(n_rows, len(table))))
 
-    def _c_frag_ion_strs(self, pep_rep):
+    def _crosslink_prefix_masses(self, crosslink):
         """
-        Reverses string to get C' ions. Uses _n_frag_ion_strs to
-        generate all C' ions. E.g. "PEPTID" is first reversed to
-        "DITPEP" to create ['D', 'DI', 'DIT', 'DITP', 'DITPE',
-        'DITPEP']
+        Returns the N' and C' cumulative residue masses of both the alpha
+        and beta peptides of a crosslink. These are held by the interned
+        Peptide objects, so are shared by every crosslink of a peptide.
         """
-        rev = "".join(list(reversed(pep_rep)))
-        return self._n_frag_ion_strs(rev)
+        return {
+            'A': crosslink.alpha_pep.get_prefix_masses(),
+            'B': crosslink.beta_pep.get_prefix_masses()
+        }
+
+    def _terminal_series_masses(self, prefix_masses):
+        """
+        Returns the masses of every terminal fragment of both peptides as
+        a (fragment length - 1, ion type) array for each of the
+        TERMINAL_SERIES, keyed by (ion class, peptide, direction). The
+        common fragments are the prefix masses plus the ion type
+        adjustment. The single linked fragments add the full residue
+        mass, termini and linker of the complete peptide. Neither depends
+        on the link sites, which only decide the rows taken from each
+        array, so they are shared by every topology of a peptide pair.
+        """
+        series_masses = {}
+        for pep_id, direction, ion_types in TERMINAL_SERIES:
+            ion_types = self.profile.series_ion_types(ion_types)
+            complete_pep = 'B' if pep_id == 'A' else 'A'
+            prefix = prefix_masses[pep_id][direction][:, None]
+            offsets = self._ion_type_offsets(ion_types)[None, :]
+            base = (
+                prefix_masses[complete_pep]['N'][-1] +
+                TERMINI_MASS + LINKER_MASS
+            )
+            series_masses[(COMMON, pep_id, direction)] = prefix + offsets
+            series_masses[(CROSSLINK, pep_id, direction)] = \
+                prefix + base + offsets
+        return series_masses
+
+    def _restrict_lengths(self, block):
+        """
+        Removes the rows of a fragment series block whose ion type the
+        profile restricts to other fragment lengths, e.g. every a ion
+        but a2 for HCD.
+        """
+        if not self.profile.ion_lengths:
+            return block
+        keep = np.ones(len(block["mass"]), dtype=bool)
+        for suffix in "ab":
+            ion_codes = block.get("ion_type_%s" % suffix)
+            if ion_codes is None:
+                continue
+            for ion_type, lengths in self.profile.ion_lengths:
+                keep &= (
+                    (np.asarray(ion_codes) != ION_TYPES.index(ion_type)) |
+                    np.isin(block["len_%s" % suffix], lengths)
+                )
+        if keep.all():
+            return block
+        return dict(
+            (name, values[keep] if np.ndim(values) else values)
+            for name, values in block.items()
+        )
 
-    def _n_frag_ion_strs_up_to_linker(self, pep_rep, position):
+    @staticmethod
+    def _ion_type_offsets(ion_types):
         """
-        Generator to create the fragment ion strings for the
-        N' common fragment ions i.e. the abc ions up to but not
-        including the linker. E.g. "PEPTID, (4)" creates
-        ['P'. 'PE', 'PEP'].
+        Returns an array of the ion type mass adjustments for a string
+        of ion types e.g. 'abc'.
         """
-        for i, frag in enumerate(self._n_frag_ion_strs(pep_rep)):
-            if i < position:
-                yield frag
+        return np.array([ION_TYPE_MASS[t] for t in ion_types])
 
-    def _c_frag_ion_strs_up_to_linker(self, pep_rep, position):
+    @staticmethod
+    def _ion_type_codes(ion_types):
         """
-        Generator to create the fragment ion strings for the
-        C' common fragment ions i.e. the xyz ions up to but not
-        including the linker. E.g. "PEPTID" becomes "DITPEP" with
-        forward position 4 (3 zero-indexed), which becomes
-        zero-indexed position 2, to create ['D', 'DI'].
+        Returns an array of the FragmentTable ion type codes for a string
+        of ion types e.g. 'abc'.
         """
-        new_pos = len(pep_rep) - position - 1
-        rev = "".join(list(reversed(pep_rep)))
-        return self._n_frag_ion_strs_up_to_linker(rev, new_pos)
+        return np.array([ION_TYPES.index(t) for t in ion_types])
+
+    def _common_frag_lengths(self, pep_rep, position, direction):
+        """
+        Returns an array of the lengths of the common fragments of a
+        peptide from the N' or C' terminus, i.e. those up to but not
+        including the linker. Together with the peptide and direction a
+        length identifies the fragment's FragmentRange, so no fragment
+        strings are created. E.g. "PEPTID" linked at zero-indexed position
+        3 gives N' lengths [1, 2, 3] for ['P', 'PE', 'PEP'] and C' lengths
+        [1, 2] for ['D', 'DI'].
+        """
+        if direction == 'C':
+            position = len(pep_rep) - position - 1
+        return np.arange(1, position + 1)
+
+    def _linked_frag_lengths(
+        self, pep_rep, position, direction, complete=True
+    ):
+        """
+        Returns an array of the lengths of the linked fragments of a
+        peptide from the N' or C' terminus, i.e. those that include the
+        linker, in ascending length. The full length peptide is only
+        included if complete is True. E.g. "PEPTID" linked at zero-indexed
+        position 3 gives N' lengths [4, 5, 6] for ['PEPT', 'PEPTI',
+        'PEPTID'] and C' lengths [3, 4, 5, 6] for ['DIT', ..., 'DITPEP'].
+        """
+        if direction == 'C':
+            position = len(pep_rep) - position - 1
+        stop = len(pep_rep) + 1 if complete else len(pep_rep)
+        return np.arange(position + 1, stop)
 
-    def _common_frag_ion_strs_dict(self, crosslink):
+    @staticmethod
+    def _peptide_columns(pep_id, lengths, ion_codes, direction):
         """
-        Creates a dictionary of all common fragment ions up to but
-        not including the linker position for the given crosslink
-        and crosslink topology.
+        Returns the FragmentTable length, ion type and direction columns
+        of either the alpha ('A') or beta ('B') peptide of a block.
         """
-        alpha = crosslink.alpha_pep_rep
-        beta = crosslink.beta_pep_rep
-        topo = crosslink.topology_zero
+        suffix = "a" if pep_id == 'A' else "b"
         return {
-            'An': self._n_frag_ion_strs_up_to_linker(alpha, topo[0]),
-            'Bn': self._n_frag_ion_strs_up_to_linker(beta, topo[1]),
-            'Ac': self._c_frag_ion_strs_up_to_linker(alpha, topo[0]),
-            'Bc': self._c_frag_ion_strs_up_to_linker(beta, topo[1])
+            "len_%s" % suffix: lengths,
+            "ion_type_%s" % suffix: ion_codes,
+            "dir_%s" % suffix: (
+                DIRECTIONS.index(direction) if direction is not None
+                else -1
+            )
         }
 
-    def _immonium_frag_ions(self, crosslink):
+    def _immonium_frag_block(self, crosslink):
         """
         Creates Immonium Ions from unique amino acids in crosslink.
         """
         unique_amino_acids = crosslink.get_unique_amino_acids()
-        for amino_acid in unique_amino_acids:
-            yield ImmoniumFragmentIon(amino_acid)
+        return {
+            "mass": [IMMON_MASS[aa] for aa in unique_amino_acids],
+            "ion_class": IMMONIUM,
+            "aux": [ord(aa) for aa in unique_amino_acids]
+        }
 
-    def _diagnostic_frag_ions(self, crosslink):
+    def _diagnostic_frag_block(self, crosslink):
         """
         Creates the diagnostic ions for BS3/DSS crosslinker
         """
-        ions=['DI_1', 'DI_2']
-        for di in ions:
-            yield DiagnosticFragmentIon(di)
+        return {
+            "mass": [DIAG_IONS[di] for di in DIAG_ION_NAMES],
+            "ion_class": DIAGNOSTIC,
+            "aux": np.arange(len(DIAG_ION_NAMES))
+        }
 
-    def _precursor_fragment_ion(self, crosslink):
+    def _precursor_frag_block(self, crosslink, prefix_masses):
         """
         Generates ion for full cross-linked precursor
         """
-        alpha = crosslink.alpha_pep_rep
-        beta = crosslink.beta_pep_rep
-        frag_rep = (alpha, beta)
-        yield PrecursorFragmentIon(frag_rep)
-
-    def _common_frag_ions(self, crosslink):
-        """
-        Returns a generator that produces every potential
-        common fragment ions for both alpha and beta peptides
-        from both N' and C' terminal directions, including all
-        6 variations of 'abc' and 'xyz' ion types.
-        """
-        common_strs_dict = self._common_frag_ion_strs_dict(crosslink)
-        # Create the An common fragment ions
-        for frag in common_strs_dict["An"]:
-            for ion_type in 'abc':
-                yield CommonFragmentIon(
-                    "alpha", ion_type, frag
-                )
-        # Create the Bn common fragment ions
-        for frag in common_strs_dict["Bn"]:
-            for ion_type in 'abc':
-                yield CommonFragmentIon(
-                    "beta", ion_type, frag
-                )
-        # Create the Ac common fragment ions
-        for frag in common_strs_dict["Ac"]:
-            for ion_type in 'xyz':
-                yield CommonFragmentIon(
-                    "alpha", ion_type, frag
-                )
-        # Create the Bc common fragment ions
-        for frag in common_strs_dict["Bc"]:
-            for ion_type in 'xyz':
-                yield CommonFragmentIon(
-                    "beta", ion_type, frag
-                )
+        mass = (
+            prefix_masses['A']['N'][-1] + prefix_masses['B']['N'][-1] +
+            2*TERMINI_MASS + 1.0*MASS_DICT["H"] + LINKER_MASS
+        )
+        return {
+            "mass": [mass],
+            "ion_class": PRECURSOR,
+            "len_a": len(crosslink.alpha_pep_rep),
+            "len_b": len(crosslink.beta_pep_rep)
+        }
 
-    def _n_frag_ion_strs_linked(self, pep_rep, position, complete=True):
+    def _common_frag_blocks(self, crosslink, series_masses):
         """
-        Creates the linked N' fragment ions by taking the set of all possible
-        fragments and fragment ions that don't include the linker,
-        i.e. those before the amino acid at the linker position given
-        by the crosslink topology.
-        Removes the full precursor sequence from the final list.
+        Creates the blocks of every potential common fragment ion for
+        both alpha and beta peptides from both N' and C' terminal
+        directions, including all 6 variations of 'abc' and 'xyz' ion
+        types. Masses are the rows of the terminal series masses up to
+        the link site.
         """
-        linked = set(self._n_frag_ion_strs(pep_rep)) - \
-            set(self._n_frag_ion_strs_up_to_linker(pep_rep, position))
-        pep_list = sorted(linked, key=lambda x: len(x))
-        if not complete:
-            pep_list = pep_list[:-1]
-        for pep in pep_list:
-            yield pep
+        peptides = {
+            'A': (crosslink.alpha_pep_rep, crosslink.topology_zero[0]),
+            'B': (crosslink.beta_pep_rep, crosslink.topology_zero[1])
+        }
+        # Create the An, Bn, Ac and Bc common fragment ions
+        for pep_id, direction, ion_types in TERMINAL_SERIES:
+            ion_types = self.profile.series_ion_types(ion_types)
+            pep_rep, position = peptides[pep_id]
+            lengths = self._common_frag_lengths(
+                pep_rep, position, direction
+            )
+            masses = series_masses[(COMMON, pep_id, direction)][lengths - 1]
+            block = {"mass": masses.ravel(), "ion_class": COMMON}
+            block.update(self._peptide_columns(
+                pep_id,
+                np.repeat(lengths, len(ion_types)),
+                np.tile(self._ion_type_codes(ion_types), len(lengths)),
+                direction
+            ))
+            yield self._restrict_lengths(block)
 
-    def _c_frag_ion_strs_linked(self, pep_rep, position, complete=True):
-        """
-        Calculates the new position of the crosslinker for a reversed
-        peptide sequence.
-        Creates the linked C' fragment ions by using the _n_frag_ion_strs
-        method and providing it with a set of reversed peptide sequences.
+    def _crosslinked_single_frag_blocks(self, crosslink, series_masses):
         """
-        new_pos = len(pep_rep) - position - 1
-        rev = "".join(list(reversed(pep_rep)))
-        return self._n_frag_ion_strs_linked(rev, new_pos, complete)
+        Creates all ion types for the single fragmentation event crosslinks.
+        The complete peptide contributes its full residue mass plus termini,
+        the fragmented peptide its prefix mass plus ion type adjustment,
+        i.e. the rows of the terminal series masses from the link site.
+        The last linked fragment of each series is the precursor ion and
+        is not included.
+        """
+        peptides = {
+            'A': (crosslink.alpha_pep_rep, crosslink.topology_zero[0]),
+            'B': (crosslink.beta_pep_rep, crosslink.topology_zero[1])
+        }
+        # Create the LAn, LBn, LAc and LBc crosslinked fragment ions
+        for frag_pep, direction, ion_types in TERMINAL_SERIES:
+            ion_types = self.profile.series_ion_types(ion_types)
+            complete_pep = 'B' if frag_pep == 'A' else 'A'
+            pep_rep, position = peptides[frag_pep]
+            lengths = self._linked_frag_lengths(
+                pep_rep, position, direction
+            )[:-1]
+            masses = series_masses[(CROSSLINK, frag_pep, direction)][
+                lengths - 1
+            ]
+            block = {"mass": masses.ravel(), "ion_class": CROSSLINK}
+            block.update(self._peptide_columns(
+                frag_pep,
+                np.repeat(lengths, len(ion_types)),
+                np.tile(self._ion_type_codes(ion_types), len(lengths)),
+                direction
+            ))
+            block.update(self._peptide_columns(
+                complete_pep, len(peptides[complete_pep][0]), -1, None
+            ))
+            yield self._restrict_lengths(block)
 
-    def _crosslinked_single_frag_ions_strs_dict(self, crosslink):
+    def _crosslinked_double_frag_blocks(
+        self, crosslink, prefix_masses, mz_range=None
+    ):
         """
-        Cartesian product of N' and C' fragment ions for alpha and beta
-        peptides. Results passed to a dictionary defining direction of
-        fragment ion and whether A or B is complete.
+        Creates all ion types for the double fragmentation event crosslinks.
+        Masses for each Cartesian product are built from the prefix masses
+        of the (alpha fragment, beta fragment, ion pair) combinations.
+
+        As prefix masses increase with fragment length, the beta fragments
+        that can fall within mz_range for each alpha fragment form a single
+        window, found with numpy.searchsorted. Only combinations within
+        these windows are created, so fragments outside the observable
+        range are pruned in whole blocks before they are generated.
         """
         alpha = crosslink.alpha_pep_rep
         beta = crosslink.beta_pep_rep
         topo = crosslink.topology_zero
-
-        An_B_cp = itertools.product(
-            self._n_frag_ion_strs_linked(alpha, topo[0], complete=True),
-            [beta]
-        )
-        A_Bn_cp = itertools.product(
-            [alpha],
-            self._n_frag_ion_strs_linked(beta, topo[1], complete=True),
-        )
-        Ac_B_cp = itertools.product(
-            self._c_frag_ion_strs_linked(alpha, topo[0], complete=True),
-            [beta]
+        # Create the An-Bn, Ac-Bn, An-Bc and Ac-Bc crosslinked fragment ions
+        series = (
+            ('N', 'N', 'abc', 'abc'),
+            ('C', 'N', 'xyz', 'abc'),
+            ('N', 'C', 'abc', 'xyz'),
+            ('C', 'C', 'xyz', 'xyz')
         )
-        A_Bc_cp = itertools.product(
-            [alpha],
-            self._c_frag_ion_strs_linked(beta, topo[1], complete=True),
-        )
-        return {
-            'A-Bn': [i for i in A_Bn_cp],
-            'A-Bc': [i for i in A_Bc_cp],
-            'An-B': [i for i in An_B_cp],
-            'Ac-B': [i for i in Ac_B_cp]
-        }
-
-    def _crosslinked_single_frag_ions(self, crosslink):
-        """
-        Creates all ion types for the single fragmentation event crosslinks.
-        """
-        xl_single_frag_strs_dict = \
-            self._crosslinked_single_frag_ions_strs_dict(
-                crosslink
+        for alpha_dir, beta_dir, alpha_ion_types, beta_ion_types in series:
+            alpha_ion_types, beta_ion_types = self.profile.pair_ion_types(
+                alpha_ion_types, beta_ion_types
             )
-        
-        # Remove last item of cartesian product as it represents 
-        # the precursor ion. Removed from list as list is sorted
-        # Dict is not
-        xl_single_frag_strs_dict['A-Bn'].pop()
-        xl_single_frag_strs_dict['A-Bc'].pop()
-        xl_single_frag_strs_dict['An-B'].pop()
-        xl_single_frag_strs_dict['Ac-B'].pop()
-
-        # Create the LAn crosslinked fragment ions
-        for alpha_frag, beta_frag in xl_single_frag_strs_dict["An-B"]:
-            for ion_type in 'abc':
-                yield CrosslinkFragmentIon(
-                    (alpha_frag, beta_frag),
-                    (ion_type, None)
-                )
-        # Create the LBn crosslinked fragment ions
-        for alpha_frag, beta_frag in xl_single_frag_strs_dict["A-Bn"]:
-            for ion_type in 'abc':
-                yield CrosslinkFragmentIon(
-                    (alpha_frag, beta_frag),
-                    (None, ion_type)
-                )
-        # Create the LAc crosslinked fragment ions
-        for alpha_frag, beta_frag in xl_single_frag_strs_dict["Ac-B"]:
-            for ion_type in 'xyz':
-                yield CrosslinkFragmentIon(
-                    (alpha_frag, beta_frag),
-                    (ion_type, None)
+            if not alpha_ion_types:
+                continue
+            alpha_lengths = self._linked_frag_lengths(
+                alpha, topo[0], alpha_dir, complete=False
+            )
+            beta_lengths = self._linked_frag_lengths(
+                beta, topo[1], beta_dir, complete=False
+            )
+            alpha_masses = prefix_masses['A'][alpha_dir][alpha_lengths - 1]
+            beta_masses = prefix_masses['B'][beta_dir][beta_lengths - 1]
+            pair_offsets = (
+                self._ion_type_offsets(alpha_ion_types) +
+                self._ion_type_offsets(beta_ion_types) + LINKER_MASS
+            )
+            if mz_range is None:
+                beta_lo = np.zeros(len(alpha_lengths), dtype=int)
+                beta_hi = np.full(len(alpha_lengths), len(beta_lengths))
+            else:
+                beta_lo = np.searchsorted(
+                    beta_masses,
+                    mz_range[0] - alpha_masses - pair_offsets.max(),
+                    side="left"
                 )
-        # Create the LBc crosslinked fragment ions
-        for alpha_frag, beta_frag in xl_single_frag_strs_dict["A-Bc"]:
-            for ion_type in 'xyz':
-                yield CrosslinkFragmentIon(
-                    (alpha_frag, beta_frag),
-                    (None, ion_type)
+                beta_hi = np.searchsorted(
+                    beta_masses,
+                    mz_range[1] - alpha_masses - pair_offsets.min(),
+                    side="right"
                 )
+            alpha_idx, beta_idx = window_indices(beta_lo, beta_hi)
+            masses = (
+                alpha_masses[alpha_idx, None] + beta_masses[beta_idx, None] +
+                pair_offsets[None, :]
+            ).ravel()
+            n_pairs = len(alpha_ion_types)
+            block = {"mass": masses, "ion_class": CROSSLINK}
+            block.update(self._peptide_columns(
+                'A',
+                np.repeat(alpha_lengths[alpha_idx], n_pairs),
+                np.tile(
+                    self._ion_type_codes(alpha_ion_types), len(alpha_idx)
+                ),
+                alpha_dir
+            ))
+            block.update(self._peptide_columns(
+                'B',
+                np.repeat(beta_lengths[beta_idx], n_pairs),
+                np.tile(
+                    self._ion_type_codes(beta_ion_types), len(beta_idx)
+                ),
+                beta_dir
+            ))
+            yield self._restrict_lengths(block)
 
-    def _crosslinked_double_frag_ions_strs_dict(self, crosslink):
-        """
-        Cartesian product of N' and C' fragment ions for alpha and beta
-        peptides. Results passed to a dictionary defining direction of
-        fragment ion and whether A or B is complete.
-        """
-        alpha = crosslink.alpha_pep_rep
-        beta = crosslink.beta_pep_rep
-        topo = crosslink.topology_zero
+    def fragment_table(
+        self, crosslink, mz_range=None, series_masses=None, ion_classes=None
+    ):
+        """
+        Fragments the crosslink peptides to generate the fragment ion
+        series as a columnar FragmentTable. The cumulative residue masses
+        of both peptides are calculated once and shared by every ion
+        series.
 
-        An_Bn_cp = itertools.product(
-            self._n_frag_ion_strs_linked(alpha, topo[0], complete=False),
-            self._n_frag_ion_strs_linked(beta, topo[1], complete=False)
-        )
-        Ac_Bn_cp = itertools.product(
-            self._c_frag_ion_strs_linked(alpha, topo[0], complete=False),
-            self._n_frag_ion_strs_linked(beta, topo[1], complete=False),
-        )
-        An_Bc_cp = itertools.product(
-            self._n_frag_ion_strs_linked(alpha, topo[0], complete=False),
-            self._c_frag_ion_strs_linked(beta, topo[1], complete=False)
-        )
-        Ac_Bc_cp = itertools.product(
-            self._c_frag_ion_strs_linked(alpha, topo[0], complete=False),
-            self._c_frag_ion_strs_linked(beta, topo[1], complete=False),
-        )
-        return {
-            'An-Bn': An_Bn_cp,
-            'Ac-Bn': Ac_Bn_cp,
-            'An-Bc': An_Bc_cp,
-            'Ac-Bc': Ac_Bc_cp
-        }
+        If an m/z range is given, or the Fragmenter has one, only fragment
+        ions within it are included, e.g. the range of the observed peak
+        list as given by Annotator.matchable_range. The terminal series
+        masses of the peptide pair may be given to share them between
+        topologies, see site_fragment_tables.
 
-    def _crosslinked_double_frag_ions(self, crosslink):
-        """
-        Creates all ion types for the double fragmentation event crosslinks.
-        """
-        xl_double_frag_strs_dict = \
-            self._crosslinked_double_frag_ions_strs_dict(
-                crosslink
+        Only the ion classes and ion types of the profile are generated.
+        If ion_classes are given only those of them in the profile are,
+        e.g. ("precursor", "common") for the cheap terminal fragments
+        screened by annotate_candidates.
+        If neutral losses or isotope peaks are generated the precursor,
+        common and crosslinked ions are expanded with them by
+        _expand_variants. If max_charge is above 1 these ions are then
+        expanded to every charge with FragmentTable.expand_charges and
+        the mass column holds their m/z. Double linked fragments are
+        pruned to the singly protonated masses that can fall within the
+        m/z range after these expansions.
+        """
+        if mz_range is None:
+            mz_range = self.mz_range
+        mass_range = self.mass_range(mz_range)
+        if ion_classes is None:
+            ion_classes = self.profile.ion_classes
+        else:
+            ion_classes = [
+                c for c in self.profile.ion_classes if c in ion_classes
+            ]
+        prefix_masses = self._crosslink_prefix_masses(crosslink)
+        if series_masses is None:
+            series_masses = self._terminal_series_masses(prefix_masses)
+        blocks = []
+        if "precursor" in ion_classes:
+            blocks.append(
+                self._precursor_frag_block(crosslink, prefix_masses)
             )
-        # Create the An-Bn crosslinked fragment ions
-        for frag_pair in xl_double_frag_strs_dict["An-Bn"]:
-            for ion_pair in zip('abc', 'abc'):
-                yield CrosslinkFragmentIon(
-                    frag_pair, ion_pair
-                )
-        # Create the Ac-Bn crosslinked fragment ions
-        for frag_pair in xl_double_frag_strs_dict["Ac-Bn"]:
-            for ion_pair in zip('xyz', 'abc'):
-                yield CrosslinkFragmentIon(
-                    frag_pair, ion_pair
-                )
-        # Create the An-Bc crosslinked fragment ions
-        for frag_pair in xl_double_frag_strs_dict["An-Bc"]:
-            for ion_pair in zip('abc', 'xyz'):
-                yield CrosslinkFragmentIon(
-                    frag_pair, ion_pair
-                )
-        # Create the Ac-Bc crosslinked fragment ions
-        for frag_pair in xl_double_frag_strs_dict["Ac-Bc"]:
-            for ion_pair in zip('xyz', 'xyz'):
-                yield CrosslinkFragmentIon(
-                    frag_pair, ion_pair
+        if "diagnostic" in ion_classes:
+            blocks.append(self._diagnostic_frag_block(crosslink))
+        if "immonium" in ion_classes:
+            blocks.append(self._immonium_frag_block(crosslink))
+        if "common" in ion_classes:
+            blocks.extend(
+                self._common_frag_blocks(crosslink, series_masses)
+            )
+        if "crosslink" in ion_classes:
+            blocks.extend(
+                self._crosslinked_single_frag_blocks(crosslink, series_masses)
+            )
+            blocks.extend(self._crosslinked_double_frag_blocks(
+                crosslink, prefix_masses, mass_range
+            ))
+        table = FragmentTable.from_blocks(
+            crosslink.alpha_pep_rep, crosslink.beta_pep_rep, blocks
+        )
+        if self.max_charge > 1 or self.neutral_losses or self.isotopes:
+            charged = np.isin(table.ion_class, CHARGED_CLASSES)
+            if mass_range is not None:
+                charged &= (
+                    (table.mass >= mass_range[0]) &
+                    (table.mass <= mass_range[1])
                 )
+            rows = np.flatnonzero(charged)
+            if self.neutral_losses or self.isotopes:
+                table, rows = self._expand_variants(crosslink, table, rows)
+            table = table.expand_charges(rows, self.max_charge)
+        if mz_range is not None:
+            table = table.take(np.flatnonzero(
+                (table.mass >= mz_range[0]) & (table.mass <= mz_range[1])
+            ))
+        return table
 
-    def _fragment(self, crosslink):
-        """
-        Fragments the crosslink peptides to generate fragment ions series.
-        """
-        for frag in self._precursor_fragment_ion(crosslink):
-            yield frag
-        for frag in self._diagnostic_frag_ions(crosslink):
-            yield frag
-        for frag in self._immonium_frag_ions(crosslink):
-            yield frag
-        for frag in self._common_frag_ions(crosslink):
-            yield frag
-        for frag in self._crosslinked_single_frag_ions(crosslink):
-            yield frag
-        for frag in self._crosslinked_double_frag_ions(crosslink):
-            yield frag
+    def site_fragment_tables(
+        self, alpha_pep_rep, beta_pep_rep, topologies, mz_range=None
+    ):
+        """
+        Fragments a peptide pair linked at each of a list of one-indexed
+        (alpha, beta) topologies, yielding a (Crosslink, FragmentTable)
+        for each. The terminal fragment masses, which do not depend on
+        the link sites, are calculated once for the pair, and only the
+        linked fragments of each topology are recalculated.
+        """
+        series_masses = None
+        for topology in topologies:
+            crosslink = Crosslink(alpha_pep_rep, beta_pep_rep, topology)
+            if series_masses is None:
+                series_masses = self._terminal_series_masses(
+                    self._crosslink_prefix_masses(crosslink)
+                )
+            yield crosslink, self.fragment_table(
+                crosslink, mz_range, series_masses
+            )
 
-    def cid(self, crosslink):
+    def cid(self, crosslink, mz_range=None):
         """
-        Uses the fragment method on a crosslinked object to generate
-        xl_fragment_ion and common_fragment_ion objects.
+        Uses the fragment_table method on a crosslinked object to generate
+        xl_fragment_ion and common_fragment_ion objects. The objects are
+        views over the rows of the table.
         """
-        original_frags = self._fragment(crosslink)
-        for frag in original_frags:
+        for frag in self.fragment_table(crosslink, mz_range):
             yield frag
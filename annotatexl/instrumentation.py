@@ -0,0 +1,163 @@
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+
+# Stages of annotating a cross-link spectrum match, in pipeline order
+STAGES = ("load", "fragment", "match", "csv", "plot")
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+# Number of allocation sites written to a tracemalloc profile
+TRACEMALLOC_TOP = 25
+
+
+class InstrumentationException(Exception):
+    pass
+
+
+class StageRecorder(object):
+    """
+    Records the wall time, counts, e.g. of peaks or fragment ions, and
+    memory allocations of each stage of annotating one cross-link
+    spectrum match, so that a slow run can be attributed to loading,
+    fragmentation, matching, output or plotting.
+
+    The change in allocated memory blocks is always recorded as it is
+    essentially free. If trace_memory is True the net and peak bytes
+    allocated in each stage are also recorded with tracemalloc, which
+    slows down the stages being measured.
+
+    A single stage can additionally be profiled with cProfile, written
+    as a .prof file for pstats/snakeviz, or tracemalloc, written as a
+    text file of the top allocation sites, named
+    "<csm_id>_<stage>.prof" or "<csm_id>_<stage>_tracemalloc.txt".
+
+    Parameters
+    ----------
+    csm_id : str
+        Name of the cross-link spectrum match in the output
+    trace_memory : bool
+        Record the bytes allocated in each stage with tracemalloc
+    profile_stage : str
+        Optional stage of STAGES to profile
+    profile_mode : str
+        One of PROFILE_MODES
+    profile_dir : str
+        Directory to write profiles to, defaults to the current directory
+    """
+
+    def __init__(
+        self, csm_id, trace_memory=False, profile_stage=None,
+        profile_mode="cprofile", profile_dir=None
+    ):
+        if profile_stage is not None and profile_stage not in STAGES:
+            raise InstrumentationException(
+                "Cannot profile unknown stage '%s'." % profile_stage
+            )
+        if profile_mode not in PROFILE_MODES:
+            raise InstrumentationException(
+                "Unknown profile mode '%s'." % profile_mode
+            )
+        self.csm_id = csm_id
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile_mode = profile_mode
+        self.profile_dir = profile_dir if profile_dir is not None else "."
+        self.stages = {}
+
+    def __repr__(self):
+        return "StageRecorder: %s - %s stages, %0.3f ms" % (
+            self.csm_id, len(self.stages), self.total_ms()
+        )
+
+    def _profile_path(self, name, suffix):
+        return os.path.join(
+            self.profile_dir, "%s_%s%s" % (self.csm_id, name, suffix)
+        )
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Context manager timing the enclosed stage. It yields the stats
+        dictionary of the stage, to which counts can be added, e.g.
+        stats["n_peaks"] = len(peak_list). The stats are recorded even
+        if the stage raises.
+        """
+        stats = {}
+        profiler = None
+        snapshot = None
+        started_tracing = False
+        profile = name == self.profile_stage
+        if (self.trace_memory or (
+            profile and self.profile_mode == "tracemalloc"
+        )) and not tracemalloc.is_tracing():
+            tracemalloc.start(25 if profile else 1)
+            started_tracing = True
+        if profile and self.profile_mode == "tracemalloc":
+            snapshot = tracemalloc.take_snapshot()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        blocks_start = sys.getallocatedblocks()
+        if profile and self.profile_mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            wall = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self._profile_path(name, ".prof"))
+            stats["wall_ms"] = wall * 1000.0
+            stats["alloc_blocks"] = sys.getallocatedblocks() - blocks_start
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                stats["alloc_net_kb"] = (current - traced_start) / 1024.0
+                stats["alloc_peak_kb"] = (peak - traced_start) / 1024.0
+            if snapshot is not None:
+                self._write_tracemalloc_profile(name, snapshot)
+            if started_tracing:
+                tracemalloc.stop()
+            self.stages[name] = stats
+
+    def _write_tracemalloc_profile(self, name, snapshot):
+        """
+        Writes the allocation sites that grew most during a stage.
+        """
+        top_stats = tracemalloc.take_snapshot().compare_to(
+            snapshot, "lineno"
+        )
+        with open(
+            self._profile_path(name, "_tracemalloc.txt"), "w"
+        ) as profile_file:
+            for stat in top_stats[:TRACEMALLOC_TOP]:
+                profile_file.write("%s\n" % stat)
+
+    def total_ms(self):
+        """
+        Returns the summed wall time of all recorded stages.
+        """
+        return sum(stats["wall_ms"] for stats in self.stages.values())
+
+    def to_dict(self):
+        """
+        Returns the stage stats of the CSM in the order they ran.
+        """
+        return {
+            "csm": self.csm_id,
+            "total_ms": self.total_ms(),
+            "stages": dict(self.stages)
+        }
+
+    def to_json(self):
+        """
+        Returns the stage stats as a single line of JSON.
+        """
+        return json.dumps(self.to_dict())
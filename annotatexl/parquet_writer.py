@@ -0,0 +1,165 @@
+import glob
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from annotatexl.fragment_table import ION_CLASSES
+
+
+class ParquetWriterException(Exception):
+    pass
+
+
+# Name of each part file of a results dataset
+PART_FILE = "part-%05d.parquet"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ParquetWriterException(
+            "Parquet output requires pyarrow, install it with "
+            "pip install -r requirements/parquet.txt"
+        )
+
+
+def column_types():
+    """
+    Returns the Arrow type of each annotation results column. ion_type
+    is dictionary encoded against the fixed ION_CLASSES dictionary so
+    that every row group and part file shares the same codes.
+    """
+    _require_pyarrow()
+    return {
+        "crosslink_id": pa.string(),
+        "peak_list": pa.string(),
+        "tolerance": pa.float64(),
+        "matched": pa.bool_(),
+        "ion_type": pa.dictionary(pa.int8(), pa.string()),
+        "roepstorff": pa.string(),
+        "mz": pa.float64(),
+        "intensity": pa.float64(),
+        "error": pa.float64()
+    }
+
+
+class ParquetResultsWriter(object):
+    """
+    Writes annotation rows to a Parquet dataset with a typed schema, so
+    that study-level queries read only the columns they need and error
+    and roepstorff are proper nullable columns rather than mixed
+    floats, None and NaN. Each write_rows call, i.e. each cross-link
+    spectrum match, becomes one row group.
+
+    The dataset is a directory of part files. A new writer replaces any
+    existing part files unless append is True, when it adds a new part
+    file alongside them. Requires pyarrow.
+
+    Has the interface of ResultsWriter, rows being tuples in the order
+    of columns.
+
+    Parameters
+    ----------
+    path : str
+        The dataset directory
+    columns : tuple
+        The column names of each row, each a key of column_types()
+    append : bool
+        Add a part file to an existing dataset rather than replacing it
+    """
+
+    fmt = "parquet"
+
+    def __init__(self, path, columns, append=False):
+        _require_pyarrow()
+        types = column_types()
+        unknown = [column for column in columns if column not in types]
+        if unknown:
+            raise ParquetWriterException(
+                "Cannot write unknown column(s) %s to Parquet." %
+                ", ".join(unknown)
+            )
+        self.path = path
+        self.columns = tuple(columns)
+        self.schema = pa.schema(
+            [pa.field(column, types[column]) for column in self.columns]
+        )
+        self.n_rows = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        parts = sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+        if not append:
+            for part in parts:
+                os.remove(part)
+            parts = []
+        n_part = len(parts)
+        while os.path.exists(os.path.join(path, PART_FILE % n_part)):
+            n_part += 1
+        self.part_path = os.path.join(path, PART_FILE % n_part)
+        self._writer = pq.ParquetWriter(self.part_path, self.schema)
+        self._ion_codes = dict(
+            (ion_class, code) for code, ion_class in enumerate(ION_CLASSES)
+        )
+
+    def __repr__(self):
+        return "ParquetResultsWriter: %s - %s rows" % (
+            self.part_path, self.n_rows
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _ion_type_array(self, values):
+        """
+        Dictionary encodes the ion types against ION_CLASSES, None being
+        null.
+        """
+        codes = pa.array(
+            [self._ion_codes.get(value) for value in values], type=pa.int8()
+        )
+        return pa.DictionaryArray.from_arrays(
+            codes, pa.array(ION_CLASSES, type=pa.string())
+        )
+
+    def write_rows(self, rows):
+        """
+        Writes rows, each a sequence of values in column order, as a
+        single row group.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        arrays = []
+        for field, values in zip(self.schema, zip(*rows)):
+            if field.name == "ion_type":
+                arrays.append(self._ion_type_array(values))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        self._writer.write_table(
+            pa.Table.from_arrays(arrays, schema=self.schema),
+            row_group_size=len(rows)
+        )
+        self.n_rows += len(rows)
+
+    def close(self):
+        """
+        Writes the Parquet footer and closes the part file.
+        """
+        self._writer.close()
+
+
+def read_results(path, columns=None, filters=None):
+    """
+    Reads a Parquet results dataset, or a single part file, as a
+    pyarrow Table. Only the given columns are read and filters, e.g.
+    [("matched", "=", True)], skip row groups that cannot match.
+    """
+    _require_pyarrow()
+    return pq.read_table(path, columns=columns, filters=filters)
@@ -1,10 +1,21 @@
+from collections import OrderedDict
+
+import numpy as np
+
 from annotatexl.aminoacid import AminoAcid
+from annotatexl.utils import residue_masses
+
+
+class PeptideException(Exception):
+    pass
 
 
 class Peptide(object):
     def __init__(self, pep_rep):
         self.pep_rep = pep_rep
         self.aa_list = self._create_aa_list()
+        self._prefix_masses = None
+        self._prefix_counts = {}
 
     def _create_aa_list(self):
         """
@@ -37,7 +48,7 @@ class Peptide(object):
         """
         Reverse pep to generate ions from C'
         """
-        rev = ''.join(list(reversed(self.pep_rep)))
+        rev = self.pep_rep[::-1]
         for aa in range(1, len(rev)+1):
             yield rev[0:aa]
 
@@ -45,4 +56,97 @@ class Peptide(object):
         """
         Calculate the total mass of the peptide.
         """
-        return self._get_backbone_mass()
\ No newline at end of file
+        return self._get_backbone_mass()
+
+    def get_prefix_masses(self):
+        """
+        Returns the cumulative residue masses of the peptide from the
+        N' and C' termini as read-only arrays, calculated on first use.
+        Element k-1 of each array is the residue mass of the fragment of
+        length k. E.g. "PEPTID" gives N' masses for ['P', 'PE', ...,
+        'PEPTID'] and C' masses for ['D', 'DI', ..., 'DITPEP'].
+        """
+        if self._prefix_masses is None:
+            residues = residue_masses(self.pep_rep)
+            if np.isnan(residues).any():
+                raise PeptideException(
+                    "Cannot calculate masses of peptide '%s'. Peptide "
+                    "representation contains unknown amino acids"
+                    % self.pep_rep
+                )
+            prefix_masses = {
+                'N': np.cumsum(residues),
+                'C': np.cumsum(residues[::-1])
+            }
+            for masses in prefix_masses.values():
+                masses.flags.writeable = False
+            self._prefix_masses = prefix_masses
+        return self._prefix_masses
+
+    def get_prefix_counts(self, residues):
+        """
+        Returns the cumulative counts of any of the given residues in the
+        peptide from the N' and C' termini as read-only arrays, cached
+        for each residues string. Element k-1 of each array is the count
+        in the fragment of length k. E.g. "PEPTID" and "STDE" give N'
+        counts [0, 1, 1, 2, 2, 3] and C' counts [1, 1, 2, 2, 3, 3].
+        """
+        prefix_counts = self._prefix_counts.get(residues)
+        if prefix_counts is None:
+            present = np.array([aa in residues for aa in self.pep_rep])
+            prefix_counts = {
+                'N': np.cumsum(present),
+                'C': np.cumsum(present[::-1])
+            }
+            for counts in prefix_counts.values():
+                counts.flags.writeable = False
+            self._prefix_counts[residues] = prefix_counts
+        return prefix_counts
+
+
+class PeptideRegistry(object):
+    """
+    Interns Peptide objects by their string representation, so that
+    every Crosslink containing the same peptide shares one Peptide and
+    its terminal fragment mass arrays are only calculated once. The most
+    recently used peptides are held up to max_size, so a long running
+    process does not accumulate every peptide it has seen.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of peptides held
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._peptides = OrderedDict()
+
+    def __len__(self):
+        return len(self._peptides)
+
+    def get(self, pep_rep):
+        """
+        Returns the interned Peptide for a peptide string, creating it
+        on first use and evicting the least recently used peptides
+        beyond max_size.
+        """
+        peptide = self._peptides.get(pep_rep)
+        if peptide is not None:
+            self._peptides.move_to_end(pep_rep)
+            return peptide
+        peptide = Peptide(pep_rep)
+        self._peptides[pep_rep] = peptide
+        while len(self._peptides) > self.max_size:
+            self._peptides.popitem(last=False)
+        return peptide
+
+    def clear(self):
+        """
+        Removes all interned peptides.
+        """
+        self._peptides.clear()
+
+
+# Registry shared by all Crosslink objects
+PEPTIDE_REGISTRY = PeptideRegistry()
@@ -1,5 +1,10 @@
-from annotatexl.fragment_ion import FragmentIon, FragmentIonException
-from .utils import MASS_DICT, AMINO_MONO_MASS
+from annotatexl.fragment_ion import (
+    FragmentIon, FragmentIonException, charge_label, variant_label
+)
+from .utils import (
+    AMINO_MONO_MASS, LINKER_MASS, MASS_DICT, TERMINI_MASS, charge_mz,
+    variant_mass
+)
 
 class PrecursorFragmentIonException(FragmentIonException):
     pass
@@ -8,15 +13,25 @@ class PrecursorFragmentIon(FragmentIon):
     """A derived class to encapsulate the concept of
     a cross-linked precursor ion, that is the full length
     cross-link.
+
+    The mass can be supplied when it has already been calculated,
+    otherwise it is calculated from the sequences. The mass of an ion
+    of charge above 1 is its m/z. An ion may carry a neutral loss, e.g.
+    "H2O", or be an isotope peak, e.g. 1 for M+1.
     """
 
     def __init__(
         self, frag_reps,
-        frag_topology=None
+        frag_topology=None, mass=None, charge=1, loss=None, isotope=0
     ):
         self.frag_reps = frag_reps
         self.frag_topology = frag_topology
-        self.mass = self._calc_mass()
+        self.charge = charge
+        self.loss = loss
+        self.isotope = isotope
+        self.mass = charge_mz(
+            self._calc_mass() + variant_mass(loss, isotope), charge
+        ) if mass is None else mass
 
     def __repr__(self):
         return "PrecursorFragmentIon: %s %s - Mass: %0.2f Da" % (
@@ -39,12 +54,9 @@ class PrecursorFragmentIon(FragmentIon):
                 mass += AMINO_MONO_MASS[aa]
 
         # Modify the mass based on to include N' C' for 2 peptides
-        mass += 2*(
-            1.0*MASS_DICT["O"] + 2.0*MASS_DICT["H"]
-        )+ 1.0*MASS_DICT["H"]
+        mass += 2*TERMINI_MASS + 1.0*MASS_DICT["H"]
         # Modify the mass based on to include linker
-        linker_mass = 138.0680796
-        mass += linker_mass
+        mass += LINKER_MASS
         return mass
 
     def get_mass(self):
@@ -58,11 +70,14 @@ class PrecursorFragmentIon(FragmentIon):
         Outputs the Roepstorff nomenclature of the
         cross-linked precursor i.e. the full length
 
-        e.g. -> "A10-B11"
+        e.g. -> "A10-B11", "A10-B11-NH3" with an ammonia loss or
+        "A10-B11^3+" if triply charged
         """
-        return "A%s-B%s" % (
+        return "A%s-B%s%s%s" % (
             len(self.frag_reps[0]),
-            len(self.frag_reps[1])
+            len(self.frag_reps[1]),
+            variant_label(self.loss, self.isotope),
+            charge_label(self.charge)
         )
 
     def get_sequence(self):
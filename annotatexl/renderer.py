@@ -0,0 +1,212 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+from annotatexl.spectrum_style import (
+    INTENSITY_AXIS_MAX, ION_COLOURS, cull_labels, label_y, mz_axis_range,
+    records_to_arrays
+)
+
+
+FORMATS = ("png", "svg", "pdf")
+
+
+class RendererException(Exception):
+    pass
+
+
+class SpectrumRenderer(object):
+    """
+    Renders annotated spectra with the object-oriented matplotlib API on
+    the Agg canvas, without the pyplot state machine. A single figure is
+    created when the renderer is created and reused for every spectrum:
+    the peaks of each ion type are one LineCollection whose segments are
+    replaced, and label Text artists are recycled, so rendering a batch
+    neither leaks nor rebuilds figures.
+
+    Roepstorff labels are culled greedily from the most intense peak so
+    that no two labels overlap along the m/z axis.
+
+    Parameters
+    ----------
+    dpi : int
+        Resolution of raster output
+    fmt : str
+        Output format, one of FORMATS
+    figsize : tuple
+        Figure (width, height) in inches
+    label_size : float
+        Font size of the Roepstorff labels in points
+    """
+
+    def __init__(self, dpi=300, fmt="png", figsize=(6.4, 4.8), label_size=10):
+        if fmt not in FORMATS:
+            raise RendererException(
+                "Cannot render spectra in unknown format '%s'." % fmt
+            )
+        self.dpi = dpi
+        self.fmt = fmt
+        self.label_size = label_size
+        self.figure = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111)
+        self.ax.set_xlabel("m/z")
+        self.ax.set_ylabel("Intensity %")
+        self._collections = []
+        for _, colour in ION_COLOURS:
+            collection = LineCollection([], colors=colour, linewidths=1.5)
+            self.ax.add_collection(collection)
+            self._collections.append(collection)
+        self._labels = []
+
+    def __repr__(self):
+        return "SpectrumRenderer: %s at %s dpi" % (self.fmt, self.dpi)
+
+    def _label_width_mz(self, mz_min, mz_max):
+        """
+        Returns the m/z width covered by a vertical label, from the
+        label font size and the width of the axes in points.
+        """
+        axes_width = self.ax.get_position().width * \
+            self.figure.get_figwidth() * 72.0
+        return (mz_max - mz_min) * self.label_size / axes_width
+
+    def _set_labels(self, mz, intensity, labels, indices):
+        """
+        Positions the label Text artists above their peaks, creating
+        artists only when more labels are shown than ever before.
+        """
+        for n, i in enumerate(indices):
+            label = labels[i]
+            position = (mz[i], label_y(intensity[i], label))
+            if n < len(self._labels):
+                text = self._labels[n]
+                text.set_position(position)
+                text.set_text(label)
+                text.set_visible(True)
+            else:
+                self._labels.append(self.ax.text(
+                    position[0], position[1], label,
+                    verticalalignment="center", rotation=90,
+                    fontsize=self.label_size
+                ))
+        for text in self._labels[len(indices):]:
+            text.set_visible(False)
+
+    def draw(self, mz, intensity, ion_types, labels):
+        """
+        Draws a spectrum on the figure and returns the figure.
+
+        Parameters
+        ----------
+        mz : array-like
+            The m/z of each peak
+        intensity : array-like
+            The normalised 0-100 intensity of each peak
+        ion_types : sequence
+            The FragmentIon.ion_name() of each peak, None if unmatched
+        labels : sequence
+            The Roepstorff label of each peak, None if unlabelled
+        """
+        mz = np.asarray(mz, dtype=np.float64)
+        intensity = np.asarray(intensity, dtype=np.float64)
+        ion_types = np.asarray(ion_types, dtype=object)
+        for (ion_type, _), collection in zip(
+            ION_COLOURS, self._collections
+        ):
+            mask = ion_types == ion_type
+            segments = np.zeros((mask.sum(), 2, 2))
+            segments[:, :, 0] = mz[mask][:, None]
+            segments[:, 1, 1] = intensity[mask]
+            collection.set_segments(segments)
+        mz_min, mz_max = mz_axis_range(mz)
+        self.ax.set_xlim(mz_min, mz_max)
+        # Allow room above peaks for annotations.
+        self.ax.set_ylim(0, INTENSITY_AXIS_MAX)
+        min_gap = self._label_width_mz(mz_min, mz_max)
+        self._set_labels(
+            mz, intensity, labels,
+            cull_labels(mz, intensity, labels, min_gap)
+        )
+        return self.figure
+
+    def render(self, mz, intensity, ion_types, labels, path):
+        """
+        Draws a spectrum, as draw(), and saves it to path.
+        """
+        self.draw(mz, intensity, ion_types, labels)
+        self.figure.savefig(path, dpi=self.dpi, format=self.fmt)
+        return path
+
+    def render_records(self, records, path):
+        """
+        Draws and saves the spectrum of the annotation records of
+        matched_ion_records, i.e. (matched, ion_type, roepstorff, mz,
+        intensity, error) tuples, normalising the intensities.
+        """
+        return self.render(*(records_to_arrays(records) + (path,)))
+
+
+# SpectrumRenderer of a RenderPool worker process
+_WORKER_RENDERER = None
+
+
+def _init_render_worker(dpi, fmt):
+    global _WORKER_RENDERER
+    _WORKER_RENDERER = SpectrumRenderer(dpi, fmt)
+
+
+def _render_records_in_worker(records, path):
+    return _WORKER_RENDERER.render_records(records, path)
+
+
+class RenderPool(object):
+    """
+    Renders spectra in a pool of worker processes, each reusing a single
+    SpectrumRenderer, so that annotation is not held up by plotting.
+    submit() returns a Future of the saved path.
+
+    Parameters
+    ----------
+    workers : int
+        Number of render processes, defaults to the number of CPUs
+    dpi : int
+        Resolution of raster output
+    fmt : str
+        Output format, one of FORMATS
+    """
+
+    def __init__(self, workers=None, dpi=300, fmt="png"):
+        if fmt not in FORMATS:
+            raise RendererException(
+                "Cannot render spectra in unknown format '%s'." % fmt
+            )
+        self.dpi = dpi
+        self.fmt = fmt
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_render_worker,
+            initargs=(dpi, fmt)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, records, path):
+        """
+        Queues the spectrum of a list of annotation records to be saved
+        to path.
+        """
+        return self._pool.submit(_render_records_in_worker, records, path)
+
+    def close(self, wait=True):
+        """
+        Shuts down the pool, by default after all queued spectra are
+        saved.
+        """
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,132 @@
+import csv
+import gzip
+import json
+
+
+# Output formats by file name suffix
+FORMATS = (
+    ("csv.gz", ".csv.gz"), ("jsonl", ".jsonl"), ("parquet", ".parquet"),
+    ("csv", ".csv")
+)
+
+# Size of the write buffer of uncompressed output in bytes
+BUFFER_SIZE = 1 << 20
+
+
+class ResultsWriterException(Exception):
+    pass
+
+
+def format_from_path(path):
+    """
+    Returns the output format of a file name from its suffix, defaulting
+    to CSV.
+    """
+    for fmt, suffix in FORMATS:
+        if path.endswith(suffix):
+            return fmt
+    return "csv"
+
+
+class ResultsWriter(object):
+    """
+    Streams annotation rows to a single CSV, gzip compressed CSV or
+    JSON Lines file as each cross-link spectrum match finishes, so that
+    memory use is bounded by one CSM rather than the whole run. Rows are
+    tuples in the order of columns and are written straight to a
+    buffered file, without a dataframe or a dictionary per row.
+
+    CSV output has a leading unnamed row index column, as written by
+    pandas. JSON Lines output has one object per row with the row index
+    under "index".
+
+    Parameters
+    ----------
+    path : str
+        The output file
+    columns : tuple
+        The column names of each row
+    fmt : str
+        "csv", "csv.gz" or "jsonl", defaults to the format of the path
+        suffix
+    """
+
+    def __init__(self, path, columns, fmt=None):
+        self.path = path
+        self.columns = tuple(columns)
+        self.fmt = fmt if fmt is not None else format_from_path(path)
+        self.n_rows = 0
+        if self.fmt == "csv":
+            self._file = open(path, "w", newline="", buffering=BUFFER_SIZE)
+        elif self.fmt == "csv.gz":
+            self._file = gzip.open(path, "wt", newline="")
+        elif self.fmt == "jsonl":
+            self._file = open(path, "w", buffering=BUFFER_SIZE)
+        else:
+            raise ResultsWriterException(
+                "Cannot write results in unknown format '%s'." % self.fmt
+            )
+        if self.fmt == "jsonl":
+            # JSON encoded '"column": ' prefix of each value of an object
+            self._keys = tuple(
+                "%s: " % json.dumps(column)
+                for column in ("index",) + self.columns
+            )
+            self._writer = None
+        else:
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(("",) + self.columns)
+
+    def __repr__(self):
+        return "ResultsWriter: %s - %s rows" % (self.path, self.n_rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_rows(self, rows):
+        """
+        Appends rows, each a sequence of values in column order.
+        """
+        index = self.n_rows
+        if self._writer is not None:
+            for row in rows:
+                self._writer.writerow((index,) + tuple(row))
+                index += 1
+        else:
+            keys = self._keys
+            dumps = json.dumps
+            write = self._file.write
+            for row in rows:
+                write("{%s}\n" % ", ".join(
+                    key + dumps(value)
+                    for key, value in zip(keys, (index,) + tuple(row))
+                ))
+                index += 1
+        self.n_rows = index
+
+    def close(self):
+        """
+        Flushes and closes the output file.
+        """
+        self._file.close()
+
+
+def open_results_writer(path, columns, fmt=None, append=False):
+    """
+    Opens the results writer for the format of the path suffix. A
+    .parquet path is a Parquet dataset written by ParquetResultsWriter,
+    which requires pyarrow and is the only format that can be appended
+    to, anything else a ResultsWriter.
+    """
+    fmt = fmt if fmt is not None else format_from_path(path)
+    if fmt == "parquet":
+        from annotatexl.parquet_writer import ParquetResultsWriter
+        return ParquetResultsWriter(path, columns, append)
+    if append:
+        raise ResultsWriterException(
+            "Cannot append to %s results, only to Parquet." % fmt
+        )
+    return ResultsWriter(path, columns, fmt)
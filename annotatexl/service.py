@@ -0,0 +1,419 @@
+"""
+Long-running local annotation service.
+
+Serves POST /annotate over HTTP on localhost or a Unix socket. The request
+body is a JSON object with crosslink_id, mz and intensity arrays and
+optionally tolerance, units and the precursor charge, e.g.
+
+    {"crosslink_id": "DTHKSEIAHR-FKDLGEEHFK-a4-b2",
+     "mz": [84.08, 86.09], "intensity": [8.8, 6.3],
+     "tolerance": 10.0, "units": "ppm", "charge": 3}
+
+and the response holds the annotations column by column under
+"annotations". GET /health reports the service status.
+
+The fragmentation settings, i.e. fragmentation, ion_types, max_charge,
+neutral_losses and isotopes as in the Annotate_XL.py options, default to
+those the service was started with and can be given per request, e.g.
+"fragmentation": "HCD" or "neutral_losses": ["H2O"].
+
+An asyncio front end parses requests and hands them to a pool of worker
+processes, each keeping a FragmentCache per fragmentation settings so
+that fragment tables stay warm across requests. Run with
+
+    python -m annotatexl.service --port 8765 --workers 4 --max-charge 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from collections import OrderedDict
+
+from annotatexl.api import ANNOTATION_COLUMNS, annotate_spectrum
+from annotatexl.fragment_cache import FragmentCache
+from annotatexl.fragment_table import NEUTRAL_LOSSES
+from annotatexl.fragmentation_profile import (
+    DEFAULT_PROFILE, PROFILES, FragmentationProfile
+)
+from annotatexl.fragmenter import Fragmenter
+
+
+# Largest accepted request body in bytes
+MAX_BODY_SIZE = 64 << 20
+
+UNITS = ("ppm", "Da")
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity"
+}
+
+# Fragmentation settings of the service, which requests may override
+DEFAULT_SETTINGS = {
+    "fragmentation": DEFAULT_PROFILE,
+    "ion_types": None,
+    "max_charge": 1,
+    "neutral_losses": (),
+    "isotopes": 0
+}
+
+# Most fragment caches, one per fragmentation settings, kept by a worker
+MAX_FRAGMENT_CACHES = 8
+
+# Fragmentation settings, cache options and fragment caches of a worker
+# by Fragmenter settings key, see _init_worker
+_SETTINGS = DEFAULT_SETTINGS
+_CACHE_OPTIONS = {}
+_FRAGMENT_CACHES = OrderedDict()
+
+
+class ServiceException(Exception):
+    pass
+
+
+def fragmenter_options(
+    fragmentation=DEFAULT_PROFILE, ion_types=None, max_charge=1,
+    neutral_losses=(), isotopes=0
+):
+    """
+    Returns the Fragmenter keyword arguments of fragmentation settings,
+    named as the Annotate_XL.py options. ion_types, if given, replaces
+    the ion types of the fragmentation profile.
+    """
+    if isinstance(neutral_losses, str):
+        neutral_losses = (neutral_losses,)
+    return {
+        "profile": FragmentationProfile.custom(ion_types) if ion_types
+        else fragmentation,
+        "max_charge": int(max_charge),
+        "neutral_losses": tuple(neutral_losses),
+        "isotopes": int(isotopes)
+    }
+
+
+def _init_worker(cache_dir=None, cache_size=1024, settings=None):
+    """
+    Stores the fragmentation settings and fragment cache options of a
+    worker, and creates the fragment cache of the settings, kept warm
+    for its lifetime.
+    """
+    global _SETTINGS, _CACHE_OPTIONS
+    _SETTINGS = dict(DEFAULT_SETTINGS, **(settings or {}))
+    _CACHE_OPTIONS = {"max_size": cache_size, "cache_dir": cache_dir}
+    _FRAGMENT_CACHES.clear()
+    _fragment_cache(_SETTINGS)
+
+
+def _fragment_cache(settings):
+    """
+    Returns the fragment cache of a worker for fragmentation settings,
+    keyed on the Fragmenter settings key, creating it on first use and
+    dropping the least recently used caches beyond MAX_FRAGMENT_CACHES.
+    """
+    fragmenter = Fragmenter(**fragmenter_options(**settings))
+    key = fragmenter.settings_key()
+    fragment_cache = _FRAGMENT_CACHES.get(key)
+    if fragment_cache is not None:
+        _FRAGMENT_CACHES.move_to_end(key)
+        return fragment_cache
+    fragment_cache = FragmentCache(fragmenter, **_CACHE_OPTIONS)
+    _FRAGMENT_CACHES[key] = fragment_cache
+    while len(_FRAGMENT_CACHES) > MAX_FRAGMENT_CACHES:
+        _FRAGMENT_CACHES.popitem(last=False)
+    return fragment_cache
+
+
+def _error_body(message):
+    return json.dumps({"error": message}).encode("utf-8")
+
+
+def annotate_request(body):
+    """
+    Annotates the JSON body of an /annotate request in a worker and
+    returns the (status, JSON response body). Decoding and encoding
+    happen in the worker so the front end is never held up by them.
+    """
+    try:
+        request = json.loads(body)
+        crosslink_id = request["crosslink_id"]
+        mz, intensity = request["mz"], request["intensity"]
+        tolerance = float(request.get("tolerance", 10.0))
+        units = request.get("units", "ppm")
+        charge = request.get("charge")
+        charge = int(charge) if charge is not None else None
+        settings = dict(_SETTINGS, **dict(
+            (name, request[name]) for name in DEFAULT_SETTINGS
+            if name in request
+        ))
+    except (ValueError, TypeError, AttributeError) as e:
+        return 400, _error_body("Invalid request (%s)" % e)
+    except KeyError as e:
+        return 400, _error_body("Request is missing %s" % e)
+    if units not in UNITS:
+        return 400, _error_body("Unknown units '%s'" % units)
+    try:
+        fragment_cache = _fragment_cache(settings)
+    except Exception as e:
+        return 400, _error_body("Invalid fragmentation settings (%s)" % e)
+    try:
+        result = annotate_spectrum(
+            crosslink_id, mz, intensity, tolerance, units,
+            fragment_cache=fragment_cache, charge=charge
+        )
+    except Exception as e:
+        return 422, _error_body(
+            "Could not annotate %s (%s)" % (crosslink_id, e)
+        )
+    columns = list(zip(*result.records())) or \
+        [()] * len(ANNOTATION_COLUMNS)
+    return 200, json.dumps({
+        "crosslink_id": result.crosslink_id,
+        "n_peaks": len(result.peak_list),
+        "n_matched": int(result.matched.sum()),
+        "annotations": dict(
+            (name, list(values))
+            for name, values in zip(ANNOTATION_COLUMNS, columns)
+        )
+    }).encode("utf-8")
+
+
+class AnnotationService(object):
+    """
+    asyncio HTTP/1.1 front end dispatching annotation requests to a
+    worker pool. Connections are kept alive between requests unless the
+    client asks to close them.
+
+    Parameters
+    ----------
+    workers : int
+        Number of worker processes, defaults to the number of CPUs. 0
+        runs annotations in a single thread of the service process.
+    cache_dir : str
+        Optional on-disk store shared by the workers' fragment caches
+    cache_size : int
+        Number of fragment tables held in memory by each fragment cache
+    settings : dict
+        The fragmentation settings of DEFAULT_SETTINGS used unless a
+        request gives its own
+    """
+
+    def __init__(
+        self, workers=None, cache_dir=None, cache_size=1024, settings=None
+    ):
+        # Fail on invalid settings now rather than in every worker
+        Fragmenter(**fragmenter_options(**dict(
+            DEFAULT_SETTINGS, **(settings or {})
+        )))
+        if workers == 0:
+            self.pool = ThreadPoolExecutor(
+                max_workers=1, initializer=_init_worker,
+                initargs=(cache_dir, cache_size, settings)
+            )
+        else:
+            self.pool = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(cache_dir, cache_size, settings)
+            )
+        self.workers = workers
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+
+    def __repr__(self):
+        return "AnnotationService: %s requests, %s errors" % (
+            self.requests, self.errors
+        )
+
+    @staticmethod
+    async def _read_request(reader):
+        """
+        Reads one request, returning (method, path, headers, body), or
+        None when the client has closed the connection.
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise ServiceException("Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_SIZE:
+            return method, path, headers, None
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    @staticmethod
+    def _response(status, body, keep_alive):
+        return (
+            "HTTP/1.1 %s %s\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: %s\r\n"
+            "Connection: %s\r\n\r\n" % (
+                status, REASONS[status], len(body),
+                "keep-alive" if keep_alive else "close"
+            )
+        ).encode("latin-1") + body
+
+    async def _dispatch(self, method, path, body):
+        """
+        Returns the (status, body) of a request.
+        """
+        if path == "/health":
+            return 200, json.dumps({
+                "status": "ok",
+                "workers": self.workers,
+                "requests": self.requests,
+                "errors": self.errors,
+                "uptime_s": time.time() - self.started
+            }).encode("utf-8")
+        if path != "/annotate":
+            return 404, _error_body("Unknown path %s" % path)
+        if method != "POST":
+            return 405, _error_body("/annotate requires POST")
+        if body is None:
+            return 413, _error_body(
+                "Request body is larger than %s bytes" % MAX_BODY_SIZE
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, annotate_request, body)
+
+    async def handle(self, reader, writer):
+        """
+        Serves the requests of one connection.
+        """
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (ServiceException, ValueError):
+                    writer.write(self._response(
+                        400, _error_body("Malformed request"), False
+                    ))
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, response = await self._dispatch(method, path, body)
+                self.requests += 1
+                self.errors += status != 200
+                keep_alive = headers.get("connection", "").lower() != \
+                    "close" and body is not None
+                writer.write(self._response(status, response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, unix_path=None):
+        """
+        Serves requests on host:port, or on a Unix socket at unix_path,
+        until cancelled.
+        """
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(
+                self.handle, path=unix_path
+            )
+            address = unix_path
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            address = "http://%s:%s" % (host, port)
+        print("annotatexl service listening on %s" % address)
+        sys.stdout.flush()
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """
+        Shuts down the worker pool.
+        """
+        self.pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve cross-link spectrum annotation over HTTP."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--unix", metavar="PATH", default=None,
+        help="Serve on a Unix socket instead of TCP"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of worker processes, 0 to annotate in-process"
+    )
+    parser.add_argument(
+        "--cache-dir", metavar="DIR", default=None,
+        help="Directory to store and reuse fragmented cross-links"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=1024,
+        help="Fragment tables held in memory per fragment cache"
+    )
+    parser.add_argument(
+        "--fragmentation", choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+        help="Only generate the ion series of this fragmentation method"
+    )
+    parser.add_argument(
+        "--ion-types", metavar="TYPES", default=None,
+        help="Only generate these ion types, e.g. by"
+    )
+    parser.add_argument(
+        "--max-charge", type=int, default=1,
+        help="Match fragments at charges 1 to this, or the charge of a "
+        "request if lower"
+    )
+    parser.add_argument(
+        "--neutral-losses", nargs="+", choices=NEUTRAL_LOSSES, default=(),
+        help="Also match fragments after these neutral losses"
+    )
+    parser.add_argument(
+        "--isotopes", type=int, default=0,
+        help="Also match this many isotope peaks of each fragment"
+    )
+    args = parser.parse_args(argv)
+    settings = {
+        "fragmentation": args.fragmentation,
+        "ion_types": args.ion_types,
+        "max_charge": args.max_charge,
+        "neutral_losses": tuple(args.neutral_losses),
+        "isotopes": args.isotopes
+    }
+    try:
+        service = AnnotationService(
+            args.workers, args.cache_dir, args.cache_size, settings
+        )
+    except Exception as e:
+        parser.error(str(e))
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        if args.unix is not None and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == "__main__":
+    main()
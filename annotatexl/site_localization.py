@@ -0,0 +1,195 @@
+import itertools
+
+import numpy as np
+
+from annotatexl.annotator.peak_list import PeakList
+from annotatexl.annotator.spectrum_index import SpectrumIndex
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragmenter import Fragmenter
+from annotatexl.utils import AMINO_MONO_MASS
+
+
+# Residues that the BS3/DSS crosslinker can link
+LINKABLE_RESIDUES = "K"
+
+# Stands for the protein N-terminus in a string of linkable residues. It
+# only links the first residue of peptides flagged as protein N-terminal,
+# as the N-termini of the other peptides only exist after digestion.
+N_TERMINUS = "^"
+
+# Peptides of a cross-link that can be flagged as protein N-terminal
+PEPTIDES = ("alpha", "beta")
+
+# Columns of the ranked link-site table
+LOCALIZATION_COLUMNS = (
+    "rank", "crosslink_id", "alpha_site", "beta_site", "n_matched_peaks",
+    "matched_intensity", "n_matched_fragments", "n_site_peaks",
+    "site_intensity"
+)
+
+
+class SiteLocalizationException(Exception):
+    pass
+
+
+def check_residues(residues):
+    """
+    Raises a SiteLocalizationException unless residues is a non-empty
+    string of amino acids and N_TERMINUS, e.g. "KSTY^" for NHS-ester
+    crosslinkers.
+    """
+    unknown = set(residues) - set(AMINO_MONO_MASS) - set(N_TERMINUS)
+    if not residues or unknown:
+        raise SiteLocalizationException(
+            "Linkable residues must be amino acids or '%s' for the "
+            "protein N-terminus, got '%s'." % (N_TERMINUS, residues)
+        )
+
+
+def link_sites(pep_rep, residues=LINKABLE_RESIDUES, protein_n_term=False):
+    """
+    Returns the one-indexed positions of the linkable residues of a
+    peptide, e.g. "DTHKSEIAHR" gives [4]. If the peptide is at the
+    protein N-terminus and residues holds N_TERMINUS its first residue
+    is linkable too, e.g. "K^" then gives [1, 4].
+    """
+    sites = [i + 1 for i, aa in enumerate(pep_rep) if aa in residues]
+    if protein_n_term and N_TERMINUS in residues and pep_rep and \
+            sites[:1] != [1]:
+        sites.insert(0, 1)
+    return sites
+
+
+def enumerate_topologies(
+    alpha_pep_rep, beta_pep_rep, residues=LINKABLE_RESIDUES, include=(),
+    protein_n_term=()
+):
+    """
+    Returns every one-indexed (alpha, beta) topology linking a linkable
+    residue of each peptide, in ascending order. Topologies given in
+    include are always enumerated, e.g. the sites of a search result.
+    protein_n_term names the PEPTIDES at the protein N-terminus, whose
+    N-terminus is linkable if residues holds N_TERMINUS.
+    If both peptides are the same, (i, j) and (j, i) are the same
+    cross-link and only one of them is enumerated, the one in include
+    if given, otherwise the one with i <= j.
+    """
+    unknown = set(protein_n_term) - set(PEPTIDES)
+    if unknown:
+        raise SiteLocalizationException(
+            "Unknown protein N-terminal peptide(s) %s, expected %s." % (
+                ", ".join(sorted(unknown)), ", ".join(PEPTIDES)
+            )
+        )
+    include = set(tuple(topology) for topology in include)
+    topologies = set(itertools.product(
+        link_sites(alpha_pep_rep, residues, "alpha" in protein_n_term),
+        link_sites(beta_pep_rep, residues, "beta" in protein_n_term)
+    ))
+    if alpha_pep_rep == beta_pep_rep:
+        topologies = set(
+            (i, j) for i, j in topologies
+            if (i, j) in include or (
+                i <= j and (j, i) not in include
+            )
+        )
+    topologies.update(include)
+    if not topologies:
+        raise SiteLocalizationException(
+            "No linkable residues (%s) in both %s and %s." % (
+                residues, alpha_pep_rep, beta_pep_rep
+            )
+        )
+    return sorted(topologies)
+
+
+def localize_sites(
+    crosslink, mz, intensity, tolerance=10.0, units="ppm",
+    residues=LINKABLE_RESIDUES, fragmenter=None, protein_n_term=()
+):
+    """
+    Scores every link-site topology of a cross-link's peptide pair
+    against a spectrum and ranks them.
+
+    The terminal fragment masses of the pair, which do not depend on the
+    sites, are calculated once by Fragmenter.site_fragment_tables and
+    only the linked fragments are recalculated for each topology. All
+    topologies are then matched at once against a SpectrumIndex of the
+    peaks.
+
+    Besides the matched peaks, matched intensity and matched fragments
+    of each topology, the matched peaks that are not explained by every
+    topology, i.e. the site determining evidence, are counted in
+    n_site_peaks and their intensity summed in site_intensity.
+
+    Parameters
+    ----------
+    crosslink : Crosslink or str
+        The cross-link or its ID, whose sites are always included
+    mz, intensity : array-like
+        The m/z and intensity of each peak
+    tolerance : float
+        The match tolerance
+    units : str
+        "ppm" or "Da"
+    residues : str
+        The linkable residues, and N_TERMINUS if the protein N-terminus
+        is linkable, defaults to LINKABLE_RESIDUES
+    fragmenter : Fragmenter
+        The Fragmenter used, defaults to Fragmenter()
+    protein_n_term : tuple
+        The PEPTIDES at the protein N-terminus, e.g. ("alpha",), whose
+        first residue is linkable if residues holds N_TERMINUS
+
+    Returns
+    -------
+    list
+        A tuple of the LOCALIZATION_COLUMNS values of each topology,
+        ranked by matched peaks, then matched intensity
+    """
+    check_residues(residues)
+    if not isinstance(crosslink, Crosslink):
+        crosslink = Crosslink.from_id(crosslink)
+    if fragmenter is None:
+        fragmenter = Fragmenter()
+    topologies = enumerate_topologies(
+        crosslink.alpha_pep_rep, crosslink.beta_pep_rep, residues,
+        include=[crosslink.topology], protein_n_term=protein_n_term
+    )
+    index = SpectrumIndex(PeakList(mz, intensity), tolerance, units)
+    site_tables = list(fragmenter.site_fragment_tables(
+        crosslink.alpha_pep_rep, crosslink.beta_pep_rep, topologies,
+        index.matchable_range()
+    ))
+    masses, candidates = index.concatenate_tables(
+        [table for _, table in site_tables]
+    )
+    n_topologies = len(site_tables)
+    matched_candidates, pair_candidates, pair_peaks = index.matched_peaks(
+        masses, candidates
+    )
+    # Peaks matched by every topology do not discriminate between sites
+    site_pairs = np.bincount(
+        pair_peaks, minlength=len(index)
+    )[pair_peaks] < n_topologies
+    weights = index.intensity[pair_peaks]
+    columns = (
+        np.bincount(pair_candidates, minlength=n_topologies),
+        np.bincount(pair_candidates, weights, minlength=n_topologies),
+        np.bincount(matched_candidates, minlength=n_topologies),
+        np.bincount(
+            pair_candidates[site_pairs], minlength=n_topologies
+        ),
+        np.bincount(
+            pair_candidates[site_pairs], weights[site_pairs],
+            minlength=n_topologies
+        )
+    )
+    order = np.lexsort((-columns[1], -columns[0]))
+    columns = [column.tolist() for column in columns]
+    return [
+        (rank + 1, site_tables[i][0].to_id()) +
+        tuple(site_tables[i][0].topology) +
+        tuple(column[i] for column in columns)
+        for rank, i in enumerate(order.tolist())
+    ]
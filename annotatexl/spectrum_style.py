@@ -0,0 +1,92 @@
+import bisect
+
+import numpy as np
+
+
+# Ion types in drawing order with their peak colours. Unmatched peaks
+# are grey, cross-linked and precursor ions red, common ions blue,
+# diagnostic ions purple and immonium ions green.
+ION_COLOURS = (
+    (None, "#999999"),
+    ("common", "#0571b0"),
+    ("crosslink", "#ca0020"),
+    ("precursor", "#ca0020"),
+    ("diagnostic", "#7b3294"),
+    ("immonium", "#008837")
+)
+
+# Upper limit of the intensity axis, allowing room above the base peak
+# for annotations
+INTENSITY_AXIS_MAX = 120.0
+
+
+def normalise_intensity(intensity):
+    """
+    Normalises intensities to a 0-100 scale between the smallest and
+    largest intensity. A spectrum of a single intensity is drawn at 100.
+    """
+    intensity = np.asarray(intensity, dtype=np.float64)
+    if len(intensity) == 0:
+        return intensity
+    low, high = intensity.min(), intensity.max()
+    if high == low:
+        return np.full(len(intensity), 100.0)
+    return (intensity - low) / (high - low) * 100.0
+
+
+def mz_axis_range(mz):
+    """
+    Returns the (min, max) of the m/z axis, the m/z range of the peaks
+    with a 5% margin either side.
+    """
+    if len(mz) == 0:
+        return 0.0, 1.0
+    mz_min, mz_max = float(np.min(mz)), float(np.max(mz))
+    margin = (mz_max - mz_min) * 0.05 or 1.0
+    return mz_min - margin, mz_max + margin
+
+
+def label_y(intensity, label):
+    """
+    Returns the height at which the centre of a vertical label is
+    placed above a peak, so that longer labels are raised further.
+    """
+    return intensity + len(label) + 2
+
+
+def cull_labels(mz, intensity, labels, min_gap):
+    """
+    Returns the indices of the labels to draw, choosing the most
+    intense peaks first and skipping any label closer than min_gap
+    in m/z to a label already chosen. Peaks with a None label are
+    never labelled.
+    """
+    kept_mz = []
+    kept = []
+    for i in np.argsort(-np.asarray(intensity), kind="mergesort"):
+        if labels[i] is None:
+            continue
+        pos = bisect.bisect_left(kept_mz, mz[i])
+        if pos > 0 and mz[i] - kept_mz[pos - 1] < min_gap:
+            continue
+        if pos < len(kept_mz) and kept_mz[pos] - mz[i] < min_gap:
+            continue
+        kept_mz.insert(pos, mz[i])
+        kept.append(i)
+    return kept
+
+
+def records_to_arrays(records):
+    """
+    Splits the annotation records of matched_ion_records, i.e.
+    (matched, ion_type, roepstorff, mz, intensity, error) tuples, into
+    the m/z, normalised intensity, ion type and label sequences that
+    spectrum renderers draw.
+    """
+    records = list(records)
+    return (
+        np.array([record[3] for record in records], dtype=np.float64),
+        normalise_intensity([record[4] for record in records]),
+        [record[1] for record in records],
+        [record[2] for record in records]
+    )
@@ -0,0 +1,203 @@
+import math
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from annotatexl.spectrum_style import (
+    INTENSITY_AXIS_MAX, ION_COLOURS, cull_labels, label_y, mz_axis_range,
+    records_to_arrays
+)
+
+
+# Plot area margins (left, right, top, bottom) in pixels
+MARGINS = (64.0, 16.0, 16.0, 48.0)
+
+
+def nice_ticks(lo, hi, max_ticks=7):
+    """
+    Returns tick positions between lo and hi spaced by 1, 2 or 5 times a
+    power of ten, with at most max_ticks ticks.
+    """
+    span = hi - lo
+    if span <= 0:
+        return [lo]
+    step = 10.0 ** math.floor(math.log10(span / max_ticks))
+    for multiple in (1.0, 2.0, 5.0, 10.0):
+        if span / (step * multiple) <= max_ticks:
+            step *= multiple
+            break
+    first = math.ceil(lo / step) * step
+    return list(np.arange(first, hi + step * 1e-9, step))
+
+
+def _fmt_tick(value):
+    return ("%f" % value).rstrip("0").rstrip(".")
+
+
+class SVGSpectrumWriter(object):
+    """
+    Writes annotated spectra directly as SVG, with the colour scheme and
+    Roepstorff labels of the matplotlib SpectrumRenderer but without
+    importing matplotlib. The peaks of each ion type are a single path
+    element, so a spectrum renders in milliseconds and stays small
+    enough to serve to a web viewer.
+
+    Has the draw/render/render_records interface of SpectrumRenderer,
+    where draw() returns the SVG document as a string.
+
+    Parameters
+    ----------
+    width : float
+        Image width in pixels
+    height : float
+        Image height in pixels
+    label_size : float
+        Font size of the labels in pixels
+    """
+
+    fmt = "svg"
+
+    def __init__(self, width=640.0, height=480.0, label_size=10.0):
+        self.width = width
+        self.height = height
+        self.label_size = label_size
+        left, right, top, bottom = MARGINS
+        self._plot_box = (
+            left, top, width - left - right, height - top - bottom
+        )
+
+    def __repr__(self):
+        return "SVGSpectrumWriter: %gx%g px" % (self.width, self.height)
+
+    def _axes(self, mz_min, mz_max, to_x, to_y):
+        """
+        Returns the SVG elements of the axes frame, ticks and titles.
+        """
+        x0, y0, width, height = self._plot_box
+        bottom = y0 + height
+        elements = [
+            '<rect x="%.2f" y="%.2f" width="%.2f" height="%.2f" '
+            'fill="none" stroke="#000000"/>' % (x0, y0, width, height)
+        ]
+        ticks = ['<g font-size="%g" fill="#000000">' % self.label_size]
+        for tick in nice_ticks(mz_min, mz_max):
+            x = to_x(tick)
+            elements.append(
+                '<path d="M%.2f %.2fv4" stroke="#000000"/>' % (x, bottom)
+            )
+            ticks.append(
+                '<text x="%.2f" y="%.2f" text-anchor="middle">%s</text>' % (
+                    x, bottom + 4 + self.label_size, _fmt_tick(tick)
+                )
+            )
+        for tick in nice_ticks(0.0, INTENSITY_AXIS_MAX):
+            y = to_y(tick)
+            elements.append(
+                '<path d="M%.2f %.2fh-4" stroke="#000000"/>' % (x0, y)
+            )
+            ticks.append(
+                '<text x="%.2f" y="%.2f" text-anchor="end" '
+                'dominant-baseline="middle">%s</text>' % (
+                    x0 - 6, y, _fmt_tick(tick)
+                )
+            )
+        ticks.append(
+            '<text x="%.2f" y="%.2f" text-anchor="middle">m/z</text>' % (
+                x0 + width / 2.0, self.height - 8
+            )
+        )
+        ticks.append(
+            '<text transform="translate(%.2f %.2f) rotate(-90)" '
+            'text-anchor="middle">Intensity %%</text>' % (
+                14 + self.label_size, y0 + height / 2.0
+            )
+        )
+        ticks.append("</g>")
+        return elements + ticks
+
+    def draw(self, mz, intensity, ion_types, labels):
+        """
+        Returns the SVG document of a spectrum.
+
+        Parameters
+        ----------
+        mz : array-like
+            The m/z of each peak
+        intensity : array-like
+            The normalised 0-100 intensity of each peak
+        ion_types : sequence
+            The FragmentIon.ion_name() of each peak, None if unmatched
+        labels : sequence
+            The Roepstorff label of each peak, None if unlabelled
+        """
+        mz = np.asarray(mz, dtype=np.float64)
+        intensity = np.asarray(intensity, dtype=np.float64)
+        ion_types = np.asarray(ion_types, dtype=object)
+        x0, y0, width, height = self._plot_box
+        mz_min, mz_max = mz_axis_range(mz)
+        x_scale = width / (mz_max - mz_min)
+        y_scale = height / INTENSITY_AXIS_MAX
+
+        def to_x(value):
+            return x0 + (value - mz_min) * x_scale
+
+        def to_y(value):
+            return y0 + height - value * y_scale
+
+        elements = [
+            '<svg xmlns="http://www.w3.org/2000/svg" width="%g" height="%g" '
+            'viewBox="0 0 %g %g" font-family="sans-serif">' % (
+                self.width, self.height, self.width, self.height
+            ),
+            '<rect width="100%" height="100%" fill="#ffffff"/>'
+        ]
+        elements.extend(self._axes(mz_min, mz_max, to_x, to_y))
+        peak_x = to_x(mz)
+        peak_y = to_y(intensity)
+        for ion_type, colour in ION_COLOURS:
+            mask = ion_types == ion_type
+            if not mask.any():
+                continue
+            elements.append(
+                '<path stroke="%s" stroke-width="1.5" d="%s"/>' % (
+                    colour, "".join(
+                        "M%.2f %.2fV%.2f" % (x, y0 + height, y)
+                        for x, y in zip(peak_x[mask], peak_y[mask])
+                    )
+                )
+            )
+        # Labels are vertical so each covers label_size pixels of m/z
+        kept = cull_labels(mz, intensity, labels, self.label_size / x_scale)
+        if kept:
+            elements.append(
+                '<g font-size="%g" text-anchor="middle" fill="#000000">' %
+                self.label_size
+            )
+            for i in kept:
+                elements.append(
+                    '<text transform="translate(%.2f %.2f) rotate(-90)">'
+                    '%s</text>' % (
+                        peak_x[i] + self.label_size,
+                        to_y(label_y(intensity[i], labels[i])),
+                        escape(labels[i])
+                    )
+                )
+            elements.append("</g>")
+        elements.append("</svg>")
+        return "\n".join(elements)
+
+    def render(self, mz, intensity, ion_types, labels, path):
+        """
+        Draws a spectrum, as draw(), and saves it to path.
+        """
+        with open(path, "w") as svg_file:
+            svg_file.write(self.draw(mz, intensity, ion_types, labels))
+        return path
+
+    def render_records(self, records, path):
+        """
+        Draws and saves the spectrum of the annotation records of
+        matched_ion_records, i.e. (matched, ion_type, roepstorff, mz,
+        intensity, error) tuples, normalising the intensities.
+        """
+        return self.render(*(records_to_arrays(records) + (path,)))
@@ -1,3 +1,5 @@
+import numpy as np
+
 # Monoisotopic element masses
 MASS_DICT = {
     "H": 1.007825032,
@@ -61,4 +63,91 @@ IMMON_MASS = {
 DIAG_IONS = {
     'DI_1': 139.08,
     'DI_2': 222.15
-}
\ No newline at end of file
+}
+
+# Mass adjustments applied to the residue sum of a fragment for each ion
+# type. "abc" ions have an additional H+, "a" have lost C=O, "c" have gained
+# NH. "xyz" have an additional H+ and H2O, "x" have gained C=O, "z" have
+# lost NH.
+ION_TYPE_MASS = {
+    "a": 1.0*MASS_DICT["H"] - 1.0*(MASS_DICT["C"]+MASS_DICT["O"]),
+    "b": 1.0*MASS_DICT["H"],
+    "c": 4.0*MASS_DICT["H"] + 1.0*MASS_DICT["N"],
+    "x": 1.0*MASS_DICT["H"] + 2.0*MASS_DICT['O'] + 1.0*MASS_DICT['C'],
+    "y": 3.0*MASS_DICT["H"] + MASS_DICT['O'],
+    "z": 1.0*MASS_DICT['H'] + 1.0*MASS_DICT['O'] - 1.0*MASS_DICT["N"]
+}
+
+# Mass of the N' and C' termini of an unfragmented peptide (H and OH)
+TERMINI_MASS = 1.0*MASS_DICT["O"] + 2.0*MASS_DICT["H"]
+
+# Mass of DSS/BS3 crosslinker - 2*H lost during the conjugation
+LINKER_MASS = 138.0680796
+
+# Mass of a proton, added to an ion for each charge beyond the first
+PROTON_MASS = 1.007276467
+
+# Masses of the neutral losses of fragment ions and the residues a
+# fragment must contain to lose them
+NEUTRAL_LOSS_MASS = {
+    "H2O": 2.0*MASS_DICT["H"] + 1.0*MASS_DICT["O"],
+    "NH3": 1.0*MASS_DICT["N"] + 3.0*MASS_DICT["H"]
+}
+NEUTRAL_LOSS_RESIDUES = {
+    "H2O": "STDE",
+    "NH3": "RKNQ"
+}
+
+# Mass difference of 13C and 12C, the spacing of the isotope peaks of a
+# singly charged ion
+ISOTOPE_MASS = 1.0033548378
+
+# Amino acid masses indexed by the byte value of the one letter code,
+# allowing a whole sequence to be converted to residue masses at once.
+# Unknown amino acids map to NaN.
+AMINO_MASS_LUT = np.full(256, np.nan)
+for _aa, _mass in AMINO_MONO_MASS.items():
+    AMINO_MASS_LUT[ord(_aa)] = _mass
+del _aa, _mass
+
+
+def charge_mz(mass, charge):
+    """
+    Returns the m/z at a charge of an ion of singly protonated mass, i.e.
+    (mass + (charge - 1) * PROTON_MASS) / charge. Either may be an array.
+    """
+    return (mass + (charge - 1)*PROTON_MASS) / charge
+
+
+def variant_mass(loss=None, isotope=0):
+    """
+    Returns the mass offset of the neutral loss, e.g. "H2O", and isotope
+    peak, e.g. 1 for M+1, of an ion.
+    """
+    offset = isotope*ISOTOPE_MASS
+    if loss is not None:
+        offset -= NEUTRAL_LOSS_MASS[loss]
+    return offset
+
+
+def residue_masses(pep_rep):
+    """
+    Returns a float64 array of the residue masses of a peptide string
+    using the byte-indexed AMINO_MASS_LUT lookup table.
+    """
+    codes = np.frombuffer(
+        pep_rep.encode("ascii", "replace"), dtype=np.uint8
+    )
+    return AMINO_MASS_LUT[codes]
+
+
+def window_indices(lo, hi):
+    """
+    Expands arrays of half-open index windows [lo, hi) into the flat
+    arrays of window number and index within the window, in order.
+    E.g. lo=[0, 2], hi=[2, 5] gives ([0, 0, 1, 1, 1], [0, 1, 2, 3, 4]).
+    """
+    counts = np.maximum(np.asarray(hi) - np.asarray(lo), 0)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    starts = np.repeat(np.asarray(lo) - (np.cumsum(counts) - counts), counts)
+    return owners, np.arange(counts.sum()) + starts
@@ -1,5 +1,10 @@
-from .fragment_ion import FragmentIon, FragmentIonException
-from .utils import MASS_DICT, AMINO_MONO_MASS
+from .fragment_ion import (
+    FragmentIon, FragmentIonException, charge_label, variant_label
+)
+from .utils import (
+    AMINO_MONO_MASS, ION_TYPE_MASS, LINKER_MASS, TERMINI_MASS, charge_mz,
+    variant_mass
+)
 
 
 class CrosslinkFragmentIonException(FragmentIonException):
@@ -10,16 +15,27 @@ class CrosslinkFragmentIon(FragmentIon):
     """A derived class to encapsulate the concept of
     a crosslinked fragment ion, that is a fragment ion that
     possess a linker.
+
+    The mass can be supplied when it has already been calculated,
+    e.g. by the Fragmenter from the peptide prefix masses, otherwise
+    it is calculated from the sequences. The mass of an ion of charge
+    above 1 is its m/z. An ion may carry a neutral loss, e.g. "H2O", or
+    be an isotope peak, e.g. 1 for M+1.
     """
 
     def __init__(
         self, frag_reps, ion_types,
-        frag_topology=None
+        frag_topology=None, mass=None, charge=1, loss=None, isotope=0
     ):
         self.frag_reps = frag_reps
         self.ion_types = ion_types
         self.frag_topology = frag_topology
-        self.mass = self._calc_mass()
+        self.charge = charge
+        self.loss = loss
+        self.isotope = isotope
+        self.mass = charge_mz(
+            self._calc_mass() + variant_mass(loss, isotope), charge
+        ) if mass is None else mass
 
     def __repr__(self):
         return "CrosslinkFragmentIon: %s %s - Mass: %0.2f Da" % (
@@ -46,14 +62,6 @@ class CrosslinkFragmentIon(FragmentIon):
         Adds mass of DSS/BS3 crosslinker - 2*H lost during the conjugation.
         """
         mass = 0.0
-        frag_dict = {
-            "a": 1.0*MASS_DICT["H"] - 1.0*(MASS_DICT["C"]+MASS_DICT["O"]),
-            "b": 1.0*MASS_DICT["H"],
-            "c": 4.0*MASS_DICT["H"] + 1.0*MASS_DICT["N"],
-            "x": 1.0*MASS_DICT["H"] + 2.0*MASS_DICT['O'] + 1.0*MASS_DICT['C'],
-            "y": 3.0*MASS_DICT["H"] + MASS_DICT['O'],
-            "z": 1.0*MASS_DICT['H'] + 1.0*MASS_DICT['O'] - 1.0*MASS_DICT["N"]
-        }
 
         # Sum peptide fragment amino acid masses
         for pep_rep in self.frag_reps:
@@ -63,11 +71,10 @@ class CrosslinkFragmentIon(FragmentIon):
         # Modify the mass based on ion type presence
         for ion_type in self.ion_types:
             if ion_type is not None:
-                mass += frag_dict[ion_type]
+                mass += ION_TYPE_MASS[ion_type]
             else:
-                mass += 1.0*MASS_DICT["O"] + 2.0*MASS_DICT["H"]
-        linker_mass = 138.0680796
-        mass += linker_mass
+                mass += TERMINI_MASS
+        mass += LINKER_MASS
         return mass
 
     def get_mass(self):
@@ -81,13 +88,16 @@ class CrosslinkFragmentIon(FragmentIon):
         Outputs the Roepstorff nomenclature of the
         crosslinked fragment ion.
 
-        e.g. -> "Ab1-By2"
+        e.g. -> "Ab1-By2", "Ab1-By2(M+1)" for its M+1 isotope peak or
+        "Ab1-By2^2+" if doubly charged
         """
-        return "A%s%s-B%s%s" % (
+        return "A%s%s-B%s%s%s%s" % (
             self.ion_types[0] if self.ion_types[0] is not None else "",
             len(self.frag_reps[0]),
             self.ion_types[1] if self.ion_types[1] is not None else "",
-            len(self.frag_reps[1])
+            len(self.frag_reps[1]),
+            variant_label(self.loss, self.isotope),
+            charge_label(self.charge)
         )
 
     def get_sequence(self):
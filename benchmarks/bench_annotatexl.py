@@ -0,0 +1,343 @@
+"""
+Benchmark suite for Annotate_XL.
+
+Times the fragmentation (Fragmenter.fragment_table), matching
+(Annotator.annotate), CSV writing, plotting (the spectrum renderer of
+the command line) and end-to-end command line stages separately, over
+synthetic cross-links from short to 40+ residue peptides and synthetic
+spectra of 200 to 20,000 peaks.
+
+For each stage and case the latency percentiles, throughput and peak
+traced memory are reported and saved as JSON. The command line runs in
+a subprocess, outside tracemalloc, so it has no peak memory:
+
+    python benchmarks/bench_annotatexl.py run --output results.json
+
+Results can be compared against a stored baseline, exiting with status 1
+if any stage has regressed by more than the threshold:
+
+    python benchmarks/bench_annotatexl.py compare baseline.json results.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import Annotate_XL
+from annotatexl.annotator.annotator import Annotator
+from annotatexl.annotator.peak_list import PeakList
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragmenter import Fragmenter
+from annotatexl.utils import AMINO_MONO_MASS
+
+
+# (name, alpha length, beta length) of the synthetic cross-links
+CROSSLINK_CASES = (
+    ("short", 8, 7),
+    ("medium", 15, 12),
+    ("long", 27, 18),
+    ("very_long", 44, 41)
+)
+
+# Number of peaks of the synthetic spectra
+SPECTRUM_SIZES = (200, 2000, 20000)
+
+# Stages that are slow enough to be run on the smallest spectrum only
+SLOW_STAGES = ("plot", "cli")
+
+STAGES = ("fragment", "match", "csv", "plot", "cli")
+
+
+def synthetic_peptide(rng, length, link_pos):
+    """
+    Creates a random peptide of the given length with a lysine at the
+    zero-indexed link position and no other lysines.
+    """
+    residues = sorted(set(AMINO_MONO_MASS) - set("KX"))
+    pep = [rng.choice(residues) for _ in range(length)]
+    pep[link_pos] = "K"
+    return "".join(pep)
+
+
+def synthetic_crosslink_id(alpha_len, beta_len, seed=0):
+    """
+    Creates a reproducible cross-link ID with the linker roughly in the
+    middle of both peptides.
+    """
+    rng = random.Random(seed + alpha_len * 100 + beta_len)
+    alpha_pos, beta_pos = alpha_len // 2, beta_len // 3
+    return "%s-%s-a%s-b%s" % (
+        synthetic_peptide(rng, alpha_len, alpha_pos),
+        synthetic_peptide(rng, beta_len, beta_pos),
+        alpha_pos + 1, beta_pos + 1
+    )
+
+
+def synthetic_peak_list(crosslink_id, n_peaks, seed=0):
+    """
+    Creates a reproducible PeakList of n_peaks in which up to a third of
+    the peaks are theoretical fragments of the cross-link and the rest
+    are noise between 100 and 3000 m/z.
+    """
+    rng = np.random.RandomState(seed + n_peaks)
+    table = Fragmenter().fragment_table(Crosslink.from_id(crosslink_id))
+    n_true = min(n_peaks // 3, len(table))
+    true_mz = rng.choice(table.mass, n_true, replace=False)
+    true_mz = true_mz * (1.0 + rng.uniform(-5e-6, 5e-6, n_true))
+    noise_mz = rng.uniform(100.0, 3000.0, n_peaks - n_true)
+    mz = np.concatenate((true_mz, noise_mz))
+    return PeakList(mz, rng.exponential(10.0, len(mz)))
+
+
+def quiet(func):
+    """
+    Wraps func so that anything it prints is discarded.
+    """
+    def quiet_func():
+        with open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(devnull):
+                return func()
+    return quiet_func
+
+
+def _percentile_ms(timings, q):
+    return float(np.percentile(timings, q) * 1000.0)
+
+
+def measure(func, iterations, units_per_call, unit, trace_memory=True):
+    """
+    Times iterations of func after one warm-up call, then, if
+    trace_memory is True, runs it once more under tracemalloc for the
+    peak traced memory. Returns a dict of latency percentiles, throughput
+    in units per second and peak memory, None if not traced.
+    """
+    func()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    mean = float(np.mean(timings))
+    return {
+        "iterations": iterations,
+        "mean_ms": mean * 1000.0,
+        "p50_ms": _percentile_ms(timings, 50),
+        "p90_ms": _percentile_ms(timings, 90),
+        "p99_ms": _percentile_ms(timings, 99),
+        "throughput": units_per_call / mean if mean > 0 else None,
+        "throughput_unit": unit,
+        "peak_mem_kb": peak / 1024.0 if peak is not None else None
+    }
+
+
+def bench_case(stage, crosslink_id, peak_list, iterations, work_dir):
+    """
+    Benchmarks one stage for a cross-link and peak list, returning the
+    measurement dict of measure().
+    """
+    crosslink = Crosslink.from_id(crosslink_id)
+    fragmenter = Fragmenter()
+    annotator = Annotator()
+    table = fragmenter.fragment_table(crosslink)
+    if stage == "fragment":
+        return measure(
+            lambda: fragmenter.fragment_table(crosslink),
+            iterations, len(table), "fragments/s"
+        )
+    matched_list = annotator.annotate(table, peak_list)
+    if stage == "match":
+        return measure(
+            lambda: annotator.annotate(table, peak_list),
+            iterations, 1, "CSMs/s"
+        )
+    records = list(Annotate_XL.matched_ion_records(matched_list))
+    Annotate_XL.OBSERVED_BASE_DIR = work_dir
+    if stage == "csv":
+        return measure(
+            quiet(
+                lambda: Annotate_XL.write_csv_annotations(records, "bench")
+            ),
+            iterations, 1, "CSMs/s"
+        )
+    if stage == "plot":
+        renderer = Annotate_XL._get_renderer()
+        path = Annotate_XL._spectrum_path("bench", renderer.fmt)
+        return measure(
+            lambda: renderer.render_records(records, path),
+            iterations, 1, "CSMs/s"
+        )
+    if stage == "cli":
+        peaks_csv = os.path.join(work_dir, "bench_peaks.csv")
+        np.savetxt(
+            peaks_csv, np.column_stack((peak_list.mz, peak_list.intensity)),
+            delimiter=",", header="m/z,intensity", comments=""
+        )
+        env = dict(os.environ, ANNOTATEXL_BASE_DIR=work_dir)
+        command = [
+            sys.executable, os.path.join(REPO_DIR, "Annotate_XL.py"),
+            crosslink_id, peaks_csv, "--no-plot"
+        ]
+        # tracemalloc would only see this process, not the subprocess
+        return measure(
+            lambda: subprocess.check_call(
+                command, env=env, stdout=subprocess.DEVNULL
+            ),
+            iterations, 1, "CSMs/s", trace_memory=False
+        )
+    raise ValueError("Unknown benchmark stage '%s'" % stage)
+
+
+def run(args):
+    """
+    Runs the selected stages over every cross-link and spectrum size and
+    writes the results as JSON.
+    """
+    stages = args.stages or STAGES
+    sizes = SPECTRUM_SIZES[:1] if args.quick else SPECTRUM_SIZES
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="annotatexl_bench_")
+    try:
+        for name, alpha_len, beta_len in CROSSLINK_CASES:
+            crosslink_id = synthetic_crosslink_id(alpha_len, beta_len)
+            for n_peaks in sizes:
+                peak_list = synthetic_peak_list(crosslink_id, n_peaks)
+                for stage in stages:
+                    if stage == "fragment" and n_peaks != sizes[0]:
+                        continue
+                    if stage in SLOW_STAGES and n_peaks != sizes[0]:
+                        continue
+                    iterations = args.iterations
+                    if stage in SLOW_STAGES:
+                        iterations = max(1, iterations // 10)
+                    result = {
+                        "stage": stage,
+                        "case": "%s/%s" % (name, n_peaks),
+                        "crosslink_id": crosslink_id,
+                        "n_peaks": n_peaks,
+                    }
+                    result.update(bench_case(
+                        stage, crosslink_id, peak_list, iterations, work_dir
+                    ))
+                    results.append(result)
+                    peak_mem = result["peak_mem_kb"]
+                    print(
+                        "%-8s %-16s p50 %9.3f ms  p99 %9.3f ms  "
+                        "%12.1f %s  %12s" % (
+                            stage, result["case"], result["p50_ms"],
+                            result["p99_ms"], result["throughput"],
+                            result["throughput_unit"],
+                            "%.1f KB" % peak_mem if peak_mem is not None
+                            else "-"
+                        )
+                    )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    output = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform()
+        },
+        "results": results
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(output, output_file, indent=2)
+    print("Results saved to %s" % args.output)
+
+
+def compare(args):
+    """
+    Compares results against a baseline. A stage and case regresses if
+    its p50 latency rises, or its throughput falls, by more than the
+    threshold fraction. Returns the number of regressions.
+    """
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)["results"]
+    with open(args.results) as results_file:
+        current = json.load(results_file)["results"]
+    baseline_by_key = dict(
+        ((r["stage"], r["case"]), r) for r in baseline
+    )
+    regressions = 0
+    for result in current:
+        base = baseline_by_key.get((result["stage"], result["case"]))
+        if base is None:
+            continue
+        latency_change = result["p50_ms"] / base["p50_ms"] - 1.0
+        throughput_change = result["throughput"] / base["throughput"] - 1.0
+        regressed = (
+            latency_change > args.threshold or
+            throughput_change < -args.threshold
+        )
+        regressions += regressed
+        print("%-10s %-8s %-16s p50 %+7.1f%%  throughput %+7.1f%%" % (
+            "REGRESSED" if regressed else "ok", result["stage"],
+            result["case"], latency_change * 100.0,
+            throughput_change * 100.0
+        ))
+    print("%s regression(s) beyond %.0f%%" % (
+        regressions, args.threshold * 100.0
+    ))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Annotate_XL.")
+    subparsers = parser.add_subparsers(dest="command")
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument(
+        "--output", default="annotatexl_benchmark.json",
+        help="JSON file to save the results to"
+    )
+    run_parser.add_argument(
+        "--iterations", type=int, default=20,
+        help="Timed iterations per stage, a tenth for plot and cli"
+    )
+    run_parser.add_argument(
+        "--stages", nargs="+", choices=STAGES,
+        help="Stages to benchmark, defaults to all"
+    )
+    run_parser.add_argument(
+        "--quick", action="store_true",
+        help="Only use the smallest spectrum size"
+    )
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare results against a baseline"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="Fractional change treated as a regression"
+    )
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        sys.exit(1 if compare(args) else 0)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
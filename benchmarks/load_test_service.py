@@ -0,0 +1,161 @@
+"""
+Load test for the annotatexl service.
+
+Sends POST /annotate requests over a number of concurrent keep-alive
+connections and reports the requests per second and latency percentiles:
+
+    python -m annotatexl.service --port 8765 &
+    python benchmarks/load_test_service.py --port 8765 --concurrency 16 \
+        --requests 2000
+
+The peaks are read from a peak list CSV, test_peak_list.csv by default,
+and the cross-link IDs given are cycled through across requests.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def _send(reader, writer, payload):
+    """
+    Sends one request on an open connection and returns the status.
+    """
+    writer.write(
+        b"POST /annotate HTTP/1.1\r\n"
+        b"Host: localhost\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Content-Length: " + str(len(payload)).encode("latin-1") +
+        b"\r\n\r\n" + payload
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split(b" ", 2)[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _connection(args, payloads, counter, latencies, statuses):
+    """
+    Sends requests on one keep-alive connection until the shared
+    request counter is used up.
+    """
+    if args.unix is not None:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        while counter[0] < args.requests:
+            n = counter[0]
+            counter[0] += 1
+            start = time.perf_counter()
+            status = await _send(reader, writer, payloads[n % len(payloads)])
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(args, payloads):
+    """
+    Runs the load test, returning the results dict.
+    """
+    # Warm the workers' fragment caches with each cross-link
+    if args.warmup:
+        warm = argparse.Namespace(**vars(args))
+        warm.requests = len(payloads) * args.concurrency
+        await asyncio.gather(*(
+            _connection(warm, payloads, [0], [], {})
+            for _ in range(args.concurrency)
+        ))
+    counter, latencies, statuses = [0], [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _connection(args, payloads, counter, latencies, statuses)
+        for _ in range(args.concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "concurrency": args.concurrency,
+        "elapsed_s": elapsed,
+        "requests_per_s": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p90_ms": float(np.percentile(latencies_ms, 90)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(latencies_ms.max()),
+        "statuses": dict((str(k), v) for k, v in statuses.items())
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load test the annotatexl service."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--unix", metavar="PATH", default=None,
+        help="Connect to a Unix socket instead of TCP"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument(
+        "--crosslink-id", nargs="+",
+        default=["DTHKSEIAHR-FKDLGEEHFK-a4-b2"],
+        help="Cross-link IDs cycled through across requests"
+    )
+    parser.add_argument(
+        "--peak-list", default=os.path.join(REPO_DIR, "test_peak_list.csv"),
+        help="Peak list CSV sent with every request"
+    )
+    parser.add_argument(
+        "--no-warmup", dest="warmup", action="store_false",
+        help="Do not warm the fragment caches before timing"
+    )
+    parser.add_argument(
+        "--output", default=None, help="JSON file to save the results to"
+    )
+    args = parser.parse_args(argv)
+    peaks = np.loadtxt(
+        args.peak_list, delimiter=",", skiprows=1, usecols=(0, 1), ndmin=2
+    )
+    payloads = [
+        json.dumps({
+            "crosslink_id": crosslink_id,
+            "mz": peaks[:, 0].tolist(),
+            "intensity": peaks[:, 1].tolist()
+        }).encode("utf-8")
+        for crosslink_id in args.crosslink_id
+    ]
+    results = asyncio.run(run(args, payloads))
+    print(
+        "%(requests)s requests at concurrency %(concurrency)s in "
+        "%(elapsed_s).2f s: %(requests_per_s).1f req/s, p50 %(p50_ms).2f ms, "
+        "p90 %(p90_ms).2f ms, p99 %(p99_ms).2f ms, max %(max_ms).2f ms" %
+        results
+    )
+    print("status counts: %s" % results["statuses"])
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    if set(results["statuses"]) != set(["200"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pytest
+
+from annotatexl.annotator.annotator import Annotator
+from annotatexl.annotator.peak_list import PeakList
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragmenter import Fragmenter
+
+
+PEAK_LIST_CSV = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "test_peak_list.csv"
+)
+TARGET_ID = "DTHKSEIAHR-FKDLGEEHFK-a4-b2"
+TOLERANCES = [("ppm", 10.0), ("Da", 0.02)]
+
+
+def brute_force_matches(annotator, obs_masses, frag_masses):
+    """
+    Compares every observed mass to every fragment mass, returning the
+    (observed index, fragment index, error) of each match in the order
+    of _match_sorted.
+    """
+    eps = annotator.tolerance_da(obs_masses)
+    matches = []
+    for i, obs in enumerate(obs_masses):
+        for j, frag in enumerate(frag_masses):
+            err = abs(obs - frag)
+            if err <= eps[i]:
+                matches.append((i, j, err))
+    return matches
+
+
+def as_tuples(obs_idx, frag_idx, err):
+    return list(zip(obs_idx.tolist(), frag_idx.tolist(), err.tolist()))
+
+
+@pytest.fixture(scope="module")
+def peak_list():
+    return PeakList.from_csv(PEAK_LIST_CSV)
+
+
+@pytest.mark.parametrize("units, tolerance", TOLERANCES)
+def test_match_table_equals_brute_force(peak_list, units, tolerance):
+    annotator = Annotator(units, tolerance)
+    table = Fragmenter(max_charge=2).fragment_table(
+        Crosslink.from_id(TARGET_ID)
+    )
+    sorted_table, obs_idx, frag_idx, err = annotator.match_table(
+        table, peak_list
+    )
+    assert np.all(np.diff(sorted_table.mass) >= 0)
+    expected = brute_force_matches(
+        annotator, peak_list.get_masses(), sorted_table.mass
+    )
+    assert expected
+    assert as_tuples(obs_idx, frag_idx, err) == expected
+
+
+@pytest.mark.parametrize("units, tolerance", TOLERANCES)
+def test_match_sorted_random_masses(units, tolerance):
+    annotator = Annotator(units, tolerance)
+    rng = np.random.RandomState(0)
+    obs = np.sort(rng.uniform(100.0, 2000.0, 500))
+    # Fragments near the peaks, with some masses repeated
+    frag = obs[rng.randint(0, len(obs), 800)] + rng.normal(0, 0.01, 800)
+    frag = np.sort(np.concatenate((frag, frag[:100])))
+    assert as_tuples(*annotator._match_sorted(obs, frag)) == \
+        brute_force_matches(annotator, obs, frag)
+
+
+@pytest.mark.parametrize("units, tolerance, obs, eps", [
+    # The tolerance windows are exact in floating point
+    ("ppm", 10.0, 1e6, 10.0),
+    ("Da", 0.5, 100.0, 0.25)
+])
+def test_match_sorted_tolerance_edges(units, tolerance, obs, eps):
+    annotator = Annotator(units, tolerance)
+    obs_masses = np.array([obs])
+    frag = np.array([
+        np.nextafter(obs - eps, -np.inf), obs - eps, obs, obs + eps,
+        np.nextafter(obs + eps, np.inf)
+    ])
+    obs_idx, frag_idx, err = annotator._match_sorted(obs_masses, frag)
+    # Peaks exactly at the edge of the window match, beyond it do not
+    assert frag_idx.tolist() == [1, 2, 3]
+    assert err.tolist() == [eps, 0.0, eps]
+    assert as_tuples(obs_idx, frag_idx, err) == \
+        brute_force_matches(annotator, obs_masses, frag)
+
+
+def test_match_sorted_duplicate_fragment_masses():
+    annotator = Annotator("Da", 0.02)
+    obs = np.array([200.0, 300.0, 300.005])
+    frag = np.array([199.995, 300.0, 300.0, 300.0, 400.0])
+    obs_idx, frag_idx, err = annotator._match_sorted(obs, frag)
+    # Every copy of a repeated mass matches each peak near it
+    assert list(zip(obs_idx.tolist(), frag_idx.tolist())) == [
+        (0, 0), (1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)
+    ]
+    assert as_tuples(obs_idx, frag_idx, err) == \
+        brute_force_matches(annotator, obs, frag)
+
+
+def test_match_sorted_empty():
+    annotator = Annotator()
+    for obs, frag in (([], [100.0]), ([100.0], []), ([], [])):
+        obs_idx, frag_idx, err = annotator._match_sorted(obs, frag)
+        assert len(obs_idx) == len(frag_idx) == len(err) == 0
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragment_cache import FragmentCache
+from annotatexl.fragmenter import Fragmenter
+
+
+TARGET_ID = "DTHKSEIAHR-FKDLGEEHFK-a4-b2"
+
+
+def assert_tables_equal(table, other):
+    assert table.alpha_pep_rep == other.alpha_pep_rep
+    assert table.beta_pep_rep == other.beta_pep_rep
+    columns, other_columns = table.columns(), other.columns()
+    assert sorted(columns) == sorted(other_columns)
+    for name, column in columns.items():
+        assert column.dtype == other_columns[name].dtype
+        assert np.array_equal(column, other_columns[name])
+
+
+def test_disk_round_trip(tmpdir):
+    cache_dir = str(tmpdir)
+    fragmenter = Fragmenter(max_charge=2, neutral_losses=("H2O",))
+    cache = FragmentCache(fragmenter, cache_dir=cache_dir)
+    table = cache.get(TARGET_ID)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.get(Crosslink.from_id(TARGET_ID)) is table
+    assert cache.hits == 1
+    assert len(os.listdir(cache_dir)) == 1
+    expected = fragmenter.fragment_table(
+        Crosslink.from_id(TARGET_ID)
+    ).sort_by_mass()
+    assert_tables_equal(table, expected)
+    # A new cache reads the table from the on-disk store
+    loaded = FragmentCache(fragmenter, cache_dir=cache_dir).get(TARGET_ID)
+    assert loaded is not table
+    assert_tables_equal(loaded, expected)
+    for column in list(table.columns().values()) + \
+            list(loaded.columns().values()):
+        assert not column.flags.writeable
+
+
+def test_settings_key_separates_profiles(tmpdir):
+    cache_dir = str(tmpdir)
+    tables = {}
+    for profile in ("all", "CID", "ETD"):
+        cache = FragmentCache(Fragmenter(profile=profile), cache_dir=cache_dir)
+        tables[profile] = cache.get(TARGET_ID)
+        assert cache.misses == 1
+    assert len(os.listdir(cache_dir)) == 3
+    assert len(set(len(table) for table in tables.values())) == 3
+    assert Fragmenter(profile="CID").settings_key() != \
+        Fragmenter(profile="ETD").settings_key()
+    assert Fragmenter(max_charge=2).settings_key() != \
+        Fragmenter().settings_key()
+
+
+def test_max_size():
+    cache = FragmentCache(max_size=2)
+    for crosslink_id in (
+        TARGET_ID, "MKQTER-ANDEKSYVR-a2-b5", "GKAVLG-PKAGLF-a2-b2"
+    ):
+        cache.get(crosslink_id)
+    assert len(cache) == 2
+    cache.get(TARGET_ID)
+    assert cache.misses == 4
@@ -0,0 +1,183 @@
+import numpy as np
+import pytest
+
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragment_ion import charge_label, variant_label
+from annotatexl.fragment_table import NEUTRAL_LOSSES
+from annotatexl.fragmenter import CHARGED_CLASSES, Fragmenter
+from annotatexl.peptide import Peptide
+from annotatexl.utils import (
+    ISOTOPE_MASS, NEUTRAL_LOSS_MASS, NEUTRAL_LOSS_RESIDUES, PROTON_MASS,
+    charge_mz
+)
+
+
+TARGET_ID = "DTHKSEIAHR-FKDLGEEHFK-a4-b2"
+ION_KEY = (
+    "ion_class", "ion_type_a", "ion_type_b", "len_a", "len_b", "dir_a",
+    "dir_b", "aux"
+)
+
+
+def row_key(table, i, *names):
+    """
+    Returns the values of the named columns of a row as a tuple.
+    """
+    return tuple(int(getattr(table, name)[i]) for name in names)
+
+
+def base_masses(table):
+    """
+    Returns the mass of each singly charged ion without a loss or
+    isotope peak, keyed by the ION_KEY columns.
+    """
+    masses = {}
+    for i in range(len(table)):
+        if row_key(table, i, "charge", "loss", "isotope") == (1, -1, 0):
+            masses[row_key(table, i, *ION_KEY)] = table.mass[i]
+    return masses
+
+
+def fragment_residues(table, i):
+    """
+    Returns the residues of the fragments of both peptides in a row, an
+    unfragmented peptide having direction -1.
+    """
+    residues = ""
+    for pep_rep, length, direction in (
+        (table.alpha_pep_rep, table.len_a[i], table.dir_a[i]),
+        (table.beta_pep_rep, table.len_b[i], table.dir_b[i])
+    ):
+        if length == 0:
+            continue
+        residues += pep_rep[-length:] if direction == 1 \
+            else pep_rep[:length]
+    return residues
+
+
+def test_charge_mz():
+    assert charge_mz(1000.0, 1) == 1000.0
+    assert charge_mz(1000.0, 2) == pytest.approx(
+        (1000.0 + PROTON_MASS) / 2
+    )
+    assert np.allclose(
+        charge_mz(np.array([1000.0, 1000.0]), np.array([3, 4])),
+        [(1000.0 + 2*PROTON_MASS) / 3, (1000.0 + 3*PROTON_MASS) / 4]
+    )
+    # The neutral mass is the same at every charge
+    for charge in range(1, 5):
+        neutral = charge*charge_mz(1000.0, charge) - charge*PROTON_MASS
+        assert neutral == pytest.approx(1000.0 - PROTON_MASS)
+
+
+def test_charge_label():
+    assert charge_label(1) == ""
+    assert charge_label(2) == "^2+"
+    assert charge_label(3) == "^3+"
+
+
+def test_expand_charges():
+    crosslink = Crosslink.from_id(TARGET_ID)
+    table = Fragmenter(max_charge=3).fragment_table(crosslink)
+    singly = base_masses(table)
+    charged = np.isin(table.ion_class, CHARGED_CLASSES)
+    assert set(table.charge[~charged].tolist()) == set([1])
+    for charge in (1, 2, 3):
+        rows = np.flatnonzero(charged & (table.charge == charge))
+        assert len(rows) == len(np.flatnonzero(charged & (table.charge == 1)))
+        for i in rows.tolist():
+            mass = singly[row_key(table, i, *ION_KEY)]
+            assert table.mass[i] == pytest.approx(charge_mz(mass, charge))
+            label = table.ion(i).get_roepstorff()
+            if charge > 1:
+                assert label.endswith("^%s+" % charge)
+            else:
+                assert "^" not in label
+
+
+def test_cap_charge():
+    crosslink = Crosslink.from_id(TARGET_ID)
+    table = Fragmenter(max_charge=4).fragment_table(crosslink)
+    table = table.sort_by_mass()
+    for max_charge in (1, 2, 3):
+        capped = table.cap_charge(max_charge)
+        keep = table.charge <= max_charge
+        assert len(capped) < len(table)
+        assert capped.is_sorted
+        for name, column in capped.columns().items():
+            assert np.array_equal(column, getattr(table, name)[keep])
+    assert table.cap_charge(4) is table
+    assert table.cap_charge(None) is table
+
+
+@pytest.mark.parametrize("crosslink_id", [
+    TARGET_ID, "MKQTER-ANDEKSYVR-a2-b5", "GKAVLG-PKAGLF-a2-b2"
+])
+def test_neutral_losses_need_their_residues(crosslink_id):
+    crosslink = Crosslink.from_id(crosslink_id)
+    table = Fragmenter(neutral_losses=NEUTRAL_LOSSES).fragment_table(
+        crosslink
+    )
+    singly = base_masses(table)
+    losses = dict(
+        (key, set()) for key in singly if key[0] in CHARGED_CLASSES
+    )
+    for i in np.flatnonzero(table.loss >= 0).tolist():
+        key = row_key(table, i, *ION_KEY)
+        loss = NEUTRAL_LOSSES[table.loss[i]]
+        losses[key].add(loss)
+        assert table.mass[i] == pytest.approx(
+            singly[key] - NEUTRAL_LOSS_MASS[loss]
+        )
+        assert table.ion(i).get_roepstorff().endswith(variant_label(loss))
+    # Every ion containing a residue of a loss has it, and no other ion
+    for i in range(len(table)):
+        key = row_key(table, i, *ION_KEY)
+        if key not in losses or table.loss[i] >= 0:
+            continue
+        residues = fragment_residues(table, i)
+        assert losses[key] == set(
+            loss for loss in NEUTRAL_LOSSES
+            if set(residues) & set(NEUTRAL_LOSS_RESIDUES[loss])
+        )
+
+
+def test_prefix_counts():
+    for pep_rep in ("PEPTIDE", "DTHKSEIAHR", "GAGAG", "K"):
+        peptide = Peptide(pep_rep)
+        for residues in NEUTRAL_LOSS_RESIDUES.values():
+            counts = peptide.get_prefix_counts(residues)
+            assert counts['N'].tolist() == [
+                sum(aa in residues for aa in pep_rep[:k])
+                for k in range(1, len(pep_rep) + 1)
+            ]
+            assert counts['C'].tolist() == [
+                sum(aa in residues for aa in pep_rep[-k:])
+                for k in range(1, len(pep_rep) + 1)
+            ]
+            assert not counts['N'].flags.writeable
+            assert peptide.get_prefix_counts(residues) is counts
+
+
+def test_isotope_peaks():
+    crosslink = Crosslink.from_id(TARGET_ID)
+    table = Fragmenter(
+        max_charge=2, neutral_losses=("H2O",), isotopes=2
+    ).fragment_table(crosslink)
+    singly = base_masses(table)
+    charged = np.isin(table.ion_class, CHARGED_CLASSES)
+    assert set(table.isotope[~charged].tolist()) == set([0])
+    # Isotope peaks are only generated for the ions without a loss
+    assert not ((table.isotope > 0) & (table.loss >= 0)).any()
+    for isotope in (1, 2):
+        rows = np.flatnonzero(table.isotope == isotope)
+        assert len(rows) == 2*len(
+            [key for key in singly if key[0] in CHARGED_CLASSES]
+        )
+        for i in rows.tolist():
+            mass = singly[row_key(table, i, *ION_KEY)]
+            charge = table.charge[i]
+            assert table.mass[i] == pytest.approx(
+                charge_mz(mass + isotope*ISOTOPE_MASS, charge)
+            )
+            assert "(M+%s)" % isotope in table.ion(i).get_roepstorff()
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragmentation_profile import PROFILES
+from annotatexl.fragmenter import Fragmenter
+
+
+CROSSLINK_IDS = [
+    "DTHKSEIAHR-FKDLGEEHFK-a4-b2",
+    "MKQTER-ANDEKSYVR-a2-b5"
+]
+MZ_RANGES = [(100.0, 600.0), (450.0, 1500.0), (1200.0, 3000.0)]
+
+
+def table_rows(table):
+    """
+    Returns the rows of a FragmentTable as a sorted list of tuples, to
+    compare tables regardless of row order.
+    """
+    columns = table.columns()
+    names = sorted(columns)
+    return sorted(zip(*(columns[name].tolist() for name in names)))
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"max_charge": 3},
+    {"neutral_losses": ("H2O", "NH3")},
+    {"isotopes": 2},
+    {"max_charge": 2, "neutral_losses": ("H2O", "NH3"), "isotopes": 1}
+])
+def test_pruned_table_equals_filtered_table(profile, kwargs):
+    fragmenter = Fragmenter(profile=profile, **kwargs)
+    for crosslink_id in CROSSLINK_IDS:
+        crosslink = Crosslink.from_id(crosslink_id)
+        full = fragmenter.fragment_table(crosslink)
+        for lo, hi in MZ_RANGES:
+            pruned = fragmenter.fragment_table(crosslink, (lo, hi))
+            inside = (full.mass >= lo) & (full.mass <= hi)
+            assert np.all((pruned.mass >= lo) & (pruned.mass <= hi))
+            assert table_rows(pruned) == \
+                table_rows(full.take(np.flatnonzero(inside)))
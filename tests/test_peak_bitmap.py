@@ -0,0 +1,120 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from annotatexl.annotator.annotator import Annotator
+from annotatexl.annotator.peak_bitmap import SCREENED_CLASSES, PeakBitmap
+from annotatexl.annotator.peak_list import PeakList
+from annotatexl.annotator.spectrum_index import SpectrumIndex
+from annotatexl.api import (
+    MIN_HITS, SCREEN_ION_CLASSES, annotate_candidates
+)
+from annotatexl.crosslink import Crosslink
+from annotatexl.fragment_table import COMMON, PRECURSOR
+from annotatexl.fragmenter import Fragmenter
+
+
+PEAK_LIST_CSV = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "test_peak_list.csv"
+)
+TARGET_ID = "DTHKSEIAHR-FKDLGEEHFK-a4-b2"
+AMINO_ACIDS = "ACDEFGHILMNPQRSTVWY"
+
+
+def decoy_ids(n_decoys, seed=0):
+    """
+    Returns the IDs of random cross-links of random peptides, each with a
+    linked lysine.
+    """
+    rng = random.Random(seed)
+
+    def peptide():
+        residues = [
+            rng.choice(AMINO_ACIDS) for _ in range(rng.randint(6, 14))
+        ]
+        site = rng.randrange(len(residues) - 1)
+        residues[site] = "K"
+        return "".join(residues), site + 1
+
+    ids = []
+    for _ in range(n_decoys):
+        (alpha, alpha_site), (beta, beta_site) = peptide(), peptide()
+        ids.append("%s-%s-a%s-b%s" % (alpha, beta, alpha_site, beta_site))
+    return ids
+
+
+@pytest.fixture(scope="module")
+def peak_list():
+    return PeakList.from_csv(PEAK_LIST_CSV)
+
+
+@pytest.mark.parametrize("units, tolerance", [("ppm", 10.0), ("Da", 0.02)])
+def test_screen_rejects_decoys(peak_list, units, tolerance):
+    annotator = Annotator(units, tolerance)
+    mz_range = annotator.matchable_range(peak_list.get_masses())
+    fragmenter = Fragmenter()
+    ids = [TARGET_ID] + decoy_ids(300)
+    tables = [
+        fragmenter.fragment_table(Crosslink.from_id(xl_id), mz_range)
+        for xl_id in ids
+    ]
+    bitmap = PeakBitmap(peak_list, tolerance, units)
+    index = SpectrumIndex(peak_list, tolerance, units)
+    hits = bitmap.count_hits(tables)
+    # The hit count bounds the screened fragments that match a peak
+    for table, n_hits in zip(tables, hits):
+        screened = table.mass[np.isin(table.ion_class, SCREENED_CLASSES)]
+        mass_idx, _ = index.match_masses(screened)
+        assert n_hits >= len(np.unique(mass_idx))
+    passed = bitmap.screen(tables, 3)
+    assert 0 in passed
+    assert len(passed) < len(ids) // 2
+
+
+def test_annotate_candidates_rejects_decoys(peak_list):
+    ids = [TARGET_ID] + decoy_ids(100)
+    results = annotate_candidates(
+        ids, peak_list.get_masses(), peak_list.get_intensities()
+    )
+    assert results[0].crosslink_id == TARGET_ID
+    assert len(results) < len(ids) // 2
+
+
+@pytest.mark.parametrize("kwargs", [
+    {}, {"max_charge": 3, "neutral_losses": ("H2O", "NH3"), "isotopes": 1}
+])
+def test_screen_table_is_the_terminal_part(peak_list, kwargs):
+    mz_range = Annotator("ppm", 10.0).matchable_range(peak_list.get_masses())
+    fragmenter = Fragmenter(**kwargs)
+    crosslink = Crosslink.from_id(TARGET_ID)
+    full = fragmenter.fragment_table(crosslink, mz_range)
+    screened = fragmenter.fragment_table(
+        crosslink, mz_range, ion_classes=SCREEN_ION_CLASSES
+    )
+    terminal = np.isin(full.ion_class, (PRECURSOR, COMMON))
+    assert np.array_equal(
+        np.sort(screened.mass), np.sort(full.mass[terminal])
+    )
+    assert set(screened.ion_class.tolist()) == set([PRECURSOR, COMMON])
+
+
+def test_annotate_candidates_keeps_terminal_matches(peak_list):
+    ids = [TARGET_ID] + decoy_ids(100)
+    fragmenter = Fragmenter()
+    mz_range = Annotator("ppm", 10.0).matchable_range(peak_list.get_masses())
+    index = SpectrumIndex(peak_list, 10.0, "ppm")
+    expected = []
+    for xl_id in ids:
+        table = fragmenter.fragment_table(Crosslink.from_id(xl_id), mz_range)
+        terminal = table.mass[np.isin(table.ion_class, (PRECURSOR, COMMON))]
+        mass_idx, _ = index.match_masses(terminal)
+        if len(np.unique(mass_idx)) >= MIN_HITS:
+            expected.append(xl_id)
+    results = annotate_candidates(
+        ids, peak_list.get_masses(), peak_list.get_intensities(),
+        fragmenter=fragmenter
+    )
+    assert set(expected) <= set(result.crosslink_id for result in results)
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from annotatexl.annotator.peak_list import PeakList, PeakListException
+
+
+def test_sorts_and_keeps_first_duplicate():
+    mz = [300.0, 100.0, 200.0, 100.0, 300.0, 150.0]
+    intensity = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    peak_list = PeakList(mz, intensity)
+    assert peak_list.get_masses().tolist() == [100.0, 150.0, 200.0, 300.0]
+    assert peak_list.get_intensities().tolist() == [2.0, 6.0, 3.0, 1.0]
+    assert len(PeakList(mz, intensity, drop_duplicates=False)) == 6
+
+
+def test_matches_dataframe_drop_duplicates():
+    rng = np.random.RandomState(0)
+    mz = np.round(rng.uniform(100.0, 200.0, 1000), 1)
+    intensity = rng.uniform(0.0, 1e4, 1000)
+    peak_list = PeakList(mz, intensity)
+    df = pd.DataFrame({"mz": mz, "intensity": intensity})
+    df = df.drop_duplicates(["mz"]).sort_values("mz")
+    assert np.array_equal(peak_list.get_masses(), df["mz"].values)
+    assert np.array_equal(peak_list.get_intensities(), df["intensity"].values)
+
+
+def test_mismatched_lengths():
+    with pytest.raises(PeakListException):
+        PeakList([100.0, 200.0], [1.0])
+
+
+def test_from_csv(tmpdir):
+    csv_path = os.path.join(str(tmpdir), "peaks.csv")
+    with open(csv_path, "w") as csv_file:
+        csv_file.write('mz,intensity,Ion Type\n"200.5",10,y\n\n100.25,20,b\n')
+    peak_list = PeakList.from_csv(csv_path)
+    assert peak_list.get_masses().tolist() == [100.25, 200.5]
+    assert peak_list.get_intensities().tolist() == [20.0, 10.0]
+    with open(csv_path, "w") as csv_file:
+        csv_file.write("mz,intensity\n100.25,high\n")
+    with pytest.raises(PeakListException):
+        PeakList.from_csv(csv_path)
@@ -0,0 +1,95 @@
+import gzip
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from annotatexl.annotator.peak_list import PeakList
+from annotatexl.api import ANNOTATION_COLUMNS, annotate_spectrum
+from annotatexl.results_writer import (
+    ResultsWriter, ResultsWriterException, open_results_writer
+)
+
+
+PEAK_LIST_CSV = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "test_peak_list.csv"
+)
+TARGET_ID = "DTHKSEIAHR-FKDLGEEHFK-a4-b2"
+
+
+@pytest.fixture(scope="module")
+def records():
+    peak_list = PeakList.from_csv(PEAK_LIST_CSV)
+    return list(annotate_spectrum(
+        TARGET_ID, peak_list.get_masses(), peak_list.get_intensities()
+    ).records())
+
+
+def write(path, records, fmt=None):
+    with open_results_writer(path, ANNOTATION_COLUMNS, fmt) as writer:
+        # Rows are numbered on across calls
+        writer.write_rows(records[:10])
+        writer.write_rows(records[10:])
+    assert writer.n_rows == len(records)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".csv.gz"])
+def test_csv_round_trip(tmpdir, records, suffix):
+    path = os.path.join(str(tmpdir), "results" + suffix)
+    write(path, records)
+    df = pd.read_csv(path, index_col=0)
+    assert tuple(df.columns) == ANNOTATION_COLUMNS
+    assert df.index.tolist() == list(range(len(records)))
+    expected = pd.DataFrame.from_records(records, columns=ANNOTATION_COLUMNS)
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+    if suffix == ".csv.gz":
+        with gzip.open(path, "rt") as gz_file:
+            assert gz_file.readline().strip() == \
+                "," + ",".join(ANNOTATION_COLUMNS)
+
+
+def test_jsonl_round_trip(tmpdir, records):
+    path = os.path.join(str(tmpdir), "results.jsonl")
+    write(path, records)
+    with open(path) as jsonl_file:
+        rows = [json.loads(line) for line in jsonl_file]
+    assert len(rows) == len(records)
+    for index, (row, record) in enumerate(zip(rows, records)):
+        assert list(row) == ["index"] + list(ANNOTATION_COLUMNS)
+        assert row["index"] == index
+        assert tuple(row[column] for column in ANNOTATION_COLUMNS) == record
+
+
+def test_unknown_format_and_append(tmpdir):
+    path = os.path.join(str(tmpdir), "results.csv")
+    with pytest.raises(ResultsWriterException):
+        ResultsWriter(path, ANNOTATION_COLUMNS, "xlsx")
+    with pytest.raises(ResultsWriterException):
+        open_results_writer(path, ANNOTATION_COLUMNS, append=True)
+
+
+def test_parquet_round_trip(tmpdir, records):
+    pytest.importorskip("pyarrow")
+    from annotatexl.parquet_writer import read_results
+    path = os.path.join(str(tmpdir), "results.parquet")
+    write(path, records)
+    table = read_results(path)
+    assert tuple(table.column_names) == ANNOTATION_COLUMNS
+    assert [
+        tuple(row[column] for column in ANNOTATION_COLUMNS)
+        for row in table.to_pylist()
+    ] == records
+    # Appending adds a part file, a new writer replaces the dataset
+    with open_results_writer(
+        path, ANNOTATION_COLUMNS, append=True
+    ) as writer:
+        writer.write_rows(records)
+    assert read_results(path).num_rows == 2*len(records)
+    matched = read_results(
+        path, columns=["roepstorff"], filters=[("matched", "=", True)]
+    )
+    assert matched.num_rows == 2*sum(record[0] for record in records)
+    write(path, records)
+    assert read_results(path).num_rows == len(records)
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from annotatexl.annotator.peak_list import PeakList
+from annotatexl.site_localization import (
+    SiteLocalizationException, check_residues, enumerate_topologies,
+    link_sites, localize_sites
+)
+
+
+PEAK_LIST_CSV = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "test_peak_list.csv"
+)
+TARGET_ID = "DTHKSEIAHR-FKDLGEEHFK-a4-b2"
+
+
+def test_link_sites():
+    assert link_sites("DTHKSEIAHR") == [4]
+    assert link_sites("DTHKSEIAHR", "KSTY") == [2, 4, 5]
+    assert link_sites("KTHKS", "K^", protein_n_term=True) == [1, 4]
+
+
+def test_n_terminus_only_links_protein_n_terminal_peptides():
+    # Internal peptides have no linkable N-terminus
+    assert link_sites("DTHKSEIAHR", "K^") == [4]
+    assert enumerate_topologies("DTHKSEIAHR", "FKDLGEEHFK", "K^") == [
+        (4, 2), (4, 10)
+    ]
+    assert link_sites("DTHKSEIAHR", "K^", protein_n_term=True) == [1, 4]
+    assert enumerate_topologies(
+        "DTHKSEIAHR", "FKDLGEEHFK", "K^", protein_n_term=("alpha",)
+    ) == [(1, 2), (1, 10), (4, 2), (4, 10)]
+    assert enumerate_topologies(
+        "DTHKSEIAHR", "FKDLGEEHFK", "K^", protein_n_term=("alpha", "beta")
+    ) == [(1, 1), (1, 2), (1, 10), (4, 1), (4, 2), (4, 10)]
+    # Without ^ the flag has no effect
+    assert enumerate_topologies(
+        "DTHKSEIAHR", "FKDLGEEHFK", "K", protein_n_term=("alpha",)
+    ) == [(4, 2), (4, 10)]
+
+
+def test_localize_sites_n_terminus():
+    peak_list = PeakList.from_csv(PEAK_LIST_CSV)
+    args = (TARGET_ID, peak_list.get_masses(), peak_list.get_intensities())
+    internal = localize_sites(*args, residues="K^")
+    assert sorted(row[2:4] for row in internal) == [(4, 2), (4, 10)]
+    n_terminal = localize_sites(
+        *args, residues="K^", protein_n_term=("alpha",)
+    )
+    assert sorted(row[2:4] for row in n_terminal) == [
+        (1, 2), (1, 10), (4, 2), (4, 10)
+    ]
+
+
+def test_homodimer_topologies_are_not_mirrored():
+    assert enumerate_topologies("AKGKC", "AKGKC") == [
+        (2, 2), (2, 4), (4, 4)
+    ]
+    assert enumerate_topologies("AKGKC", "AKGKC", include=[(4, 2)]) == [
+        (2, 2), (4, 2), (4, 4)
+    ]
+
+
+def test_invalid_arguments():
+    for residues in ("", "K-"):
+        with pytest.raises(SiteLocalizationException):
+            check_residues(residues)
+    with pytest.raises(SiteLocalizationException):
+        enumerate_topologies("AKC", "AKC", protein_n_term=("gamma",))